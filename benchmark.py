@@ -0,0 +1,663 @@
+import argparse
+import ast
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from google import genai
+from google.genai import errors, types
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Métricas comparadas com um resultado anterior e se o valor maior é pior
+METRICAS_REGRESSAO = {
+    "latencia_p50_ms": True,
+    "latencia_p95_ms": True,
+    "chamadas_por_proposta": True,
+    "tokens_por_proposta": True,
+    "custo_por_proposta_usd": True,
+    "pico_memoria_mb": True,
+    "propostas_por_segundo": False,
+    "importacao_ms": True,
+}
+
+# Latência de cada modelo em relação à mediana configurada, que vale para o gemini-2.5-flash
+FATORES_LATENCIA_MODELOS = {"gemini-2.5-flash-lite": 0.6, "gemini-2.5-flash": 1.0, "gemini-2.5-pro": 2.5}
+
+# Dependências pesadas que só devem ser carregadas quando a funcionalidade que as usa for acionada
+MODULOS_SOB_DEMANDA = ("PyPDF2", "docx", "pymongo", "bson", "numpy")
+
+TEXTO_SOLUCAO = (
+    "DESCRICAO_SOLUCAO: Plataforma de manutenção preditiva que combina sensores IoT e modelos de IA "
+    "para antecipar falhas em ativos críticos.\n"
+    "INOVACAO: Modelos híbridos físico-estatísticos treinados com poucos dados de falha.\n"
+    "TECNOLOGIAS: IoT industrial, aprendizado de máquina, gêmeos digitais, computação de borda\n"
+    "TIPO_PRODUTO: Software como serviço com hardware de coleta embarcado\n"
+    "POTENCIAL_MERCADO: Concessionárias de energia, saneamento e indústria de processo"
+)
+
+TEXTO_ORCAMENTO = (
+    "TOTAL: 1500000\nRH: 700000\nMATERIAL_PERMANENTE: 300000\nMATERIAL_CONSUMO: 120000\n"
+    "SERVICOS_TERCEIROS: 200000\nVIAGENS: 40000\nOUTROS: 60000\nCOMUNICACAO: 30000\nSTARTUPS: 50000"
+)
+
+TEXTO_BUSCA = (
+    "1. Edital de Inovação em Energia 2025 - Agência de Fomento\n"
+    "   Prazo: 2099-12-31 | Valor: R$ 2 milhões | Link: https://fomento.example.org/editais/energia-2025\n"
+    "2. Chamada Pública IA Aplicada - Fundação de Pesquisa\n"
+    "   Prazo: 2099-06-30 | Valor: R$ 500 mil | Link: https://fundacao.example.org/chamadas/ia\n"
+)
+
+
+# Cliente Gemini simulado: responde com textos prontos conforme o prompt, com latência,
+# erros e contagem de tokens configuráveis, sem acesso à rede. Respeita max_output_tokens,
+# stop_sequences e o orçamento de raciocínio, que sem limite consome tokens_pensamento por chamada
+class ClienteSimulado:
+    def __init__(self, latencia_mediana_ms=300.0, latencia_sigma=0.4, taxa_erro=0.0, tokens_saida=250, semente=42,
+                 tokens_pensamento=200, ms_por_token=0.0):
+        self.latencia_mediana_ms = latencia_mediana_ms
+        self.latencia_sigma = latencia_sigma
+        self.taxa_erro = taxa_erro
+        self.tokens_saida = tokens_saida
+        self.tokens_pensamento = tokens_pensamento
+        self.ms_por_token = ms_por_token
+        self.chamadas = 0
+        self.erros = 0
+        self.tokens_entrada = 0
+        self.tokens_saida_total = 0
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self._caches = {}
+        self._caches_criados = 0
+        self.models = _ModelosSimulados(self)
+        self.caches = _CachesSimulados(self)
+
+    # Sorteia a latência da chamada (log-normal em torno da mediana do modelo) e, conforme a taxa, um erro 503
+    def _sortear(self, model=None):
+        with self._lock:
+            self.chamadas += 1
+            mediana = self.latencia_mediana_ms * FATORES_LATENCIA_MODELOS.get(model, 1.0)
+            latencia = mediana * math.exp(self._aleatorio.gauss(0, self.latencia_sigma)) / 1000
+            falhou = self._aleatorio.random() < self.taxa_erro
+            if falhou:
+                self.erros += 1
+        return latencia, falhou
+
+    # Tempo gasto gerando os tokens de saída e de raciocínio da resposta
+    def _tempo_geracao(self, response):
+        uso = response.usage_metadata
+        return ((uso.candidates_token_count or 0) + (uso.thoughts_token_count or 0)) * self.ms_por_token / 1000
+
+    def _responder(self, contents, config):
+        texto_prompt = _texto_prompt(contents)
+        schema = getattr(config, "response_schema", None) if config is not None else None
+        nome_schema = getattr(schema, "__name__", "")
+
+        if nome_schema == "PropostaEstruturada":
+            texto = _proposta_estruturada_json()
+        elif nome_schema == "ListaEditais":
+            texto = _lista_editais_json()
+        elif "ANALISE este desafio" in texto_prompt:
+            texto = TEXTO_SOLUCAO
+        elif "Extraia informações do desafio" in texto_prompt:
+            texto = "CÓDIGO: EDITAL-2025-042\nNOME: Manutenção preditiva de ativos"
+        elif "Retorne APENAS o título" in texto_prompt:
+            texto = "Plataforma IoT e IA para Manutenção Preditiva de Infraestrutura Crítica"
+        elif "MESES" in texto_prompt:
+            texto = "24"
+        elif "alcance" in texto_prompt.lower() and "Diversificado" in texto_prompt:
+            texto = "Nacional - No setor brasileiro"
+        elif "orçamento" in texto_prompt.lower() and "TOTAL:" in texto_prompt:
+            texto = TEXTO_ORCAMENTO
+        elif "EDITAIS ABERTOS" in texto_prompt:
+            texto = TEXTO_BUSCA
+        else:
+            texto = " ".join(["conteúdo"] * self.tokens_saida)
+
+        pensamento = self.tokens_pensamento
+        orcamento_pensamento = config.thinking_config.thinking_budget if config and config.thinking_config else None
+        if orcamento_pensamento is not None:
+            pensamento = min(pensamento, orcamento_pensamento)
+        for parada in (config.stop_sequences if config is not None else None) or []:
+            texto = texto.split(parada)[0]
+        motivo_fim = types.FinishReason.STOP
+        if config is not None and config.max_output_tokens:
+            pensamento = min(pensamento, config.max_output_tokens)
+            limite_caracteres = (config.max_output_tokens - pensamento) * 4
+            if len(texto) > limite_caracteres:
+                texto, motivo_fim = texto[:limite_caracteres], types.FinishReason.MAX_TOKENS
+
+        nome_cache = getattr(config, "cached_content", None) if config is not None else None
+        tokens_em_cache = self._caches.get(nome_cache, 0)
+        tokens_entrada = len(texto_prompt) // 4 + tokens_em_cache
+        tokens_saida = max(1, len(texto) // 4)
+        with self._lock:
+            self.tokens_entrada += tokens_entrada
+            self.tokens_saida_total += tokens_saida + pensamento
+
+        candidato = types.Candidate(
+            content=types.Content(role="model", parts=[types.Part(text=texto)]), finish_reason=motivo_fim
+        )
+        if config is not None and config.tools:
+            candidato.grounding_metadata = types.GroundingMetadata(grounding_chunks=[
+                types.GroundingChunk(web=types.GroundingChunkWeb(uri="https://fomento.example.org/editais/energia-2025")),
+                types.GroundingChunk(web=types.GroundingChunkWeb(uri="https://fundacao.example.org/chamadas/ia")),
+            ])
+        return types.GenerateContentResponse(
+            candidates=[candidato],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=tokens_entrada,
+                cached_content_token_count=tokens_em_cache or None,
+                candidates_token_count=tokens_saida,
+                thoughts_token_count=pensamento or None,
+                total_token_count=tokens_entrada + tokens_saida + pensamento,
+            ),
+        )
+
+
+class _ModelosSimulados:
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def generate_content(self, model, contents, config=None):
+        latencia, falhou = self._cliente._sortear(model)
+        time.sleep(latencia)
+        if falhou:
+            raise _erro_simulado()
+        response = self._cliente._responder(contents, config)
+        time.sleep(self._cliente._tempo_geracao(response))
+        return response
+
+    def generate_content_stream(self, model, contents, config=None):
+        latencia, falhou = self._cliente._sortear(model)
+        # O primeiro trecho chega com ~30% da latência e o restante é dividido entre os demais
+        time.sleep(latencia * 0.3)
+        if falhou:
+            raise _erro_simulado()
+        response = self._cliente._responder(contents, config)
+        texto = response.text
+        trechos = [texto[i:i + 80] for i in range(0, len(texto), 80)] or [""]
+        espera = latencia * 0.7 + self._cliente._tempo_geracao(response)
+        for indice, trecho in enumerate(trechos):
+            if indice:
+                time.sleep(espera / max(1, len(trechos) - 1))
+            ultimo = indice == len(trechos) - 1
+            yield types.GenerateContentResponse(
+                candidates=[types.Candidate(
+                    content=types.Content(role="model", parts=[types.Part(text=trecho)]),
+                    finish_reason=response.candidates[0].finish_reason if ultimo else None,
+                )],
+                usage_metadata=response.usage_metadata if ultimo else None,
+            )
+
+
+class _CachesSimulados:
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def create(self, model, config):
+        with self._cliente._lock:
+            self._cliente._caches_criados += 1
+            nome = f"cachedContents/simulado-{self._cliente._caches_criados}"
+            self._cliente._caches[nome] = len(_texto_prompt(config.contents)) // 4
+        return types.CachedContent(name=nome, model=model)
+
+    def delete(self, name):
+        with self._cliente._lock:
+            self._cliente._caches.pop(name, None)
+
+
+def _erro_simulado():
+    return errors.ServerError(503, {"error": {"code": 503, "message": "erro simulado", "status": "UNAVAILABLE"}})
+
+
+# Texto do último turno do usuário (ou do prompt simples)
+def _texto_prompt(contents):
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, list) and contents:
+        ultimo = contents[-1]
+        if isinstance(ultimo, types.Content):
+            return "".join(parte.text or "" for parte in ultimo.parts or [])
+        return str(ultimo)
+    return str(contents)
+
+
+def _proposta_estruturada_json():
+    from geracao import OrcamentoEstruturado, PropostaEstruturada
+
+    return PropostaEstruturada(
+        descricao_solucao="Plataforma de manutenção preditiva com IoT e IA",
+        aspectos_inovativos="Modelos híbridos treinados com poucos dados de falha",
+        tecnologias_previstas="IoT, aprendizado de máquina, gêmeos digitais",
+        tipo_produto="Software como serviço",
+        potencial_mercado="Energia, saneamento e indústria",
+        titulo="Plataforma IoT e IA para Manutenção Preditiva",
+        codigo_desafio="EDITAL-2025-042",
+        nome_desafio="Manutenção preditiva de ativos",
+        duracao_meses=24,
+        orcamento=OrcamentoEstruturado(
+            total=1500000, rh=700000, material_permanente=300000, material_consumo=120000,
+            servicos_terceiros=200000, viagens=40000, outros=60000, comunicacao=30000, startups=50000
+        ),
+        alcance="Nacional - No setor brasileiro",
+        ambito_aplicacao="Concessionárias de energia e saneamento",
+    ).model_dump_json()
+
+
+def _lista_editais_json():
+    from catalogo import EditalExtraido, ListaEditais
+
+    return ListaEditais(editais=[
+        EditalExtraido(nome="Edital de Inovação em Energia 2025", organizacao="Agência de Fomento",
+                       prazo="2099-12-31", valor="R$ 2 milhões",
+                       link="https://fomento.example.org/editais/energia-2025", temas=["energia"]),
+        EditalExtraido(nome="Chamada Pública IA Aplicada", organizacao="Fundação de Pesquisa",
+                       prazo="2099-06-30", valor="R$ 500 mil",
+                       link="https://fundacao.example.org/chamadas/ia", temas=["IA"]),
+    ]).model_dump_json()
+
+
+# Gera um edital sintético com aproximadamente o tamanho pedido; o identificador evita acertos de cache
+def gerar_edital(identificador, tamanho_caracteres):
+    paragrafo = (
+        "O desafio consiste em desenvolver solução de monitoramento preditivo para infraestrutura crítica, "
+        "com sensores IoT, análise de dados em tempo real e modelos de inteligência artificial. "
+        "Serão avaliados o grau de inovação, a viabilidade técnica e o impacto para o setor elétrico."
+    )
+    partes = [f"EDITAL {identificador}"]
+    while sum(len(p) + 2 for p in partes) < tamanho_caracteres:
+        partes.append(f"{paragrafo} (seção {len(partes)} do edital {identificador})")
+    return "\n\n".join(partes)
+
+
+def _percentil(valores, q):
+    return round(float(np.percentile(valores, q)), 1) if valores else None
+
+
+# Executa a função medindo tempo total, pico de memória Python e chamadas feitas ao cliente simulado
+def _medir_cenario(cliente, funcao):
+    from instrumentacao import obter_registro
+
+    obter_registro().spans.clear()
+    chamadas, tokens_entrada, tokens_saida = cliente.chamadas, cliente.tokens_entrada, cliente.tokens_saida_total
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        resultado = funcao()
+    finally:
+        duracao = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    resultado.update({
+        "duracao_s": round(duracao, 3),
+        "chamadas_gemini": cliente.chamadas - chamadas,
+        "tokens_entrada": cliente.tokens_entrada - tokens_entrada,
+        "tokens_saida": cliente.tokens_saida_total - tokens_saida,
+        "pico_memoria_mb": round(pico / 1024 / 1024, 2),
+        "por_tipo_prompt": obter_registro().percentis(),
+    })
+    custo = sum(linha["custo_usd"] for linha in resultado["por_tipo_prompt"])
+    propostas = resultado.get("propostas") or 0
+    if propostas:
+        resultado["chamadas_por_proposta"] = round(resultado["chamadas_gemini"] / propostas, 2)
+        resultado["tokens_por_proposta"] = round(
+            (resultado["tokens_entrada"] + resultado["tokens_saida"]) / propostas, 1
+        )
+        resultado["custo_por_proposta_usd"] = round(custo / propostas, 6)
+        resultado["propostas_por_segundo"] = round(propostas / duracao, 3)
+    return resultado
+
+
+# Gera propostas uma a uma com as funções de geração e mede a latência de cada uma
+def cenario_sequencial(cliente, modo, propostas, tamanho_edital, nonce):
+    from geracao import gerar_proposta_automatica, gerar_proposta_estruturada
+
+    gerar = gerar_proposta_estruturada if modo == "estruturada" else gerar_proposta_automatica
+
+    def executar():
+        latencias, falhas = [], 0
+        for i in range(propostas):
+            edital = gerar_edital(f"{nonce}-{modo}-{tamanho_edital}-{i}", tamanho_edital)
+            inicio = time.perf_counter()
+            try:
+                gerar(cliente, edital)
+            except Exception:
+                falhas += 1
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        return {
+            "propostas": propostas,
+            "falhas": falhas,
+            "latencia_p50_ms": _percentil(latencias, 50),
+            "latencia_p95_ms": _percentil(latencias, 95),
+        }
+
+    return _medir_cenario(cliente, executar)
+
+
+# Sessões gerando propostas ao mesmo tempo; com mesmo_edital, todas colam o mesmo edital no mesmo
+# instante, como no dia em que um edital é anunciado
+def cenario_concorrente(cliente, sessoes, propostas_por_sessao, tamanho_edital, nonce, mesmo_edital=False):
+    from gemini import obter_chamadas_em_andamento
+    from geracao import gerar_proposta_automatica
+
+    agrupadas = obter_chamadas_em_andamento().agrupadas
+
+    def sessao(indice):
+        latencias, falhas = [], 0
+        for i in range(propostas_por_sessao):
+            origem = "pico" if mesmo_edital else f"sessao{indice}"
+            edital = gerar_edital(f"{nonce}-{origem}-{i}", tamanho_edital)
+            inicio = time.perf_counter()
+            try:
+                gerar_proposta_automatica(cliente, edital)
+            except Exception:
+                falhas += 1
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        return latencias, falhas
+
+    def executar():
+        with ThreadPoolExecutor(max_workers=sessoes) as executor:
+            resultados = list(executor.map(sessao, range(sessoes)))
+        latencias = [latencia for itens, _ in resultados for latencia in itens]
+        return {
+            "sessoes": sessoes,
+            "propostas": sessoes * propostas_por_sessao,
+            "falhas": sum(falhas for _, falhas in resultados),
+            "chamadas_agrupadas": obter_chamadas_em_andamento().agrupadas - agrupadas,
+            "latencia_p50_ms": _percentil(latencias, 50),
+            "latencia_p95_ms": _percentil(latencias, 95),
+        }
+
+    return _medir_cenario(cliente, executar)
+
+
+# Uma sessão do app no AppTest: busca editais e gera uma proposta. Roda em um processo próprio,
+# porque o AppTest não aceita várias sessões simultâneas no mesmo processo
+def _sessao_apptest(indice, parametros_cliente, tamanho_edital, nonce, timeout_s):
+    from streamlit.testing.v1 import AppTest
+
+    from instrumentacao import obter_registro
+    from tarefas import CONCLUIDA, obter_gerenciador_tarefas
+
+    cliente = ClienteSimulado(**{**parametros_cliente, "semente": parametros_cliente["semente"] + indice})
+    genai.Client = lambda *a, **k: cliente
+
+    app = AppTest.from_file(os.path.join(DIRETORIO, "main.py"), default_timeout=timeout_s)
+    app.secrets["GEMINI_API_KEY"] = "benchmark"
+    app.run()
+    resultado = {}
+
+    inicio = time.perf_counter()
+    [b for b in app.button if "Buscar Editais na Web" in b.label][0].click().run()
+    resultado["busca_ms"] = (time.perf_counter() - inicio) * 1000
+
+    [t for t in app.text_area if t.label == "Desafio do Edital:"][0].input(
+        gerar_edital(f"{nonce}-app{indice}", tamanho_edital)
+    )
+    # Chamadas, tokens e custo contam só a proposta (a busca acima fica de fora), como nos outros cenários
+    chamadas, tokens = cliente.chamadas, cliente.tokens_entrada + cliente.tokens_saida_total
+    obter_registro().spans.clear()
+    resultado["inicio_proposta"] = time.time()
+    inicio = time.perf_counter()
+    [b for b in app.button if "Gerar Proposta Automática" in b.label][0].click().run()
+    # A geração roda como tarefa em segundo plano; a sessão espera por ela e redesenha o resultado
+    tarefa = obter_gerenciador_tarefas().obter(app.session_state["tarefas_automatica"][-1])
+    while not tarefa.finalizada:
+        time.sleep(0.01)
+    resultado["proposta_ms"] = (time.perf_counter() - inicio) * 1000
+    app.run()
+    resultado["fim_proposta"] = time.time()
+    resultado["chamadas_proposta"] = cliente.chamadas - chamadas
+    resultado["custo_usd"] = sum(linha["custo_usd"] for linha in obter_registro().percentis())
+    resultado["chamadas"] = cliente.chamadas
+    resultado["tokens_proposta"] = cliente.tokens_entrada + cliente.tokens_saida_total - tokens
+    resultado["erros"] = len(app.exception) + (tarefa.status != CONCLUIDA)
+    resultado["pico_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return resultado
+
+
+# Abre várias sessões do app ao mesmo tempo, cada uma em um processo, e mede a vazão das propostas
+def cenario_apptest(parametros_cliente, sessoes, tamanho_edital, nonce, timeout_s):
+    with ProcessPoolExecutor(max_workers=sessoes, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futuros = [
+            executor.submit(_sessao_apptest, indice, parametros_cliente, tamanho_edital, nonce, timeout_s)
+            for indice in range(sessoes)
+        ]
+        resultados = [futuro.result() for futuro in futuros]
+
+    propostas = [r["proposta_ms"] for r in resultados]
+    duracao = max(r["fim_proposta"] for r in resultados) - min(r["inicio_proposta"] for r in resultados)
+    return {
+        "sessoes": sessoes,
+        "propostas": sessoes,
+        "falhas": sum(r["erros"] for r in resultados),
+        "latencia_p50_ms": _percentil(propostas, 50),
+        "latencia_p95_ms": _percentil(propostas, 95),
+        "busca_p50_ms": _percentil([r["busca_ms"] for r in resultados], 50),
+        "duracao_s": round(duracao, 3),
+        "chamadas_gemini": sum(r["chamadas"] for r in resultados),
+        "chamadas_por_proposta": round(sum(r["chamadas_proposta"] for r in resultados) / sessoes, 2),
+        "tokens_por_proposta": round(sum(r["tokens_proposta"] for r in resultados) / sessoes, 1),
+        "custo_por_proposta_usd": round(sum(r["custo_usd"] for r in resultados) / sessoes, 6),
+        "propostas_por_segundo": round(sessoes / duracao, 3) if duracao > 0 else None,
+        "pico_memoria_mb": round(max(r["pico_rss_mb"] for r in resultados), 2),
+    }
+
+
+# Módulos importados no topo do main.py, na ordem em que aparecem
+def _modulos_main():
+    with open(os.path.join(DIRETORIO, "main.py"), encoding="utf-8") as arquivo:
+        arvore = ast.parse(arquivo.read())
+    modulos = []
+    for no in arvore.body:
+        if isinstance(no, ast.Import):
+            modulos.extend(alias.name for alias in no.names)
+        elif isinstance(no, ast.ImportFrom) and no.module and not no.level:
+            modulos.append(no.module)
+    return list(dict.fromkeys(modulos))
+
+
+# Mede, em processos novos, o tempo de importação do app e confere que as dependências pesadas
+# ficam de fora; o menor tempo das repetições descarta ruído do sistema
+def cenario_importacao(repeticoes, orcamento_ms):
+    modulos = _modulos_main()
+    codigo = (
+        "import json, sys, time\n"
+        "inicio = time.perf_counter()\n"
+        f"import {', '.join(modulos)}\n"
+        "duracao = (time.perf_counter() - inicio) * 1000\n"
+        f"print(json.dumps([duracao, [m for m in {MODULOS_SOB_DEMANDA!r} if m in sys.modules]]))"
+    )
+    tempos, carregados = [], set()
+    for _ in range(repeticoes):
+        processo = subprocess.run(
+            [sys.executable, "-c", codigo], cwd=DIRETORIO, capture_output=True, text=True, timeout=120, check=True
+        )
+        duracao, pesados = json.loads(processo.stdout.strip().splitlines()[-1])
+        tempos.append(duracao)
+        carregados.update(pesados)
+    importacao_ms = round(min(tempos), 1)
+    return {
+        "modulos": modulos,
+        "importacao_ms": importacao_ms,
+        "importacao_p50_ms": _percentil(tempos, 50),
+        "orcamento_ms": orcamento_ms,
+        "carregados_sem_uso": sorted(carregados),
+        "dentro_do_orcamento": importacao_ms <= orcamento_ms and not carregados,
+    }
+
+
+# Compara com um resultado anterior e retorna as métricas que pioraram além da tolerância
+def comparar(resultados, anterior, tolerancia):
+    regressoes = []
+    for nome, cenario in resultados["cenarios"].items():
+        base = anterior.get("cenarios", {}).get(nome)
+        if not base:
+            continue
+        for metrica, maior_e_pior in METRICAS_REGRESSAO.items():
+            atual, referencia = cenario.get(metrica), base.get(metrica)
+            if atual is None or not referencia:
+                continue
+            variacao = (atual - referencia) / referencia
+            if (variacao if maior_e_pior else -variacao) > tolerancia:
+                regressoes.append(f"{nome}.{metrica}: {referencia} -> {atual} ({variacao:+.0%})")
+    return regressoes
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=DIRETORIO, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline de geração com um Gemini simulado")
+    parser.add_argument("--saida", default="bench_resultados.json", help="Arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="Resultado anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="Piora relativa aceita na comparação")
+    parser.add_argument("--cenarios", default="importacao,sequencial,longo,concorrente,pico,apptest",
+                        help="Cenários separados por vírgula: importacao, sequencial, longo, concorrente, pico, apptest")
+    parser.add_argument("--propostas", type=int, default=5, help="Propostas por cenário sequencial")
+    parser.add_argument("--sessoes", type=int, default=8, help="Sessões simultâneas nos cenários concorrentes")
+    parser.add_argument("--tamanho-edital", type=int, default=3000, help="Tamanho dos editais curtos, em caracteres")
+    parser.add_argument("--tamanho-edital-longo", type=int, default=40000, help="Tamanho do edital longo")
+    parser.add_argument("--latencia-mediana-ms", type=float, default=300.0)
+    parser.add_argument("--latencia-sigma", type=float, default=0.4, help="Dispersão log-normal da latência")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração das chamadas que falham com 503")
+    parser.add_argument("--tokens-saida", type=int, default=250, help="Tokens das respostas de texto livre")
+    parser.add_argument("--tokens-pensamento", type=int, default=200,
+                        help="Tokens de raciocínio por chamada sem orçamento de raciocínio")
+    parser.add_argument("--ms-por-token", type=float, default=0.0,
+                        help="Tempo de geração por token de saída, somado à latência")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--timeout-apptest", type=float, default=120.0)
+    parser.add_argument("--orcamento-importacao-ms", type=float, default=1500.0,
+                        help="Tempo máximo de importação do app em um processo novo")
+    parser.add_argument("--repeticoes-importacao", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Caches e índices vão para um diretório temporário e o MongoDB fica desligado. Os secrets.toml do
+    # desenvolvedor são ignorados, para não apontarem o benchmark para um banco ou cota reais
+    diretorio_temporario = tempfile.mkdtemp(prefix="bench_propostas_")
+    os.environ["CONFIG_IGNORAR_SECRETS"] = "1"
+    os.environ["CACHE_GEMINI_PATH"] = os.path.join(diretorio_temporario, "cache_gemini.sqlite3")
+    os.environ["CACHE_BUSCA_PATH"] = os.path.join(diretorio_temporario, "cache_buscas.sqlite3")
+    os.environ["DUPLICATAS_PATH"] = os.path.join(diretorio_temporario, "indice_desafios.bin")
+    os.environ["MONGODB_URI"] = ""
+    # As cotas reais limitariam a vazão medida; defina GEMINI_RPM/GEMINI_TPM para simulá-las
+    os.environ.setdefault("GEMINI_RPM", "1000000")
+    os.environ.setdefault("GEMINI_TPM", "1000000000")
+
+    parametros_cliente = {
+        "latencia_mediana_ms": args.latencia_mediana_ms,
+        "latencia_sigma": args.latencia_sigma,
+        "taxa_erro": args.taxa_erro,
+        "tokens_saida": args.tokens_saida,
+        "tokens_pensamento": args.tokens_pensamento,
+        "ms_por_token": args.ms_por_token,
+        "semente": args.semente,
+    }
+    cliente = ClienteSimulado(**parametros_cliente)
+    genai.Client = lambda *a, **k: cliente
+
+    nonce = f"{time.time_ns()}"
+    cenarios = [nome.strip() for nome in args.cenarios.split(",") if nome.strip()]
+    resultados = {
+        "data": datetime.now().isoformat(),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "parametros": vars(args),
+        "cenarios": {},
+    }
+
+    try:
+        for nome in cenarios:
+            print(f"Executando cenário {nome}...", file=sys.stderr)
+            if nome == "importacao":
+                resultados["cenarios"]["importacao"] = cenario_importacao(
+                    args.repeticoes_importacao, args.orcamento_importacao_ms
+                )
+            elif nome == "sequencial":
+                for modo in ("automatica", "estruturada"):
+                    resultados["cenarios"][f"sequencial_{modo}"] = cenario_sequencial(
+                        cliente, modo, args.propostas, args.tamanho_edital, nonce
+                    )
+            elif nome == "longo":
+                resultados["cenarios"]["edital_longo"] = cenario_sequencial(
+                    cliente, "automatica", max(1, args.propostas // 2), args.tamanho_edital_longo, nonce
+                )
+            elif nome == "concorrente":
+                resultados["cenarios"]["concorrente"] = cenario_concorrente(
+                    cliente, args.sessoes, 2, args.tamanho_edital, nonce
+                )
+            elif nome == "pico":
+                resultados["cenarios"]["pico"] = cenario_concorrente(
+                    cliente, args.sessoes, 1, args.tamanho_edital, nonce, mesmo_edital=True
+                )
+            elif nome == "apptest":
+                resultados["cenarios"]["apptest"] = cenario_apptest(
+                    parametros_cliente, args.sessoes, args.tamanho_edital, nonce, args.timeout_apptest
+                )
+            else:
+                parser.error(f"cenário desconhecido: {nome}")
+    finally:
+        shutil.rmtree(diretorio_temporario, ignore_errors=True)
+
+    resultados["pico_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+
+    falhas_importacao = []
+    importacao = resultados["cenarios"].get("importacao")
+    if importacao:
+        print(
+            f"importacao: {importacao['importacao_ms']} ms (orçamento {importacao['orcamento_ms']} ms) | "
+            f"carregados sem uso: {', '.join(importacao['carregados_sem_uso']) or 'nenhum'}"
+        )
+        if not importacao["dentro_do_orcamento"]:
+            falhas_importacao.append("importação do app fora do orçamento")
+
+    for nome, cenario in resultados["cenarios"].items():
+        if nome == "importacao":
+            continue
+        print(
+            f"{nome}: p50 {cenario.get('latencia_p50_ms')} ms | p95 {cenario.get('latencia_p95_ms')} ms | "
+            f"{cenario.get('chamadas_por_proposta')} chamadas/proposta | "
+            f"{cenario.get('tokens_por_proposta')} tokens/proposta | "
+            f"US$ {cenario.get('custo_por_proposta_usd')}/proposta | "
+            f"{cenario.get('propostas_por_segundo')} propostas/s | pico {cenario['pico_memoria_mb']} MB"
+        )
+    print(f"Resultados em {args.saida}")
+
+    for falha in falhas_importacao:
+        print(f"FALHA {falha}")
+    regressoes = []
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            regressoes = comparar(resultados, json.load(arquivo), args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO {regressao}")
+    return 1 if regressoes or falhas_importacao else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from google.genai import types
+
+from cache_gemini import DIRETORIO_PADRAO, CacheRespostas
+from config import obter_config, obter_config_numero
+from gemini import gerar_conteudo
+from rotas import obter_modelo
+
+# Palavras que não mudam o sentido da busca
+PALAVRAS_IGNORADAS = {"a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "em", "para", "com", "por"}
+
+
+# Remove acentos, caixa e espaços repetidos
+def normalizar_texto(texto):
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", texto.lower()).strip()
+
+
+# Normaliza as palavras-chave em uma lista ordenada e sem repetições
+def normalizar_palavras_chave(palavras_chave):
+    termos = re.split(r"[,;\s]+", normalizar_texto(palavras_chave))
+    return sorted({t for t in termos if t and t not in PALAVRAS_IGNORADAS})
+
+
+# Gera a chave canônica de uma busca
+def chave_busca(tipo_busca, **campos):
+    canonico = {"tipo_busca": tipo_busca}
+    for nome, valor in campos.items():
+        canonico[nome] = valor if isinstance(valor, list) else normalizar_texto(valor)
+    material = json.dumps(canonico, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# Chave canônica da busca de editais abertos na web
+def chave_busca_editais_abertos(palavras_chave, area_interesse, tipo_edital):
+    return chave_busca(
+        "editais_abertos_web",
+        palavras_chave=normalizar_palavras_chave(palavras_chave),
+        area_interesse=area_interesse,
+        tipo_edital=tipo_edital
+    )
+
+
+# Janela de validade dos resultados de busca
+def ttl_buscas():
+    return obter_config_numero("CACHE_BUSCA_TTL_HORAS", 6.0) * 3600
+
+
+_cache_buscas = None
+_cache_buscas_lock = threading.Lock()
+
+
+# Retorna o cache de buscas compartilhado pelo processo
+def obter_cache_buscas():
+    global _cache_buscas
+    with _cache_buscas_lock:
+        if _cache_buscas is None:
+            _cache_buscas = CacheRespostas(
+                caminho=obter_config("CACHE_BUSCA_PATH", os.path.join(DIRETORIO_PADRAO, "buscas.sqlite3")),
+                ttl_segundos=ttl_buscas(),
+                max_itens_memoria=128,
+            )
+        return _cache_buscas
+
+
+# Retorna (resultado, fontes) de uma busca ainda válida ou None
+def obter_busca_em_cache(chave):
+    valor = obter_cache_buscas().obter(chave)
+    if valor is None:
+        return None
+    dados = json.loads(valor)
+    return dados["resultado"], dados["fontes"]
+
+
+# Guarda o resultado da busca junto com as URIs das fontes
+def salvar_busca_em_cache(chave, resultado, fontes):
+    obter_cache_buscas().salvar(chave, json.dumps({"resultado": resultado, "fontes": fontes}, ensure_ascii=False))
+
+
+# Extrai as URIs das fontes do grounding da resposta
+def extrair_fontes(response, limite=5):
+    fontes = []
+    if not response.candidates:
+        return fontes
+    metadata = response.candidates[0].grounding_metadata
+    if metadata is None or not metadata.grounding_chunks:
+        return fontes
+    for chunk in metadata.grounding_chunks[:limite]:
+        if chunk.web is not None and chunk.web.uri:
+            fontes.append(chunk.web.uri)
+    return fontes
+
+
+# Função para buscar editais abertos com Web Search, retornando também as URIs das fontes;
+# com renovar, a busca é refeita na web e substitui o resultado guardado
+def buscar_editais_abertos_web_com_fontes(client, palavras_chave, area_interesse, tipo_edital, renovar=False):
+    chave = chave_busca_editais_abertos(palavras_chave, area_interesse, tipo_edital)
+    em_cache = None if renovar else obter_busca_em_cache(chave)
+    if em_cache is not None:
+        return em_cache
+
+    grounding_tool = types.Tool(
+        google_search=types.GoogleSearch()
+    )
+
+    config = types.GenerateContentConfig(
+        tools=[grounding_tool],
+        temperature=0.3
+    )
+
+    prompt = f'''
+    Busque por EDITAIS ABERTOS E ATIVOS em todo o mundo para projetos de inovação, tecnologia e P&D.
+
+    PALAVRAS-CHAVE: {palavras_chave}
+    ÁREA DE INTERESSE: {area_interesse}
+    TIPO DE EDITAL: {tipo_edital}
+
+    Foque em encontrar editais ativos de:
+    - Empresas de energia e utilities
+    - Órgãos governamentais
+    - Fundações de pesquisa
+    - Programas de inovação
+    - Agências de fomento
+    - Empresas de tecnologia
+    - Startups e venture capital
+
+    Forneça informações detalhadas sobre:
+    - Nome completo do edital
+    - Organização responsável
+    - Prazo de submissão (especificar se está aberto)
+    - Valor disponível ou faixa de financiamento
+    - Link oficial para mais informações
+    - Áreas temáticas cobertas
+    - Requisitos de elegibilidade
+    - Contatos importantes
+
+    Priorize editais com prazos em aberto e forneça informações atualizadas.
+    '''
+
+    try:
+        response = gerar_conteudo(
+            client,
+            model=obter_modelo("busca_editais_abertos"),
+            contents=prompt,
+            config=config,
+            ttl_segundos=ttl_buscas(),
+            tipo_prompt="busca_editais_abertos",
+            renovar=renovar
+        )
+
+        resultado = response.text
+        # Uma resposta sem texto (ex.: bloqueada) não é guardada no cache
+        if not resultado:
+            return "Erro na busca: resposta sem texto", []
+
+        # Adicionar informações das fontes se disponíveis
+        fontes = extrair_fontes(response)
+        if fontes:
+            resultado += "\n\n---\n**FONTES E REFERÊNCIAS:**\n"
+            for i, uri in enumerate(fontes):
+                resultado += f"\n{i+1}. {uri}"
+
+        salvar_busca_em_cache(chave, resultado, fontes)
+        return resultado, fontes
+
+    except Exception as e:
+        return f"Erro na busca: {str(e)}", []
+
+
+# Função para buscar editais abertos com Web Search
+def buscar_editais_abertos_web(client, palavras_chave, area_interesse, tipo_edital):
+    return buscar_editais_abertos_web_com_fontes(client, palavras_chave, area_interesse, tipo_edital)[0]
+
+
+# Função para buscar editais específicos
+def buscar_editais_especificos(client, descricao_solucao, palavras_chave, area_atuacao, inovacao):
+    chave = chave_busca(
+        "editais_especificos",
+        descricao_solucao=descricao_solucao,
+        palavras_chave=normalizar_palavras_chave(palavras_chave),
+        area_atuacao=area_atuacao,
+        inovacao=inovacao
+    )
+    em_cache = obter_busca_em_cache(chave)
+    if em_cache is not None:
+        return em_cache[0]
+
+    grounding_tool = types.Tool(
+        google_search=types.GoogleSearch()
+    )
+
+    config = types.GenerateContentConfig(
+        tools=[grounding_tool],
+        temperature=0.3
+    )
+
+    prompt = f'''
+    Busque por EDITAIS ABERTOS adequados para esta solução específica:
+
+    DESCRIÇÃO DA SOLUÇÃO: {descricao_solucao}
+    ÁREA DE ATUAÇÃO: {area_atuacao}
+    ELEMENTOS INOVADORES: {inovacao}
+    PALAVRAS-CHAVE: {palavras_chave}
+
+    Encontre editais ativos que se alinhem com esta solução.
+    '''
+
+    try:
+        response = gerar_conteudo(
+            client,
+            model=obter_modelo("busca_editais_especificos"),
+            contents=prompt,
+            config=config,
+            ttl_segundos=ttl_buscas(),
+            tipo_prompt="busca_editais_especificos"
+        )
+        if not response.text:
+            return "Erro na busca: resposta sem texto"
+        salvar_busca_em_cache(chave, response.text, extrair_fontes(response))
+        return response.text
+    except Exception as e:
+        return f"Erro na busca: {str(e)}"
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import obter_config, obter_config_numero
+
+DIRETORIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+# Gera a chave do cache a partir do modelo, do prompt e da configuração da chamada.
+# chave_contexto identifica o conteúdo de um cache explícito do Gemini, cujo nome muda a cada proposta
+def gerar_chave(model, contents, config=None, chave_contexto=None):
+    if hasattr(contents, "model_dump"):
+        contents = contents.model_dump(mode="json", exclude_none=True)
+    elif isinstance(contents, list):
+        contents = [c.model_dump(mode="json", exclude_none=True) if hasattr(c, "model_dump") else c for c in contents]
+
+    config_serializada = None
+    if config is not None:
+        config_serializada = config.model_dump(
+            mode="json", exclude_none=True, exclude={"response_schema", "http_options", "cached_content"}
+        )
+        schema = config.response_schema
+        if schema is not None:
+            # Esquemas pydantic são classes e não são serializáveis diretamente
+            config_serializada["response_schema"] = (
+                schema.model_json_schema() if hasattr(schema, "model_json_schema") else str(schema)
+            )
+        # Uma configuração vazia (por exemplo, só com o cache explícito) gera a mesma chave que nenhuma
+        config_serializada = config_serializada or None
+
+    dados = {"model": model, "contents": contents, "config": config_serializada}
+    if chave_contexto is not None:
+        dados["contexto"] = chave_contexto
+    material = json.dumps(dados, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# Cache de respostas em dois níveis: LRU em memória e SQLite em disco
+class CacheRespostas:
+    def __init__(self, caminho, ttl_segundos, max_itens_memoria=256, max_bytes_disco=100 * 1024 * 1024):
+        self.caminho = caminho
+        self.ttl_segundos = ttl_segundos
+        self.max_itens_memoria = max_itens_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._conexao = None
+        try:
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+            self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=10)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute(
+                """CREATE TABLE IF NOT EXISTS respostas (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT NOT NULL,
+                    criado_em REAL NOT NULL,
+                    acessado_em REAL NOT NULL,
+                    tamanho INTEGER NOT NULL
+                )"""
+            )
+            self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_acessado_em ON respostas (acessado_em)")
+            self._conexao.commit()
+        except sqlite3.Error:
+            # Sem disco disponível o cache continua funcionando apenas em memória
+            self._conexao = None
+
+    def obter(self, chave, ttl_segundos=None):
+        ttl = self.ttl_segundos if ttl_segundos is None else ttl_segundos
+        agora = time.time()
+        with self._lock:
+            item = self._memoria.get(chave)
+            if item is not None:
+                valor, criado_em = item
+                if agora - criado_em <= ttl:
+                    self._memoria.move_to_end(chave)
+                    self.acertos_memoria += 1
+                    return valor
+                del self._memoria[chave]
+
+            if self._conexao is not None:
+                try:
+                    linha = self._conexao.execute(
+                        "SELECT valor, criado_em FROM respostas WHERE chave = ?", (chave,)
+                    ).fetchone()
+                    if linha is not None and agora - linha[1] <= ttl:
+                        self._conexao.execute(
+                            "UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave)
+                        )
+                        self._conexao.commit()
+                        self._guardar_memoria(chave, linha[0], linha[1])
+                        self.acertos_disco += 1
+                        return linha[0]
+                except sqlite3.Error:
+                    pass
+
+            self.falhas += 1
+            return None
+
+    def salvar(self, chave, valor):
+        agora = time.time()
+        with self._lock:
+            self._guardar_memoria(chave, valor, agora)
+            if self._conexao is None:
+                return
+            try:
+                self._conexao.execute(
+                    "INSERT OR REPLACE INTO respostas (chave, valor, criado_em, acessado_em, tamanho) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (chave, valor, agora, agora, len(valor.encode("utf-8")))
+                )
+                self._remover_excedentes(agora)
+                self._conexao.commit()
+            except sqlite3.Error:
+                pass
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "acertos_memoria": self.acertos_memoria,
+                "acertos_disco": self.acertos_disco,
+                "falhas": self.falhas,
+                "itens_memoria": len(self._memoria),
+            }
+
+    def _guardar_memoria(self, chave, valor, criado_em):
+        self._memoria[chave] = (valor, criado_em)
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_itens_memoria:
+            self._memoria.popitem(last=False)
+
+    def _remover_excedentes(self, agora):
+        # Expiração por TTL e depois remoção dos menos acessados até caber no limite de tamanho
+        self._conexao.execute("DELETE FROM respostas WHERE criado_em < ?", (agora - self.ttl_segundos,))
+        total = self._conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        if total <= self.max_bytes_disco:
+            return
+        excesso = total - self.max_bytes_disco
+        removidos = 0
+        for chave, tamanho in self._conexao.execute(
+            "SELECT chave, tamanho FROM respostas ORDER BY acessado_em"
+        ).fetchall():
+            if removidos >= excesso:
+                break
+            self._conexao.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+            removidos += tamanho
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Retorna o cache compartilhado pelo processo
+def obter_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheRespostas(
+                caminho=obter_config("CACHE_GEMINI_PATH", os.path.join(DIRETORIO_PADRAO, "gemini.sqlite3")),
+                ttl_segundos=obter_config_numero("CACHE_GEMINI_TTL_HORAS", 24.0) * 3600,
+                max_itens_memoria=obter_config_numero("CACHE_GEMINI_MAX_ITENS_MEMORIA", 256),
+                max_bytes_disco=obter_config_numero("CACHE_GEMINI_MAX_MB", 100) * 1024 * 1024,
+            )
+        return _cache
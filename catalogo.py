@@ -0,0 +1,279 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Optional
+
+from google.genai import types
+from pydantic import BaseModel
+
+from busca_editais import buscar_editais_abertos_web_com_fontes, chave_busca_editais_abertos, normalizar_texto
+from clientes import obter_cliente_mongo
+from config import obter_config_numero
+from gemini import gerar_conteudo
+from instrumentacao import medir, propagar
+from rotas import obter_modelo
+
+# O pymongo é importado dentro das funções, só quando o catálogo é usado
+
+
+# Esquema dos editais extraídos do resultado da busca
+class EditalExtraido(BaseModel):
+    nome: str
+    organizacao: str
+    prazo: Optional[str] = None
+    valor: Optional[str] = None
+    link: Optional[str] = None
+    temas: list[str] = []
+
+
+class ListaEditais(BaseModel):
+    editais: list[EditalExtraido]
+
+
+# Cria os índices do catálogo
+def garantir_indices_catalogo(collection, collection_buscas):
+    from pymongo import ASCENDING
+
+    collection.create_index([("chave", ASCENDING)], unique=True)
+    collection.create_index([("prazo", ASCENDING)])
+    collection.create_index([("chaves_busca", ASCENDING), ("prazo", ASCENDING)])
+    collection_buscas.create_index([("chave_busca", ASCENDING)], unique=True)
+
+
+_indices_criados = False
+
+
+# Retorna as coleções do catálogo e das buscas já feitas, ou None se o MongoDB não estiver disponível
+def obter_colecoes_catalogo():
+    global _indices_criados
+    cliente = obter_cliente_mongo()
+    if cliente is None:
+        return None
+    db = cliente['propostas_editais']
+    collection, collection_buscas = db['catalogo_editais'], db['buscas_catalogo']
+    if not _indices_criados:
+        garantir_indices_catalogo(collection, collection_buscas)
+        _indices_criados = True
+    return collection, collection_buscas
+
+
+# Chave do edital no catálogo: o link normalizado ou, sem link, nome e organização normalizados
+def chave_edital(edital):
+    if edital.get("link"):
+        link = edital["link"].strip().lower()
+        link = re.sub(r"^https?://", "", link)
+        link = re.sub(r"^www\.", "", link)
+        link = link.split("#")[0].split("?")[0].rstrip("/")
+        if link:
+            return f"link:{link}"
+    return f"nome:{normalizar_texto(edital.get('nome'))}|{normalizar_texto(edital.get('organizacao'))}"
+
+
+# Converte o prazo informado pelo modelo (AAAA-MM-DD) em data, se possível
+def converter_prazo(prazo):
+    if not prazo:
+        return None
+    try:
+        return datetime.strptime(prazo.strip()[:10], "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+# Extrai os editais do texto da busca em registros estruturados; com renovar, a resposta guardada é ignorada
+def extrair_editais(client, resultado_busca, renovar=False):
+    prompt = f'''
+    Extraia cada edital descrito no texto abaixo.
+    Use o prazo de submissão no formato AAAA-MM-DD (vazio se não informado).
+    Use o link oficial exatamente como aparece no texto.
+    Não invente editais nem campos que não estejam no texto.
+
+    TEXTO:
+    {resultado_busca}
+    '''
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=ListaEditais,
+        temperature=0
+    )
+    response = gerar_conteudo(
+        client, model=obter_modelo("extracao_editais"), contents=prompt, config=config,
+        tipo_prompt="extracao_editais", renovar=renovar
+    )
+    resultado = response.parsed
+    if not isinstance(resultado, ListaEditais):
+        resultado = ListaEditais.model_validate_json(response.text)
+    return [edital.model_dump() for edital in resultado.editais]
+
+
+# Insere ou atualiza os editais no catálogo e registra a atualização da busca; os editais que a busca
+# trazia antes e não trouxe agora deixam de ser associados a ela
+def atualizar_catalogo(collection, collection_buscas, chave_busca, editais, fontes):
+    from pymongo import UpdateOne
+
+    agora = datetime.now()
+    chaves = [chave_edital(edital) for edital in editais]
+    operacoes = []
+    for chave, edital in zip(chaves, editais):
+        operacoes.append(UpdateOne(
+            {"chave": chave},
+            {
+                "$set": {
+                    "nome": edital["nome"],
+                    "organizacao": edital["organizacao"],
+                    "prazo": converter_prazo(edital.get("prazo")),
+                    "prazo_texto": edital.get("prazo"),
+                    "valor": edital.get("valor"),
+                    "link": edital.get("link"),
+                    "temas": edital.get("temas", []),
+                    "atualizado_em": agora,
+                },
+                "$addToSet": {"chaves_busca": chave_busca, "fontes": {"$each": fontes}},
+                "$setOnInsert": {"criado_em": agora},
+            },
+            upsert=True
+        ))
+    if operacoes:
+        with medir("mongo.bulk_write", colecao="catalogo_editais", documentos=len(operacoes)):
+            collection.bulk_write(operacoes, ordered=False)
+    with medir("mongo.update_many", colecao="catalogo_editais"):
+        collection.update_many(
+            {"chaves_busca": chave_busca, "chave": {"$nin": chaves}},
+            {"$pull": {"chaves_busca": chave_busca}}
+        )
+    collection_buscas.update_one(
+        {"chave_busca": chave_busca},
+        {"$set": {"atualizado_em": agora, "total_editais": len(editais)}},
+        upsert=True
+    )
+
+
+# Retorna os editais em aberto de uma busca, ou None se a busca nunca foi feita ou está desatualizada
+def consultar_catalogo(collection, collection_buscas, chave_busca):
+    from pymongo import ASCENDING, DESCENDING
+
+    validade = timedelta(hours=obter_config_numero("CATALOGO_VALIDADE_HORAS", 24.0))
+    busca = collection_buscas.find_one({"chave_busca": chave_busca}, {"_id": 0, "atualizado_em": 1})
+    if busca is None or datetime.now() - busca["atualizado_em"] > validade:
+        return None
+
+    hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    cursor = collection.find(
+        {"chaves_busca": chave_busca, "$or": [{"prazo": {"$gte": hoje}}, {"prazo": None}]},
+        {"_id": 0, "nome": 1, "organizacao": 1, "prazo": 1, "prazo_texto": 1, "valor": 1,
+         "link": 1, "temas": 1, "fontes": 1, "atualizado_em": 1}
+    ).sort([("prazo", ASCENDING), ("atualizado_em", DESCENDING)])
+    return list(cursor), busca["atualizado_em"]
+
+
+# Registro de um edital extraído no mesmo formato dos documentos do catálogo
+def registro_edital(edital, fontes):
+    return {
+        "nome": edital["nome"],
+        "organizacao": edital["organizacao"],
+        "prazo": converter_prazo(edital.get("prazo")),
+        "prazo_texto": edital.get("prazo"),
+        "valor": edital.get("valor"),
+        "link": edital.get("link"),
+        "temas": edital.get("temas", []),
+        "fontes": list(fontes),
+    }
+
+
+# Busca os editais de uma área e um tipo: usa o catálogo se a busca for recente; senão busca na web,
+# extrai os editais e atualiza o catálogo. Sem MongoDB, os editais só são extraídos com extrair=True.
+# forcar_atualizacao ignora também os caches da busca e da extração, para trazer resultados novos da web
+def buscar_editais_catalogados(client, colecoes_catalogo, palavras_chave, area_interesse, tipo_edital,
+                               forcar_atualizacao=False, extrair=False):
+    chave = chave_busca_editais_abertos(palavras_chave, area_interesse, tipo_edital)
+    resultado = {
+        "area_interesse": area_interesse,
+        "tipo_edital": tipo_edital,
+        "editais": [],
+        "fontes": [],
+        "resultado_busca": None,
+        "do_catalogo": False,
+        "atualizado_em": None,
+        "erro": None,
+        "erro_catalogo": None,
+    }
+
+    if colecoes_catalogo is not None and not forcar_atualizacao:
+        consulta = consultar_catalogo(*colecoes_catalogo, chave)
+        if consulta is not None:
+            resultado["editais"], resultado["atualizado_em"] = consulta
+            resultado["fontes"] = sorted({fonte for edital in consulta[0] for fonte in edital.get("fontes", [])})
+            resultado["do_catalogo"] = True
+            return resultado
+
+    resultado_busca, fontes = buscar_editais_abertos_web_com_fontes(
+        client, palavras_chave, area_interesse, tipo_edital, renovar=forcar_atualizacao
+    )
+    resultado["resultado_busca"], resultado["fontes"] = resultado_busca, fontes
+    if resultado_busca.startswith("Erro na busca:"):
+        resultado["erro"] = resultado_busca
+        return resultado
+
+    try:
+        if colecoes_catalogo is not None:
+            atualizar_catalogo(
+                *colecoes_catalogo, chave, extrair_editais(client, resultado_busca, forcar_atualizacao), fontes
+            )
+            resultado["editais"], resultado["atualizado_em"] = consultar_catalogo(*colecoes_catalogo, chave)
+        elif extrair:
+            # Mesmo filtro de prazo da consulta ao catálogo
+            hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            editais = [
+                registro_edital(edital, fontes)
+                for edital in extrair_editais(client, resultado_busca, forcar_atualizacao)
+            ]
+            resultado["editais"] = [edital for edital in editais if edital["prazo"] is None or edital["prazo"] >= hoje]
+    except Exception as e:
+        resultado["erro_catalogo"] = str(e)
+    return resultado
+
+
+# Busca as combinações (área, tipo) em paralelo, no máximo max_paralelo ao mesmo tempo,
+# entregando o resultado de cada uma assim que termina
+def buscar_combinacoes(client, colecoes_catalogo, palavras_chave, combinacoes, filtros="",
+                       forcar_atualizacao=False, max_paralelo=4):
+    executor = ThreadPoolExecutor(max_workers=max_paralelo)
+    try:
+        futuros = {
+            executor.submit(
+                propagar(buscar_editais_catalogados), client, colecoes_catalogo, palavras_chave,
+                area_interesse, tipo_edital + filtros, forcar_atualizacao, True
+            ): (area_interesse, tipo_edital)
+            for area_interesse, tipo_edital in combinacoes
+        }
+        for futuro in as_completed(futuros):
+            area_interesse, tipo_edital = futuros[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                resultado = {"editais": [], "fontes": [], "do_catalogo": False, "erro": str(e)}
+            # O tipo é exibido sem os filtros acrescentados à busca
+            resultado.update(area_interesse=area_interesse, tipo_edital=tipo_edital)
+            yield resultado
+    finally:
+        # Se a página for interrompida, as buscas que ainda não começaram são canceladas
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Junta os editais de várias buscas sem repetições (mesma chave do catálogo), unindo as fontes,
+# os temas e as buscas que encontraram cada edital; ordena pelo prazo mais próximo
+def mesclar_editais(resultados):
+    mesclados = {}
+    for resultado in resultados:
+        busca = f"{resultado['area_interesse']} / {resultado['tipo_edital']}"
+        for edital in resultado["editais"]:
+            atual = mesclados.setdefault(chave_edital(edital), {**edital, "fontes": [], "temas": [], "buscas": []})
+            for campo in ("prazo", "prazo_texto", "valor", "link"):
+                if not atual.get(campo) and edital.get(campo):
+                    atual[campo] = edital[campo]
+            for campo, valores in (("fontes", edital.get("fontes", [])), ("temas", edital.get("temas", [])),
+                                   ("buscas", [busca])):
+                atual[campo].extend(valor for valor in valores if valor not in atual[campo])
+    return sorted(
+        mesclados.values(),
+        key=lambda edital: (edital["prazo"] is None, edital["prazo"] or datetime.max, normalizar_texto(edital["nome"]))
+    )
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from google import genai
+
+from config import obter_config, obter_config_numero
+
+_lock = threading.Lock()
+_clientes_gemini = {}
+# Lock próprio do MongoDB: uma verificação lenta da conexão não bloqueia quem só precisa do cliente Gemini
+_lock_mongo = threading.Lock()
+_cliente_mongo = None
+_uri_mongo = None
+_ultima_verificacao_mongo = 0.0
+_ultima_falha_mongo = None
+
+
+# Retorna o cliente Gemini compartilhado pelo processo para a API key informada
+def obter_cliente_gemini(api_key):
+    with _lock:
+        cliente = _clientes_gemini.get(api_key)
+        if cliente is None:
+            cliente = genai.Client(api_key=api_key)
+            _clientes_gemini[api_key] = cliente
+        return cliente
+
+
+# Cria um MongoClient com o pool configurado
+def _criar_cliente_mongo(uri):
+    # O pymongo só é carregado quando há MongoDB configurado
+    from pymongo import MongoClient
+
+    return MongoClient(
+        uri,
+        maxPoolSize=obter_config_numero("MONGODB_MAX_POOL_SIZE", 20),
+        minPoolSize=obter_config_numero("MONGODB_MIN_POOL_SIZE", 0),
+        maxIdleTimeMS=obter_config_numero("MONGODB_MAX_IDLE_MS", 60000),
+        serverSelectionTimeoutMS=obter_config_numero("MONGODB_TIMEOUT_MS", 5000),
+        connectTimeoutMS=obter_config_numero("MONGODB_TIMEOUT_MS", 5000),
+    )
+
+
+# Retorna o MongoClient compartilhado, verificando a conexão de tempos em tempos
+# e reconectando em caso de falha. Retorna None se o MongoDB não estiver disponível;
+# depois de uma falha, só tenta reconectar quando o intervalo de verificação passar
+def obter_cliente_mongo(uri=None):
+    global _cliente_mongo, _uri_mongo, _ultima_verificacao_mongo, _ultima_falha_mongo
+
+    uri = uri or obter_config("MONGODB_URI")
+    if not uri:
+        return None
+
+    from pymongo.errors import PyMongoError
+
+    intervalo = obter_config_numero("MONGODB_INTERVALO_VERIFICACAO_S", 30.0)
+    with _lock_mongo:
+        agora = time.monotonic()
+        if _cliente_mongo is not None and _uri_mongo == uri and agora - _ultima_verificacao_mongo < intervalo:
+            return _cliente_mongo
+        if _ultima_falha_mongo is not None and _ultima_falha_mongo[0] == uri and agora - _ultima_falha_mongo[1] < intervalo:
+            return None
+
+        try:
+            if _cliente_mongo is None or _uri_mongo != uri:
+                if _cliente_mongo is not None:
+                    _cliente_mongo.close()
+                _cliente_mongo = _criar_cliente_mongo(uri)
+                _uri_mongo = uri
+            _cliente_mongo.admin.command("ping")
+            _ultima_verificacao_mongo = agora
+            _ultima_falha_mongo = None
+            return _cliente_mongo
+        except PyMongoError:
+            # Descarta o cliente com falha para reconectar na próxima tentativa
+            if _cliente_mongo is not None:
+                _cliente_mongo.close()
+            _cliente_mongo = None
+            _uri_mongo = None
+            _ultima_falha_mongo = (uri, time.monotonic())
+            return None
+
+
+# Força uma nova verificação da conexão na próxima chamada
+def invalidar_cliente_mongo():
+    global _ultima_verificacao_mongo
+    with _lock_mongo:
+        _ultima_verificacao_mongo = 0.0
+
+
+# Retorna a coleção de propostas ou None se o MongoDB não estiver disponível
+def obter_colecao_propostas():
+    cliente = obter_cliente_mongo()
+    if cliente is None:
+        return None
+    return cliente['propostas_editais']['propostas_geradas']
@@ -0,0 +1,102 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from google.genai import types
+
+from cache_gemini import obter_cache
+from config import obter_config_numero
+from gemini import gerar_conteudo
+from instrumentacao import propagar
+from rotas import obter_modelo
+
+# Versão do formato do brief, usada na chave do cache
+VERSAO_BRIEF = "1"
+
+
+# Divide o texto em blocos de até tamanho_bloco caracteres, respeitando parágrafos
+def dividir_em_blocos(texto, tamanho_bloco):
+    blocos = []
+    atual = ""
+    for paragrafo in texto.split("\n\n"):
+        while len(paragrafo) > tamanho_bloco:
+            if atual:
+                blocos.append(atual)
+                atual = ""
+            blocos.append(paragrafo[:tamanho_bloco])
+            paragrafo = paragrafo[tamanho_bloco:]
+        if len(atual) + len(paragrafo) + 2 > tamanho_bloco and atual:
+            blocos.append(atual)
+            atual = paragrafo
+        else:
+            atual = f"{atual}\n\n{paragrafo}" if atual else paragrafo
+    if atual.strip():
+        blocos.append(atual)
+    return blocos
+
+
+def _resumir_bloco(client, bloco, indice, total):
+    prompt = f'''
+    Resuma a PARTE {indice} de {total} de um edital de inovação.
+    Preserve código e nome do edital, objetivo do desafio, requisitos técnicos obrigatórios,
+    critérios de avaliação, prazos, valores, restrições e entregáveis.
+    Ignore textos jurídicos genéricos. Use tópicos curtos.
+
+    TEXTO:
+    {bloco}
+    '''
+    return gerar_conteudo(client, model=obter_modelo("resumo_bloco"), contents=prompt, tipo_prompt="resumo_bloco").text or ""
+
+
+def _reduzir_resumos(client, resumos, max_caracteres_brief):
+    prompt = f'''
+    Combine os resumos abaixo, das partes de um mesmo edital, em um BRIEF DO DESAFIO
+    com no máximo {max_caracteres_brief} caracteres.
+
+    Inclua, quando existirem:
+    CÓDIGO: [código do edital]
+    NOME: [nome do desafio]
+    OBJETIVO: [problema a ser resolvido]
+    REQUISITOS: [requisitos técnicos obrigatórios]
+    CRITÉRIOS: [critérios de avaliação]
+    RESTRIÇÕES: [prazos, valores e limitações]
+
+    RESUMOS:
+    {chr(10).join(resumos)}
+    '''
+    # O limite de saída acompanha o tamanho pedido para o brief, com folga
+    config = types.GenerateContentConfig(max_output_tokens=max_caracteres_brief * 5 // 16)
+    response = gerar_conteudo(client, model=obter_modelo("brief"), contents=prompt, config=config, tipo_prompt="brief")
+    return (response.text or "").strip()
+
+
+# Condensa um edital longo em um brief do desafio (map-reduce); textos curtos são devolvidos sem alteração
+def condensar_desafio(client, desafio_edital):
+    limiar = obter_config_numero("CONDENSACAO_LIMIAR_CARACTERES", 8000)
+    if len(desafio_edital) <= limiar:
+        return desafio_edital
+
+    cache = obter_cache()
+    chave = hashlib.sha256(f"brief:{VERSAO_BRIEF}:{limiar}:{desafio_edital}".encode("utf-8")).hexdigest()
+    brief = cache.obter(chave)
+    if brief is not None:
+        return brief
+
+    tamanho_bloco = obter_config_numero("CONDENSACAO_TAMANHO_BLOCO", 12000)
+    max_paralelo = obter_config_numero("CONDENSACAO_MAX_PARALELO", 5)
+
+    texto = desafio_edital
+    with ThreadPoolExecutor(max_workers=max_paralelo) as executor:
+        # Resumos muito longos passam por novas rodadas até caberem em uma única redução
+        while True:
+            blocos = dividir_em_blocos(texto, tamanho_bloco)
+            resumos = list(executor.map(
+                propagar(lambda args: _resumir_bloco(client, *args)),
+                [(bloco, i + 1, len(blocos)) for i, bloco in enumerate(blocos)]
+            ))
+            texto = "\n\n".join(resumos)
+            if len(texto) <= tamanho_bloco or len(blocos) == 1:
+                break
+
+    brief = _reduzir_resumos(client, resumos, max_caracteres_brief=max(limiar // 2, 2000)) or texto[:limiar]
+    cache.salvar(chave, brief)
+    return brief
@@ -0,0 +1,33 @@
+import os
+
+import streamlit as st
+
+# Fica False quando não há secrets.toml, para não procurar o arquivo a cada leitura
+_secrets_disponiveis = True
+
+
+# Lê uma configuração dos secrets do Streamlit ou das variáveis de ambiente. Com CONFIG_IGNORAR_SECRETS
+# no ambiente (ex.: no benchmark), só as variáveis de ambiente valem
+def obter_config(nome, padrao=None):
+    global _secrets_disponiveis
+    valor = None
+    if _secrets_disponiveis and not os.getenv("CONFIG_IGNORAR_SECRETS"):
+        try:
+            valor = st.secrets.get(nome)
+        except Exception:
+            # Sem secrets.toml (ex.: execução fora do Streamlit)
+            _secrets_disponiveis = False
+    if valor is None:
+        valor = os.getenv(nome, padrao)
+    return valor
+
+
+# Lê uma configuração numérica
+def obter_config_numero(nome, padrao):
+    valor = obter_config(nome)
+    if valor in (None, ""):
+        return padrao
+    try:
+        return type(padrao)(valor)
+    except (TypeError, ValueError):
+        return padrao
@@ -0,0 +1,129 @@
+import hashlib
+import threading
+
+from google.genai import types
+
+from config import obter_config_numero
+from gemini import chamar_gemini, chamar_gemini_agrupado, estimar_tokens, gerar_conteudo, resposta_em_cache
+from instrumentacao import medir, registrar_resposta
+from limites import obter_limitador
+from planejamento import aplicar_plano, registrar_plano
+from rotas import avaliar_resposta, obter_modelo
+
+# Resposta do modelo que fecha o primeiro turno da conversa usada sem cache explícito
+CONFIRMACAO_CONTEXTO = "Entendido. Vou usar o desafio e a solução acima nas próximas respostas."
+
+
+# Contexto longo (desafio + solução) compartilhado pelos prompts de uma proposta.
+# Usa o cache explícito do Gemini quando possível; senão, cada prompt vira o segundo turno
+# de uma conversa com o mesmo primeiro turno, o que permite ao Gemini reaproveitar o prefixo.
+# Com o cache explícito, todos os prompts vão para model, já que o cache é de um único modelo e
+# criar um por rota duplicaria o documento em cache; na conversa, cada prompt segue a rota do seu tipo
+class ContextoCompartilhado:
+    def __init__(self, client, model, texto_contexto):
+        self.client = client
+        self.model = model
+        self.texto_contexto = texto_contexto
+        self.chave = hashlib.sha256(texto_contexto.encode("utf-8")).hexdigest()
+        self.nome_cache = None
+        self.tokens_entrada = 0
+        self.tokens_em_cache = 0
+        self._lock = threading.Lock()
+        self._historico = [
+            types.Content(role="user", parts=[types.Part(text=texto_contexto)]),
+            types.Content(role="model", parts=[types.Part(text=CONFIRMACAO_CONTEXTO)]),
+        ]
+        # Contextos abaixo do mínimo de tokens aceito pelo cache explícito ficam na conversa
+        self.usar_cache = len(texto_contexto) // 4 >= obter_config_numero("CONTEXTO_CACHE_MIN_TOKENS", 1024)
+
+    @property
+    def modo(self):
+        return "cache explícito" if self.usar_cache else "conversa"
+
+    # Cria o cache explícito na primeira chamada que não estiver no cache local;
+    # se o Gemini recusar, as chamadas passam para a conversa
+    def _garantir_cache(self):
+        with self._lock:
+            if self.nome_cache or not self.usar_cache:
+                return self.nome_cache
+            ttl = int(obter_config_numero("CONTEXTO_CACHE_TTL_S", 600))
+            config = types.CreateCachedContentConfig(
+                contents=self._historico[:1],
+                display_name=f"proposta-{self.chave[:16]}",
+                ttl=f"{ttl}s",
+            )
+            try:
+                cache = obter_limitador().executar(
+                    lambda: self.client.caches.create(model=self.model, config=config),
+                    estimar_tokens(self.texto_contexto)
+                )
+                self.nome_cache = cache.name
+            except Exception:
+                self.usar_cache = False
+            return self.nome_cache
+
+    # Gera a resposta de um prompt que depende do contexto compartilhado; renovar ignora o cache local
+    def gerar_texto(self, prompt, tipo_prompt=None, renovar=False):
+        if self.usar_cache:
+            model = self.model
+            config = aplicar_plano(model, None, tipo_prompt)
+            # O nome do cache não entra na chave, então o cache local é consultado antes de criá-lo. O cache
+            # explícito é criado antes de abrir o span: se o Gemini recusar, a chamada segue pela conversa
+            # e fica registrada só no span de gerar_conteudo
+            response = None if renovar else resposta_em_cache(model, prompt, config, chave_contexto=self.chave)
+            if response is not None or self._garantir_cache():
+                with medir("gemini.generate_content", tipo_prompt=tipo_prompt, modelo=model,
+                           tamanho_prompt=len(prompt), contexto=self.modo) as span:
+                    # O contexto em cache também é entrada da chamada
+                    registrar_plano(span, self.texto_contexto + prompt, config)
+                    span["cache"] = "acerto" if response is not None else "falha"
+                    if response is None:
+                        config = (config or types.GenerateContentConfig()).model_copy(
+                            update={"cached_content": self.nome_cache}
+                        )
+                        if renovar:
+                            response = chamar_gemini(self.client, model, prompt, config, chave_contexto=self.chave)
+                        else:
+                            response = chamar_gemini_agrupado(
+                                span, self.client, model, prompt, config, chave_contexto=self.chave
+                            )
+                    registrar_resposta(span, response)
+                    avaliar_resposta(span, tipo_prompt, response.text)
+                self._registrar_uso(response.usage_metadata, prompt)
+                return response.text
+
+        model = obter_modelo(tipo_prompt) if tipo_prompt else self.model
+        contents = self._historico + [types.Content(role="user", parts=[types.Part(text=prompt)])]
+        response = gerar_conteudo(
+            self.client, model=model, contents=contents, chave_contexto=self.chave, tipo_prompt=tipo_prompt,
+            renovar=renovar
+        )
+        self._registrar_uso(response.usage_metadata, contents)
+        return response.text
+
+    def _registrar_uso(self, uso, contents):
+        with self._lock:
+            if uso is not None and uso.prompt_token_count:
+                self.tokens_entrada += uso.prompt_token_count
+                self.tokens_em_cache += uso.cached_content_token_count or 0
+            else:
+                self.tokens_entrada += estimar_tokens(contents)
+
+    # Tokens de entrada dos prompts antes e depois do desconto do prefixo em cache
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "modo": self.modo,
+                "tokens_entrada": self.tokens_entrada,
+                "tokens_em_cache": self.tokens_em_cache,
+                "tokens_processados": self.tokens_entrada - self.tokens_em_cache,
+            }
+
+    # Remove o cache explícito assim que a proposta termina
+    def encerrar(self):
+        if self.nome_cache:
+            try:
+                self.client.caches.delete(name=self.nome_cache)
+            except Exception:
+                pass
+            self.nome_cache = None
@@ -0,0 +1,187 @@
+import functools
+import hashlib
+import os
+import threading
+
+from busca_editais import normalizar_texto
+from cache_gemini import DIRETORIO_PADRAO
+from config import obter_config, obter_config_numero
+
+# Parâmetros do MinHash/LSH: 128 permutações em 32 faixas de 4 linhas
+NUM_PERMUTACOES = 128
+NUM_FAIXAS = 32
+TAMANHO_SHINGLE = 5
+
+# Primo maior que 2^32 para o hashing universal
+PRIMO = 4294967311
+
+# O numpy só é carregado quando o índice é usado pela primeira vez
+
+
+# Coeficientes fixos para que as assinaturas sejam estáveis entre execuções
+@functools.lru_cache(maxsize=None)
+def _coeficientes():
+    import numpy as np
+
+    gerador = np.random.default_rng(20240101)
+    coef_a = gerador.integers(1, 2 ** 32, size=NUM_PERMUTACOES, dtype=np.uint64)
+    coef_b = gerador.integers(0, 2 ** 32, size=NUM_PERMUTACOES, dtype=np.uint64)
+    return coef_a, coef_b
+
+
+# Cada registro do índice guarda o ID da proposta e a assinatura do desafio
+@functools.lru_cache(maxsize=None)
+def tipo_registro():
+    import numpy as np
+
+    return np.dtype([("id", "S36"), ("assinatura", "<u4", (NUM_PERMUTACOES,))])
+
+
+# Conjunto de shingles (sequências de palavras) do texto normalizado, como hashes de 32 bits
+def gerar_shingles(texto):
+    import numpy as np
+
+    palavras = normalizar_texto(texto).split()
+    if len(palavras) < TAMANHO_SHINGLE:
+        palavras = palavras + [""] * (TAMANHO_SHINGLE - len(palavras))
+    shingles = {" ".join(palavras[i:i + TAMANHO_SHINGLE]) for i in range(len(palavras) - TAMANHO_SHINGLE + 1)}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+        dtype=np.uint64
+    )
+
+
+# Assinatura MinHash do texto
+def gerar_assinatura(texto):
+    import numpy as np
+
+    coef_a, coef_b = _coeficientes()
+    shingles = gerar_shingles(texto)
+    hashes = (np.outer(coef_a, shingles) + coef_b[:, None]) % np.uint64(PRIMO)
+    return hashes.min(axis=1).astype(np.uint32)
+
+
+# Índice de desafios já processados, gravado em disco só por acréscimo e lido por memória mapeada
+class IndiceDuplicatas:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._registros = None
+        self._tamanho_lido = -1
+        self._lock = threading.Lock()
+
+    def adicionar(self, id_proposta, texto):
+        self.adicionar_assinatura(id_proposta, gerar_assinatura(texto))
+
+    def adicionar_assinatura(self, id_proposta, assinatura):
+        import numpy as np
+
+        registro = np.zeros(1, dtype=tipo_registro())
+        registro["id"] = id_proposta.encode("ascii")[:36]
+        registro["assinatura"] = assinatura
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        # Um único write em modo append mantém o registro inteiro mesmo com vários processos
+        with open(self.caminho, "ab") as arquivo:
+            arquivo.write(registro.tobytes())
+
+    # Retorna (id, similaridade estimada) do desafio mais parecido acima do limiar, ou None
+    def buscar(self, texto, limiar):
+        import numpy as np
+
+        registros = self._carregar()
+        if registros is None or len(registros) == 0:
+            return None
+
+        assinatura = gerar_assinatura(texto)
+        assinaturas = registros["assinatura"]
+
+        # LSH: candidatos são os que coincidem em pelo menos uma faixa inteira
+        linhas_por_faixa = NUM_PERMUTACOES // NUM_FAIXAS
+        iguais = assinaturas == assinatura
+        faixas = iguais.reshape(len(registros), NUM_FAIXAS, linhas_por_faixa).all(axis=2)
+        candidatos = np.flatnonzero(faixas.any(axis=1))
+        if len(candidatos) == 0:
+            return None
+
+        similaridades = iguais[candidatos].mean(axis=1)
+        melhor = int(np.argmax(similaridades))
+        if similaridades[melhor] < limiar:
+            return None
+        return registros["id"][candidatos[melhor]].decode("ascii"), float(similaridades[melhor])
+
+    def _carregar(self):
+        import numpy as np
+
+        if not os.path.exists(self.caminho):
+            return None
+        tamanho = os.path.getsize(self.caminho)
+        with self._lock:
+            # O mapeamento é refeito só quando o arquivo cresce
+            if tamanho != self._tamanho_lido:
+                quantidade = tamanho // tipo_registro().itemsize
+                self._registros = (
+                    np.memmap(self.caminho, dtype=tipo_registro(), mode="r", shape=(quantidade,))
+                    if quantidade else None
+                )
+                self._tamanho_lido = tamanho
+            return self._registros
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+# Retorna o índice de duplicatas compartilhado pelo processo
+def obter_indice():
+    global _indice
+    with _indice_lock:
+        if _indice is None:
+            _indice = IndiceDuplicatas(
+                obter_config("DUPLICATAS_PATH", os.path.join(DIRETORIO_PADRAO, "indice_desafios.bin"))
+            )
+        return _indice
+
+
+# Procura uma proposta já gerada para um desafio quase idêntico
+def buscar_desafio_semelhante(desafio_edital):
+    return obter_indice().buscar(desafio_edital, obter_config_numero("DUPLICATAS_LIMIAR", 0.8))
+
+
+# Assinatura guardada junto com a proposta, em bytes, para reconstruir o índice sem o texto completo
+def assinatura_em_bytes(assinatura):
+    return assinatura.astype("<u4").tobytes()
+
+
+def assinatura_de_bytes(dados):
+    import numpy as np
+
+    return np.frombuffer(dados, dtype="<u4")
+
+
+# Reconstrói o índice a partir das propostas salvas no MongoDB. Usa a assinatura do desafio completo
+# guardada na proposta; propostas antigas, sem ela, usam o desafio salvo (cortado em 500 caracteres)
+def reconstruir_indice(collection):
+    indice = obter_indice()
+    if os.path.exists(indice.caminho):
+        os.remove(indice.caminho)
+    # O arquivo novo pode ter o mesmo tamanho do anterior; o mapeamento é refeito na próxima busca
+    with indice._lock:
+        indice._tamanho_lido = -1
+    total = 0
+    for documento in collection.find({}, {"_id": 0, "id": 1, "desafio": 1, "assinatura_desafio": 1}):
+        if documento.get("assinatura_desafio"):
+            indice.adicionar_assinatura(documento["id"], assinatura_de_bytes(documento["assinatura_desafio"]))
+        elif documento.get("desafio"):
+            indice.adicionar(documento["id"], documento["desafio"])
+        else:
+            continue
+        total += 1
+    return total
+
+
+if __name__ == "__main__":
+    from clientes import obter_colecao_propostas
+
+    colecao = obter_colecao_propostas()
+    if colecao is None:
+        raise SystemExit("MongoDB indisponível: defina MONGODB_URI")
+    print(f"{reconstruir_indice(colecao)} desafios indexados")
@@ -0,0 +1,344 @@
+import re
+import threading
+import time
+import zlib
+
+from busca_editais import normalizar_texto
+from config import obter_config_numero
+from instrumentacao import medir
+
+# O numpy e o pymongo só são carregados quando o estimador é usado
+
+# Tamanho do vetor de termos (hashing de palavras e pares de palavras)
+DIMENSOES = 1024
+
+# Opções de alcance aceitas nas propostas
+OPCOES_ALCANCE = (
+    "Local - Na empresa/organização",
+    "Nacional - No setor brasileiro",
+    "Internacional - No setor mundial",
+    "Diversificado - Abrangência em mais de um setor",
+)
+
+# Rubricas do orçamento, na ordem do prompt
+RUBRICAS_ORCAMENTO = (
+    "RH", "MATERIAL_PERMANENTE", "MATERIAL_CONSUMO", "SERVICOS_TERCEIROS",
+    "VIAGENS", "OUTROS", "COMUNICACAO", "STARTUPS",
+)
+
+# Campos da solução usados como características, com o peso de cada um
+CAMPOS_SOLUCAO = {
+    "descricao_solucao": 1.0,
+    "aspectos_inovativos": 0.5,
+    "tecnologias_previstas": 1.0,
+    "tipo_produto": 1.0,
+    "potencial_mercado": 0.5,
+}
+
+# Uma estimativa numérica concorda com a de um vizinho se estiver a até 25% dela
+TOLERANCIA_CONCORDANCIA = 0.25
+
+
+# Vetor de termos da solução: palavras e pares de palavras de cada campo, mais a complexidade,
+# com frequência logarítmica e norma 1 para comparar por similaridade de cosseno
+def vetorizar_solucao(dados_solucao):
+    import numpy as np
+
+    vetor = np.zeros(DIMENSOES, dtype=np.float32)
+    for campo, peso in CAMPOS_SOLUCAO.items():
+        palavras = [p for p in re.findall(r"\w+", normalizar_texto(dados_solucao.get(campo))) if len(p) > 2]
+        termos = palavras + [f"{a} {b}" for a, b in zip(palavras, palavras[1:])]
+        for termo in termos:
+            vetor[zlib.crc32(termo.encode("utf-8")) % DIMENSOES] += peso
+    complexidade = normalizar_texto(dados_solucao.get("complexidade"))
+    if complexidade:
+        vetor[zlib.crc32(f"complexidade:{complexidade}".encode("utf-8")) % DIMENSOES] += 2.0
+    np.log1p(vetor, out=vetor)
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma else vetor
+
+
+# Converte um valor escrito pelo modelo ("R$ 1.200.000,00", "1,2 milhão", "450000") em número
+def converter_valor(texto):
+    texto = normalizar_texto(texto)
+    encontrado = re.search(r"\d[\d.,]*", texto)
+    if not encontrado:
+        return None
+    numero = encontrado.group().rstrip(".,")
+    if "," in numero and "." in numero:
+        decimal = "," if numero.rfind(",") > numero.rfind(".") else "."
+        numero = numero.replace("." if decimal == "," else ",", "").replace(decimal, ".")
+    elif re.fullmatch(r"\d{1,3}([.,]\d{3})+", numero):
+        numero = numero.replace(",", "").replace(".", "")
+    else:
+        numero = numero.replace(",", ".")
+    try:
+        valor = float(numero)
+    except ValueError:
+        return None
+    resto = texto[encontrado.end():].lstrip()
+    if resto.startswith(("milhao", "milhoes", "mi ")):
+        valor *= 1_000_000
+    elif resto.startswith("mil"):
+        valor *= 1_000
+    return valor
+
+
+# Duração em meses de uma proposta salva, ou None se não for um número plausível
+def converter_duracao(texto):
+    encontrado = re.search(r"\d+", str(texto or ""))
+    if not encontrado:
+        return None
+    meses = int(encontrado.group())
+    return meses if 1 <= meses <= 120 else None
+
+
+# Índice da opção de alcance pela primeira palavra da resposta, ou None
+def converter_alcance(texto):
+    texto = normalizar_texto(texto).lstrip("-*• ")
+    for indice, opcao in enumerate(OPCOES_ALCANCE):
+        if texto.startswith(normalizar_texto(opcao.split()[0])):
+            return indice
+    return None
+
+
+# Valores por rubrica de um orçamento salvo ({rubrica: valor}, com TOTAL), ou None se não der para ler
+def converter_orcamento(texto):
+    valores = {}
+    for linha in str(texto or "").split("\n"):
+        if ":" in linha:
+            chave, valor = linha.split(":", 1)
+            chave = normalizar_texto(chave).strip("-*• ").upper().replace(" ", "_")
+            if chave == "TOTAL" or chave in RUBRICAS_ORCAMENTO:
+                valores[chave] = converter_valor(valor)
+    soma = sum(valores.get(rubrica) or 0 for rubrica in RUBRICAS_ORCAMENTO)
+    if soma <= 0:
+        return None
+    valores["TOTAL"] = valores.get("TOTAL") or soma
+    return valores
+
+
+def formatar_orcamento(total, valores):
+    return "\n".join([f"TOTAL: {total}"] + [f"{rubrica}: {valores[rubrica]}" for rubrica in RUBRICAS_ORCAMENTO])
+
+
+# Mediana ponderada
+def _mediana(valores, pesos):
+    import numpy as np
+
+    ordem = np.argsort(valores)
+    acumulado = np.cumsum(pesos[ordem])
+    return float(valores[ordem][np.searchsorted(acumulado, acumulado[-1] / 2)])
+
+
+# Estimativas de duração, alcance e orçamento por vizinhos mais próximos entre as propostas já geradas.
+# Cada campo usa só os exemplos em que ele veio do Gemini, para o estimador não aprender com ele mesmo
+class EstimadorPropostas:
+    def __init__(self, vizinhos=7, similaridade_min=0.3, confianca_min=0.7):
+        self.vizinhos = vizinhos
+        self.similaridade_min = similaridade_min
+        self.confianca_min = confianca_min
+        self.exemplos = 0
+        self.treinado_em = None
+
+    def treinar(self, documentos):
+        import numpy as np
+
+        vetores, duracoes, alcances, taxas, proporcoes = [], [], [], [], []
+        for documento in documentos:
+            proposta = documento.get("proposta_completa") or {}
+            dados_solucao = documento.get("dados_solucao") or {}
+            if not dados_solucao.get("descricao_solucao"):
+                continue
+            estimadas = set(documento.get("secoes_estimadas") or ())
+            # O orçamento do Gemini foi calculado para a duração da proposta, mesmo que ela tenha sido estimada
+            meses = converter_duracao(proposta.get("duracao_meses"))
+            duracao = None if "duracao_meses" in estimadas else meses
+            alcance = None if "alcance" in estimadas else converter_alcance(proposta.get("alcance"))
+            orcamento = None if "orcamento" in estimadas else converter_orcamento(proposta.get("orcamento"))
+            if duracao is None and alcance is None and orcamento is None:
+                continue
+
+            vetores.append(vetorizar_solucao(dados_solucao))
+            duracoes.append(duracao or np.nan)
+            alcances.append(-1 if alcance is None else alcance)
+            # O orçamento é guardado como custo por mês e a divisão entre as rubricas
+            if orcamento is not None and meses is not None:
+                soma = sum(orcamento.get(rubrica) or 0 for rubrica in RUBRICAS_ORCAMENTO)
+                taxas.append(orcamento["TOTAL"] / meses)
+                proporcoes.append([(orcamento.get(rubrica) or 0) / soma for rubrica in RUBRICAS_ORCAMENTO])
+            else:
+                taxas.append(np.nan)
+                proporcoes.append([np.nan] * len(RUBRICAS_ORCAMENTO))
+
+        self._vetores = np.array(vetores, dtype=np.float32).reshape(-1, DIMENSOES)
+        self._duracoes = np.array(duracoes, dtype=np.float64)
+        self._alcances = np.array(alcances, dtype=np.int64)
+        self._taxas = np.array(taxas, dtype=np.float64)
+        self._proporcoes = np.array(proporcoes, dtype=np.float64).reshape(-1, len(RUBRICAS_ORCAMENTO))
+        self.exemplos = len(vetores)
+        self.treinado_em = time.time()
+        return self.exemplos
+
+    def estimar(self, dados_solucao):
+        with medir("estimador.vizinhos", exemplos=self.exemplos):
+            return Estimativa(self, self._vetores @ vetorizar_solucao(dados_solucao))
+
+    # Os k vizinhos mais semelhantes entre os exemplos válidos para o campo e acima da similaridade
+    # mínima, com as similaridades como pesos
+    def _vizinhos(self, similaridades, validos):
+        import numpy as np
+
+        candidatos = np.flatnonzero(validos & (similaridades > 0) & (similaridades >= self.similaridade_min))
+        if not len(candidatos):
+            return candidatos, similaridades[candidatos]
+        ordem = candidatos[np.argsort(similaridades[candidatos])[::-1][:self.vizinhos]]
+        return ordem, similaridades[ordem]
+
+
+# Estimativa de uma solução: cada campo devolve o valor e a confiança, a fração (ponderada pela
+# similaridade) dos vizinhos que concordam com ele. Sem vizinhos próximos o bastante, a confiança é zero
+class Estimativa:
+    def __init__(self, estimador, similaridades):
+        self.estimador = estimador
+        self.similaridades = similaridades
+        self.confiancas = {}
+
+    def _vizinhos(self, validos):
+        indices, pesos = self.estimador._vizinhos(self.similaridades, validos)
+        if len(indices) < min(3, self.estimador.vizinhos):
+            return None, None
+        return indices, pesos
+
+    def duracao_meses(self):
+        import numpy as np
+
+        indices, pesos = self._vizinhos(~np.isnan(self.estimador._duracoes))
+        if indices is None:
+            return None, 0.0
+        duracoes = self.estimador._duracoes[indices]
+        meses = int(round(_mediana(duracoes, pesos)))
+        concordam = np.abs(duracoes - meses) <= TOLERANCIA_CONCORDANCIA * meses
+        return str(meses), float(pesos[concordam].sum() / pesos.sum())
+
+    def alcance(self):
+        import numpy as np
+
+        indices, pesos = self._vizinhos(self.estimador._alcances >= 0)
+        if indices is None:
+            return None, 0.0
+        votos = np.bincount(self.estimador._alcances[indices], weights=pesos, minlength=len(OPCOES_ALCANCE))
+        return OPCOES_ALCANCE[int(votos.argmax())], float(votos.max() / pesos.sum())
+
+    # Orçamento para a duração informada: custo mensal dos vizinhos vezes a duração,
+    # dividido entre as rubricas na proporção média deles (valores arredondados em mil reais)
+    def orcamento(self, duracao_meses):
+        import numpy as np
+
+        meses = converter_duracao(duracao_meses)
+        if meses is None:
+            return None, 0.0
+        indices, pesos = self._vizinhos(~np.isnan(self.estimador._taxas))
+        if indices is None:
+            return None, 0.0
+        taxas = self.estimador._taxas[indices]
+        taxa = _mediana(taxas, pesos)
+        concordam = np.abs(taxas - taxa) <= TOLERANCIA_CONCORDANCIA * taxa
+        proporcoes = np.average(self.estimador._proporcoes[indices], axis=0, weights=pesos)
+
+        total = int(round(taxa * meses, -3))
+        valores = {
+            rubrica: int(round(total * proporcao, -3)) for rubrica, proporcao in zip(RUBRICAS_ORCAMENTO, proporcoes)
+        }
+        # O arredondamento fica na maior rubrica, para a soma bater com o total
+        maior = max(valores, key=valores.get)
+        valores[maior] += total - sum(valores.values())
+        return formatar_orcamento(total, valores), float(pesos[concordam].sum() / pesos.sum())
+
+    # Valor estimado da seção se a confiança for suficiente; senão None, e a seção vai para o Gemini
+    def obter(self, secao, *args):
+        valor, confianca = getattr(self, secao)(*args)
+        self.confiancas[secao] = round(confianca, 3)
+        return valor if valor is not None and confianca >= self.estimador.confianca_min else None
+
+    # Seções estimadas localmente até aqui, com a confiança de cada uma
+    def aceitas(self):
+        return {
+            secao: confianca for secao, confianca in self.confiancas.items()
+            if confianca >= self.estimador.confianca_min
+        }
+
+
+# Carrega as propostas automáticas mais recentes, com os campos usados pelo estimador
+def carregar_exemplos(collection, limite):
+    from pymongo import DESCENDING
+
+    return list(
+        collection.find(
+            {"tipo_geracao": {"$ne": "manual"}},
+            {"_id": 0, "proposta_completa.duracao_meses": 1, "proposta_completa.alcance": 1,
+             "proposta_completa.orcamento": 1, "dados_solucao": 1, "secoes_estimadas": 1}
+        ).sort([("data_criacao", DESCENDING)]).limit(limite)
+    )
+
+
+_estimador = None
+_estimador_lock = threading.Lock()
+_ultima_tentativa = None
+_atualizando = False
+
+
+# Treina um novo estimador com as propostas salvas no MongoDB; None se não houver MongoDB
+def treinar_estimador():
+    from clientes import obter_colecao_propostas
+
+    collection = obter_colecao_propostas()
+    if collection is None:
+        return None
+    estimador = EstimadorPropostas(
+        vizinhos=int(obter_config_numero("ESTIMADOR_VIZINHOS", 7)),
+        similaridade_min=obter_config_numero("ESTIMADOR_SIMILARIDADE_MIN", 0.3),
+        confianca_min=obter_config_numero("ESTIMADOR_CONFIANCA_MIN", 0.7),
+    )
+    with medir("estimador.treinar") as span:
+        span["exemplos"] = estimador.treinar(
+            carregar_exemplos(collection, int(obter_config_numero("ESTIMADOR_MAX_EXEMPLOS", 5000)))
+        )
+    return estimador
+
+
+# Troca o estimador pelo recém-treinado; se o treino falhar, o atual continua valendo
+def _atualizar_estimador():
+    global _estimador, _atualizando
+    try:
+        estimador = treinar_estimador()
+        if estimador is not None:
+            _estimador = estimador
+    except Exception:
+        pass
+    finally:
+        _atualizando = False
+
+
+# Retorna o estimador compartilhado pelo processo, ou None enquanto o primeiro não estiver pronto.
+# O treino (o primeiro e as atualizações, depois do intervalo) roda em segundo plano, fora do caminho
+# da geração: até lá as seções vão para o Gemini, e depois o atual continua respondendo durante o retreino
+def obter_estimador():
+    global _ultima_tentativa, _atualizando
+    with _estimador_lock:
+        agora = time.monotonic()
+        if not _atualizando and (
+            _ultima_tentativa is None
+            or agora - _ultima_tentativa > obter_config_numero("ESTIMADOR_ATUALIZACAO_S", 3600)
+        ):
+            _ultima_tentativa, _atualizando = agora, True
+            threading.Thread(target=_atualizar_estimador, name="estimador", daemon=True).start()
+        return _estimador
+
+
+# Estimativa local para os dados da solução, ou None se não houver exemplos suficientes
+def estimar_proposta(dados_solucao):
+    estimador = obter_estimador()
+    if estimador is None or estimador.exemplos < obter_config_numero("ESTIMADOR_MIN_EXEMPLOS", 30):
+        return None
+    return estimador.estimar(dados_solucao)
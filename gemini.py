@@ -0,0 +1,325 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from google.genai import types
+
+from cache_gemini import gerar_chave, obter_cache
+from instrumentacao import medir, registrar_resposta
+from limites import obter_limitador, timeout_chamada_ms
+from planejamento import aplicar_plano, registrar_plano
+from rotas import avaliar_resposta
+
+# Tokens de saída assumidos na reserva de cota antes da chamada, quando ela não tem limite de saída
+TOKENS_SAIDA_ESTIMADOS = 1000
+
+
+# Estima os tokens de uma chamada a partir do tamanho do prompt (~4 caracteres por token)
+# e do limite de saída da configuração
+def estimar_tokens(contents, config=None):
+    saida = config.max_output_tokens if config is not None and config.max_output_tokens else TOKENS_SAIDA_ESTIMADOS
+    return len(str(contents)) // 4 + saida
+
+
+# Adiciona o timeout por chamada à configuração sem alterar a original
+def _config_com_timeout(config):
+    http_options = types.HttpOptions(timeout=timeout_chamada_ms())
+    if config is None:
+        return types.GenerateContentConfig(http_options=http_options)
+    return config.model_copy(update={"http_options": http_options})
+
+
+# Retorna a resposta guardada no cache para a chamada, ou None
+def resposta_em_cache(model, contents, config=None, ttl_segundos=None, chave_contexto=None):
+    valor = obter_cache().obter(gerar_chave(model, contents, config, chave_contexto), ttl_segundos)
+    if valor is None:
+        return None
+    return types.GenerateContentResponse.model_validate_json(valor)
+
+
+# Uma chamada interrompida antes do fim (stream fechado); quem esperava por ela faz a própria chamada
+class ChamadaInterrompida(Exception):
+    pass
+
+
+# Resultado de uma chamada em andamento. Em streams, guarda também os trechos já recebidos e os repassa,
+# à medida que chegam, a todas as sessões que acompanham a chamada (a que a iniciou e as agrupadas)
+class ChamadaCompartilhada(Future):
+    def __init__(self):
+        super().__init__()
+        self.consumidores = 0
+        self._trechos = []
+        self._novos = threading.Condition()
+
+    def publicar(self, trecho):
+        with self._novos:
+            self._trechos.append(trecho)
+            self._novos.notify_all()
+
+    def set_result(self, result):
+        super().set_result(result)
+        with self._novos:
+            self._novos.notify_all()
+
+    def set_exception(self, exception):
+        super().set_exception(exception)
+        with self._novos:
+            self._novos.notify_all()
+
+    # Registra uma sessão acompanhando o stream; enquanto houver alguma, ele não é fechado
+    def acompanhar(self):
+        with self._novos:
+            self.consumidores += 1
+
+    def deixar(self):
+        with self._novos:
+            self.consumidores -= 1
+
+    # Devolve os trechos do stream, desde o primeiro, à medida que chegam e até o fim da chamada;
+    # o resultado (ou o erro) fica no futuro
+    def trechos(self):
+        entregues = 0
+        while True:
+            with self._novos:
+                self._novos.wait_for(lambda: len(self._trechos) > entregues or self.done())
+                novos = self._trechos[entregues:]
+                terminou = self.done()
+            yield from novos
+            entregues += len(novos)
+            if terminou:
+                return
+
+
+# Chamadas ao Gemini em andamento no processo, por chave (modelo, conteúdo e configuração). Uma chamada
+# idêntica a outra ainda em andamento espera o resultado dela em vez de repetir a chamada, o que evita
+# duplicatas quando várias sessões processam o mesmo edital ao mesmo tempo
+class ChamadasEmAndamento:
+    def __init__(self):
+        self.executadas = 0
+        self.agrupadas = 0
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+
+    # Retorna (futuro, lider): o líder faz a chamada e conclui o futuro; os demais esperam por ele
+    def entrar(self, chave):
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            if futuro is not None:
+                self.agrupadas += 1
+                return futuro, False
+            futuro = ChamadaCompartilhada()
+            self._em_andamento[chave] = futuro
+            self.executadas += 1
+            return futuro, True
+
+    # Entrega o resultado (ou o erro) do líder a quem está esperando; interrupções, como o fechamento
+    # de um stream, viram ChamadaInterrompida
+    def concluir(self, chave, futuro, resultado=None, erro=None):
+        with self._lock:
+            if self._em_andamento.get(chave) is futuro:
+                del self._em_andamento[chave]
+        if erro is None:
+            futuro.set_result(resultado)
+        else:
+            futuro.set_exception(erro if isinstance(erro, Exception) else ChamadaInterrompida())
+
+    # Executa funcao uma única vez entre as chamadas idênticas simultâneas;
+    # retorna o resultado e se ele veio de outra chamada
+    def executar(self, chave, funcao):
+        futuro, lider = self.entrar(chave)
+        if not lider:
+            try:
+                return futuro.result(), True
+            except ChamadaInterrompida:
+                return funcao(), False
+        try:
+            resultado = funcao()
+        except BaseException as e:
+            self.concluir(chave, futuro, erro=e)
+            raise
+        self.concluir(chave, futuro, resultado)
+        return resultado, False
+
+    def estatisticas(self):
+        with self._lock:
+            em_andamento = len(self._em_andamento)
+        return {"executadas": self.executadas, "agrupadas": self.agrupadas, "em_andamento": em_andamento}
+
+
+_chamadas = None
+_chamadas_lock = threading.Lock()
+
+
+# Retorna o registro de chamadas em andamento compartilhado pelo processo
+def obter_chamadas_em_andamento():
+    global _chamadas
+    with _chamadas_lock:
+        if _chamadas is None:
+            _chamadas = ChamadasEmAndamento()
+        return _chamadas
+
+
+# Chama o generate_content respeitando os limites de cota e guarda a resposta no cache
+def chamar_gemini(client, model, contents, config=None, chave_contexto=None):
+    limitador = obter_limitador()
+    tokens_estimados = estimar_tokens(contents, config)
+    config_chamada = _config_com_timeout(config)
+    response = limitador.executar(
+        lambda: client.models.generate_content(model=model, contents=contents, config=config_chamada),
+        tokens_estimados
+    )
+    if response.usage_metadata is not None:
+        limitador.registrar_tokens(response.usage_metadata.total_token_count, tokens_estimados)
+
+    # Apenas respostas com texto são guardadas
+    if response.text:
+        obter_cache().salvar(
+            gerar_chave(model, contents, config, chave_contexto),
+            response.model_dump_json(exclude_none=True, exclude={"parsed", "sdk_http_response"})
+        )
+    return response
+
+
+# Chama o Gemini ou, se uma chamada idêntica já estiver em andamento no processo, espera o resultado dela;
+# nesse caso o span fica marcado como agrupado
+def chamar_gemini_agrupado(span, client, model, contents, config=None, chave_contexto=None):
+    response, agrupada = obter_chamadas_em_andamento().executar(
+        gerar_chave(model, contents, config, chave_contexto),
+        lambda: chamar_gemini(client, model, contents, config, chave_contexto)
+    )
+    if agrupada:
+        span["cache"] = "agrupada"
+    return response
+
+
+# Chama o generate_content passando pelo cache de respostas e pelos limites de cota.
+# tipo_prompt identifica o prompt na instrumentação e escolhe os limites de tokens do plano;
+# com renovar, a resposta guardada é ignorada e substituída pela nova (usado ao regenerar uma seção),
+# sem esperar por chamadas idênticas em andamento
+def gerar_conteudo(client, model, contents, config=None, ttl_segundos=None, chave_contexto=None, tipo_prompt=None,
+                   renovar=False):
+    config = aplicar_plano(model, config, tipo_prompt)
+    with medir("gemini.generate_content", tipo_prompt=tipo_prompt, modelo=model,
+               tamanho_prompt=len(str(contents))) as span:
+        registrar_plano(span, contents, config)
+        response = None if renovar else resposta_em_cache(model, contents, config, ttl_segundos, chave_contexto)
+        span["cache"] = "acerto" if response is not None else "falha"
+        if response is None and renovar:
+            response = chamar_gemini(client, model, contents, config, chave_contexto)
+        elif response is None:
+            response = chamar_gemini_agrupado(span, client, model, contents, config, chave_contexto)
+        registrar_resposta(span, response)
+        avaliar_resposta(span, tipo_prompt, response.text)
+        return response
+
+
+# Chama o generate_content_stream e devolve os trechos de texto à medida que chegam
+def gerar_conteudo_stream(client, model, contents, config=None, ttl_segundos=None, tipo_prompt=None):
+    config = aplicar_plano(model, config, tipo_prompt)
+    with medir("gemini.generate_content_stream", tipo_prompt=tipo_prompt, modelo=model,
+               tamanho_prompt=len(str(contents))) as span:
+        registrar_plano(span, contents, config)
+        cache = obter_cache()
+        chave = gerar_chave(model, contents, config)
+
+        valor = cache.obter(chave, ttl_segundos)
+        if valor is not None:
+            span["cache"] = "acerto"
+            response = types.GenerateContentResponse.model_validate_json(valor)
+            registrar_resposta(span, response)
+            yield response.text
+            return
+        span["cache"] = "falha"
+
+        # O stream roda em uma thread própria e os trechos são repassados a todas as sessões que pedirem
+        # o mesmo prompt enquanto ele estiver em andamento; as agrupadas recebem os trechos já chegados
+        # e os seguintes, sem uma nova chamada
+        chamadas = obter_chamadas_em_andamento()
+        while True:
+            chamada, lider = chamadas.entrar(chave)
+            inicio = time.perf_counter()
+            entregues = 0
+            # A sessão passa a acompanhar a chamada antes de o stream começar, para ele não ser fechado por
+            # falta de quem o receba
+            chamada.acompanhar()
+            try:
+                if lider:
+                    threading.Thread(
+                        target=_transmitir, args=(chamadas, chave, chamada, client, model, contents, config),
+                        name="gemini-stream", daemon=True
+                    ).start()
+                else:
+                    span["cache"] = "agrupada"
+                for trecho in chamada.trechos():
+                    if not entregues:
+                        span["primeiro_trecho_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+                    entregues += 1
+                    yield trecho
+            finally:
+                chamada.deixar()
+            try:
+                response = chamada.result()
+            except ChamadaInterrompida:
+                # Todas as sessões saíram do stream antes desta começar a acompanhá-lo; começa de novo
+                if entregues:
+                    raise
+                span["cache"] = "falha"
+                continue
+            registrar_resposta(span, response)
+            return
+
+
+# Faz a chamada de um stream compartilhado, publicando os trechos e concluindo a chamada com a resposta
+# completa (que também vai para o cache) ou com o erro
+def _transmitir(chamadas, chave, chamada, client, model, contents, config):
+    try:
+        response = _receber_stream(chamada, client, model, contents, config)
+    except BaseException as e:
+        chamadas.concluir(chave, chamada, erro=e)
+        return
+    # A resposta completa fica no cache com a mesma chave da chamada sem streaming
+    if response.text:
+        obter_cache().salvar(chave, response.model_dump_json(exclude_none=True))
+    chamadas.concluir(chave, chamada, response)
+
+
+# Abre o stream e publica os trechos de texto; retorna a resposta completa, montada a partir deles.
+# Se ninguém mais acompanhar o stream, ele é fechado e a chamada termina como interrompida
+def _receber_stream(chamada, client, model, contents, config):
+    config_chamada = _config_com_timeout(config)
+
+    # Novas tentativas só cobrem a abertura do stream, antes de qualquer texto ser entregue
+    def abrir_stream():
+        iterador = client.models.generate_content_stream(model=model, contents=contents, config=config_chamada)
+        return next(iterador, None), iterador
+
+    limitador = obter_limitador()
+    tokens_estimados = estimar_tokens(contents, config)
+    primeiro, iterador = limitador.executar(abrir_stream, tokens_estimados)
+
+    partes = []
+    uso = None
+    motivo_fim = None
+    chunk = primeiro
+    while chunk is not None:
+        if not chamada.consumidores:
+            if hasattr(iterador, "close"):
+                iterador.close()
+            raise ChamadaInterrompida()
+        if chunk.usage_metadata is not None:
+            uso = chunk.usage_metadata
+        if chunk.candidates and chunk.candidates[0].finish_reason is not None:
+            motivo_fim = chunk.candidates[0].finish_reason
+        if chunk.text:
+            partes.append(chunk.text)
+            chamada.publicar(chunk.text)
+        chunk = next(iterador, None)
+    if uso is not None:
+        limitador.registrar_tokens(uso.total_token_count, tokens_estimados)
+
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[types.Part(text="".join(partes))]), finish_reason=motivo_fim
+        )],
+        usage_metadata=uso
+    )
@@ -0,0 +1,513 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Literal
+
+from google.genai import types
+from pydantic import BaseModel
+
+from condensacao import condensar_desafio
+from contexto_gemini import ContextoCompartilhado
+from estimadores import estimar_proposta
+from gemini import gerar_conteudo, gerar_conteudo_stream
+from instrumentacao import propagar
+from planejamento import ajustar_entrada
+from rotas import obter_modelo
+
+# Número máximo de chamadas simultâneas ao Gemini por proposta
+MAX_CHAMADAS_PARALELAS = 5
+
+# Função para gerar texto com o Gemini, no modelo da rota do tipo de prompt
+def gerar_texto(client, prompt, tipo_prompt=None, renovar=False):
+    response = gerar_conteudo(
+        client,
+        model=obter_modelo(tipo_prompt),
+        contents=prompt,
+        tipo_prompt=tipo_prompt,
+        renovar=renovar
+    )
+    return response.text
+
+# Dados padrão da solução nas propostas automáticas
+DADOS_PADRAO_SOLUCAO = {
+    'area_atuacao': "Tecnologia e Inovação",
+    'complexidade': "Alta",
+    'tamanho_equipe': "8",
+    'maturidade_tecnologica': "Protótipo Avançado",
+    'trl_inicial': "TRL4",
+    'trl_final': "TRL7",
+    'propriedade_intelectual': "Potencial para patente devido aos aspectos inovadores",
+    'estado_desenvolvimento': "Conceito validado"
+}
+
+# Seções da proposta automática e as seções de que cada uma depende. Todas dependem também do desafio,
+# que não muda dentro de uma proposta; 'dados_solucao' é a análise com a descrição da solução
+DEPENDENCIAS_SECOES = {
+    'desafio_info': (),
+    'dados_solucao': (),
+    'tecnologias': ('dados_solucao',),
+    'tipo_produto': ('dados_solucao',),
+    'trl': ('dados_solucao',),
+    'propriedade_intelectual': ('dados_solucao',),
+    'aspectos_inovativos': ('dados_solucao',),
+    'titulo': ('dados_solucao',),
+    'duracao_meses': ('dados_solucao',),
+    'alcance': ('dados_solucao',),
+    'ambito_aplicacao': ('dados_solucao',),
+    'orcamento': ('dados_solucao', 'duracao_meses'),
+}
+
+# Seções que vêm direto da análise, sem chamada própria ao Gemini
+SECOES_DA_SOLUCAO = ('tecnologias', 'tipo_produto', 'trl', 'propriedade_intelectual', 'aspectos_inovativos')
+
+# Seções que podem ser regeneradas individualmente, com o rótulo exibido no app
+SECOES_REGENERAVEIS = {
+    'dados_solucao': "Solução (análise do desafio)",
+    'titulo': "Título",
+    'duracao_meses': "Duração",
+    'alcance': "Alcance",
+    'ambito_aplicacao': "Âmbito de aplicação",
+    'orcamento': "Orçamento",
+    'desafio_info': "Código e nome do desafio",
+}
+
+# Função para listar a seção e todas as que dependem dela, direta ou indiretamente, na ordem do grafo
+def secoes_afetadas(secao):
+    afetadas = {secao}
+    for candidata in DEPENDENCIAS_SECOES:
+        # DEPENDENCIAS_SECOES está em ordem topológica, então uma passada basta
+        if afetadas.intersection(DEPENDENCIAS_SECOES[candidata]):
+            afetadas.add(candidata)
+    return [candidata for candidata in DEPENDENCIAS_SECOES if candidata in afetadas]
+
+# Função para extrair os dados da solução da resposta da análise
+def extrair_dados_solucao(resposta_analise):
+    dados_solucao = {}
+    for linha in resposta_analise.split('\n'):
+        if 'DESCRICAO_SOLUCAO:' in linha:
+            dados_solucao['descricao_solucao'] = linha.split('DESCRICAO_SOLUCAO:')[1].strip()
+        elif 'INOVACAO:' in linha:
+            dados_solucao['aspectos_inovativos'] = linha.split('INOVACAO:')[1].strip()
+        elif 'TECNOLOGIAS:' in linha:
+            dados_solucao['tecnologias_previstas'] = linha.split('TECNOLOGIAS:')[1].strip()
+        elif 'TIPO_PRODUTO:' in linha:
+            dados_solucao['tipo_produto'] = linha.split('TIPO_PRODUTO:')[1].strip()
+        elif 'POTENCIAL_MERCADO:' in linha:
+            dados_solucao['potencial_mercado'] = linha.split('POTENCIAL_MERCADO:')[1].strip()
+    
+    if not dados_solucao.get('descricao_solucao'):
+        dados_solucao['descricao_solucao'] = resposta_analise
+    
+    # Preencher dados padrão
+    dados_solucao.update(DADOS_PADRAO_SOLUCAO)
+    return dados_solucao
+
+# Função para montar as seções que vêm direto da análise
+def secoes_da_solucao(dados_solucao):
+    return {
+        'tecnologias': dados_solucao.get('tecnologias_previstas', ''),
+        'tipo_produto': dados_solucao.get('tipo_produto', '')[:255],
+        'trl': f"TRL_INICIAL: {dados_solucao['trl_inicial']}\nTRL_FINAL: {dados_solucao['trl_final']}",
+        'propriedade_intelectual': dados_solucao['propriedade_intelectual'][:1000],
+        'aspectos_inovativos': dados_solucao.get('aspectos_inovativos', '')[:1000],
+    }
+
+# Função para montar o contexto compartilhado pelos prompts que dependem do desafio e da solução
+def texto_contexto(brief_desafio, dados_solucao):
+    return f'''
+    DESAFIO DO EDITAL:
+    {ajustar_entrada(brief_desafio, 'contexto')}
+
+    SOLUÇÃO PROPOSTA:
+    DESCRICAO_SOLUCAO: {dados_solucao.get('descricao_solucao', '')}
+    INOVACAO: {dados_solucao.get('aspectos_inovativos', '')}
+    TECNOLOGIAS: {dados_solucao.get('tecnologias_previstas', '')}
+    TIPO_PRODUTO: {dados_solucao.get('tipo_produto', '')}
+    POTENCIAL_MERCADO: {dados_solucao.get('potencial_mercado', '')}
+    '''
+
+def prompt_analise(brief_desafio):
+    return f'''
+    ANALISE este desafio de edital e gere uma SOLUÇÃO INOVADORA completa:
+
+    DESAFIO DO EDITAL:
+    {ajustar_entrada(brief_desafio, 'analise')}
+
+    Gere uma solução tecnológica inovadora que inclua:
+    1. Descrição técnica detalhada
+    2. Elementos inovadores e diferenciais competitivos
+    3. Tecnologias envolvidas (focar em IA, IoT, dados)
+    4. Tipo de produto resultante
+    5. Potencial de mercado e aplicação
+
+    Retorne no formato:
+    DESCRICAO_SOLUCAO: [descrição completa]
+    INOVACAO: [aspectos inovadores]
+    TECNOLOGIAS: [tecnologias utilizadas]
+    TIPO_PRODUTO: [tipo de produto]
+    POTENCIAL_MERCADO: [potencial de aplicação]
+
+    Seja preciso, técnico e decidido no que será desenvolvido.
+    Foque em implementações práticas que envolvam tecnologias avançadas.
+    '''
+
+def prompt_desafio(brief_desafio):
+    return f'''
+    Extraia informações do desafio:
+    {ajustar_entrada(brief_desafio, 'desafio_info')}
+    Retorne:
+    CÓDIGO: [código ou EDITAL-2024-XXX]
+    NOME: [nome resumido do desafio]
+    '''
+
+# Prompts enviados depois do contexto compartilhado (desafio + solução)
+PROMPTS_CONTEXTO = {
+    'titulo': '''
+    Crie um TÍTULO criativo e impactante (máx 200 caracteres) para a solução acima.
+    Retorne APENAS o título.
+    ''',
+    'duracao_meses': '''
+    Estime duração realista em MESES para desenvolver a solução acima.
+    Retorne APENAS o número.
+    ''',
+    'alcance': '''
+    Determine o alcance realista da solução acima.
+    Retorne uma das opções:
+    - Local - Na empresa/organização
+    - Nacional - No setor brasileiro
+    - Internacional - No setor mundial
+    - Diversificado - Abrangência em mais de um setor
+    ''',
+    'ambito_aplicacao': '''
+    Descreva o âmbito de aplicação detalhado da solução acima.
+    Inclua setores beneficiados, usuários potenciais e impactos esperados.
+    ''',
+}
+
+def prompt_orcamento(duracao_meses):
+    return f'''
+    Calcule orçamento REALISTA para desenvolver a solução acima:
+    DURAÇÃO: {duracao_meses} meses
+    COMPLEXIDADE: Alta
+    Retorne valores realistas no formato:
+    TOTAL: [valor total]
+    RH: [recursos humanos]
+    MATERIAL_PERMANENTE: [equipamentos]
+    MATERIAL_CONSUMO: [materiais]
+    SERVICOS_TERCEIROS: [serviços]
+    VIAGENS: [viagens]
+    OUTROS: [outros custos]
+    COMUNICACAO: [comunicação]
+    STARTUPS: [parcerias]
+    '''
+
+# Primeira linha não vazia da resposta, para os campos de uma linha só
+def primeira_linha(texto):
+    return next((linha.strip() for linha in texto.splitlines() if linha.strip()), "")
+
+# Função para gerar em paralelo as seções pedidas que usam o contexto compartilhado, junto com os
+# futuros já submetidos. O orçamento começa assim que a duração chega; se a duração não for gerada
+# de novo, começa logo com a duração informada. As seções em renovar ignoram o cache local.
+# Com uma estimativa local, o orçamento só vai para o Gemini se ela não for confiável.
+def _gerar_secoes_contexto(executor, contexto, secoes, futuros, duracao_meses=None, renovar=(), estimativa=None):
+    for secao in PROMPTS_CONTEXTO:
+        if secao in secoes:
+            futuro = executor.submit(propagar(contexto.gerar_texto), PROMPTS_CONTEXTO[secao], secao, secao in renovar)
+            futuros[futuro] = secao
+    
+    # Retorna o orçamento estimado localmente ou, sem ele, o futuro da chamada ao Gemini
+    def submeter_orcamento(duracao):
+        valor = estimativa.obter('orcamento', duracao) if estimativa is not None else None
+        if valor is not None:
+            return valor
+        futuro = executor.submit(
+            propagar(contexto.gerar_texto), prompt_orcamento(duracao), 'orcamento', 'orcamento' in renovar
+        )
+        futuros[futuro] = 'orcamento'
+        pendentes.add(futuro)
+    
+    pendentes = set(futuros)
+    if 'orcamento' in secoes and 'duracao_meses' not in secoes:
+        valor = submeter_orcamento(duracao_meses)
+        if valor is not None:
+            yield 'orcamento', valor
+    while pendentes:
+        concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+        for futuro in concluidos:
+            secao = futuros[futuro]
+            valor = futuro.result()
+            if secao == 'titulo':
+                valor = primeira_linha(valor)[:200]
+            elif secao in ('duracao_meses', 'alcance'):
+                valor = primeira_linha(valor)
+            yield secao, valor
+            
+            if secao == 'duracao_meses' and 'orcamento' in secoes:
+                valor = submeter_orcamento(valor)
+                if valor is not None:
+                    yield 'orcamento', valor
+
+# Função para gerar proposta automática, entregando cada seção assim que fica pronta.
+# Se dados_solucao já vier de uma proposta semelhante, a análise inicial é pulada.
+def gerar_proposta_automatica_stream(client, desafio_edital, dados_solucao=None):
+    proposta_completa = {}
+    
+    # Editais longos são condensados em um brief reutilizado por todos os prompts
+    brief_desafio = condensar_desafio(client, desafio_edital)
+    if brief_desafio != desafio_edital:
+        yield 'brief_desafio', brief_desafio
+    
+    executor = ThreadPoolExecutor(max_workers=MAX_CHAMADAS_PARALELAS)
+    try:
+        # As informações do desafio não dependem da análise e começam junto com ela
+        futuros = {
+            executor.submit(propagar(gerar_texto), client, prompt_desafio(brief_desafio), 'desafio_info'): 'desafio_info'
+        }
+        
+        # Analisar desafio e gerar solução
+        if dados_solucao is None:
+            resposta_analise = ""
+            for trecho in gerar_conteudo_stream(
+                client, model=obter_modelo('analise'), contents=prompt_analise(brief_desafio), tipo_prompt='analise'
+            ):
+                resposta_analise += trecho
+                yield 'analise_parcial', resposta_analise
+            
+            dados_solucao = extrair_dados_solucao(resposta_analise)
+        yield 'dados_solucao', dados_solucao
+        
+        # Campos que vêm direto da análise
+        for secao, valor in secoes_da_solucao(dados_solucao).items():
+            proposta_completa[secao] = valor
+            yield secao, valor
+        
+        # Duração, alcance e orçamento vêm do estimador local quando ele é confiável para esta solução
+        secoes_contexto = [secao for secao in DEPENDENCIAS_SECOES if secao in PROMPTS_CONTEXTO or secao == 'orcamento']
+        estimativa = estimar_proposta(dados_solucao)
+        if estimativa is not None:
+            for secao in ('duracao_meses', 'alcance'):
+                valor = estimativa.obter(secao)
+                if valor is not None:
+                    secoes_contexto.remove(secao)
+                    proposta_completa[secao] = valor
+                    yield secao, valor
+        
+        # Desafio e solução vão uma única vez para um contexto compartilhado pelos prompts seguintes
+        contexto = ContextoCompartilhado(client, obter_modelo(), texto_contexto(brief_desafio, dados_solucao))
+        try:
+            for secao, valor in _gerar_secoes_contexto(
+                executor, contexto, secoes_contexto, futuros,
+                duracao_meses=proposta_completa.get('duracao_meses'), estimativa=estimativa
+            ):
+                proposta_completa[secao] = valor
+                yield secao, valor
+            
+            yield 'uso_contexto', contexto.estatisticas()
+        finally:
+            contexto.encerrar()
+        if estimativa is not None:
+            yield 'estimativas', estimativa.aceitas()
+        
+        yield 'concluido', (proposta_completa, dados_solucao)
+    finally:
+        # Se a geração for interrompida, as chamadas que ainda não começaram são canceladas
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Função para regenerar uma seção de uma proposta automática já gerada, recalculando apenas
+# as seções que dependem dela. Entrega as seções novas e, ao final, 'concluido' com a proposta,
+# os dados da solução e a lista das seções alteradas.
+def regenerar_secao_stream(client, desafio_edital, proposta_completa, dados_solucao, secao):
+    afetadas = secoes_afetadas(secao)
+    proposta_completa = dict(proposta_completa)
+    
+    # O brief vem do cache local da condensação
+    brief_desafio = condensar_desafio(client, desafio_edital)
+    
+    executor = ThreadPoolExecutor(max_workers=MAX_CHAMADAS_PARALELAS)
+    try:
+        futuros = {}
+        if 'desafio_info' in afetadas:
+            futuro = executor.submit(propagar(gerar_texto), client, prompt_desafio(brief_desafio), 'desafio_info', True)
+            futuros[futuro] = 'desafio_info'
+        
+        if 'dados_solucao' in afetadas:
+            resposta_analise = gerar_texto(client, prompt_analise(brief_desafio), 'analise', renovar=True)
+            dados_solucao = extrair_dados_solucao(resposta_analise)
+            yield 'dados_solucao', dados_solucao
+            for secao_solucao, valor in secoes_da_solucao(dados_solucao).items():
+                proposta_completa[secao_solucao] = valor
+                yield secao_solucao, valor
+        
+        secoes_contexto = [s for s in afetadas if s in PROMPTS_CONTEXTO or s == 'orcamento']
+        if secoes_contexto:
+            contexto = ContextoCompartilhado(client, obter_modelo(), texto_contexto(brief_desafio, dados_solucao))
+            try:
+                for secao_gerada, valor in _gerar_secoes_contexto(
+                    executor, contexto, secoes_contexto, futuros,
+                    duracao_meses=proposta_completa.get('duracao_meses'), renovar=(secao,)
+                ):
+                    proposta_completa[secao_gerada] = valor
+                    yield secao_gerada, valor
+                yield 'uso_contexto', contexto.estatisticas()
+            finally:
+                contexto.encerrar()
+        else:
+            for futuro in futuros:
+                proposta_completa[futuros[futuro]] = futuro.result()
+                yield futuros[futuro], proposta_completa[futuros[futuro]]
+        
+        yield 'concluido', (proposta_completa, dados_solucao, afetadas)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Função para gerar proposta automática; retorna a proposta, os dados da solução e as seções
+# estimadas localmente, que devem ser salvas junto para não servirem de exemplo ao estimador
+def gerar_proposta_automatica(client, desafio_edital, dados_solucao=None):
+    secoes_estimadas = []
+    for secao, valor in gerar_proposta_automatica_stream(client, desafio_edital, dados_solucao):
+        if secao == 'estimativas':
+            secoes_estimadas = list(valor)
+        elif secao == 'concluido':
+            return (*valor, secoes_estimadas)
+
+# Esquema da proposta gerada em uma única chamada
+class OrcamentoEstruturado(BaseModel):
+    total: int
+    rh: int
+    material_permanente: int
+    material_consumo: int
+    servicos_terceiros: int
+    viagens: int
+    outros: int
+    comunicacao: int
+    startups: int
+
+class PropostaEstruturada(BaseModel):
+    descricao_solucao: str
+    aspectos_inovativos: str
+    tecnologias_previstas: str
+    tipo_produto: str
+    potencial_mercado: str
+    titulo: str
+    codigo_desafio: str
+    nome_desafio: str
+    duracao_meses: int
+    orcamento: OrcamentoEstruturado
+    alcance: Literal[
+        "Local - Na empresa/organização",
+        "Nacional - No setor brasileiro",
+        "Internacional - No setor mundial",
+        "Diversificado - Abrangência em mais de um setor"
+    ]
+    ambito_aplicacao: str
+
+# Função para gerar proposta automática em uma única chamada com resposta JSON
+def gerar_proposta_estruturada(client, desafio_edital):
+    brief_desafio = condensar_desafio(client, desafio_edital)
+    
+    prompt = f'''
+    ANALISE este desafio de edital e gere uma PROPOSTA COMPLETA com uma SOLUÇÃO INOVADORA:
+
+    DESAFIO DO EDITAL:
+    {ajustar_entrada(brief_desafio, 'proposta_estruturada')}
+
+    Preencha todos os campos:
+    - descricao_solucao: descrição técnica detalhada da solução
+    - aspectos_inovativos: elementos inovadores e diferenciais competitivos
+    - tecnologias_previstas: tecnologias envolvidas (focar em IA, IoT, dados)
+    - tipo_produto: tipo de produto resultante
+    - potencial_mercado: potencial de mercado e aplicação
+    - titulo: título criativo e impactante (máx 200 caracteres)
+    - codigo_desafio: código do desafio ou EDITAL-2024-XXX
+    - nome_desafio: nome resumido do desafio
+    - duracao_meses: duração realista em meses
+    - orcamento: orçamento REALISTA em reais para cada rubrica, considerando complexidade Alta
+    - alcance: alcance realista da solução
+    - ambito_aplicacao: âmbito de aplicação com setores beneficiados, usuários potenciais e impactos esperados
+
+    Seja preciso, técnico e decidido no que será desenvolvido.
+    Foque em implementações práticas que envolvam tecnologias avançadas.
+    '''
+    
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=PropostaEstruturada
+    )
+    
+    response = gerar_conteudo(
+        client,
+        model=obter_modelo('proposta_estruturada'),
+        contents=prompt,
+        config=config,
+        tipo_prompt='proposta_estruturada'
+    )
+    
+    resultado = response.parsed
+    if not isinstance(resultado, PropostaEstruturada):
+        resultado = PropostaEstruturada.model_validate_json(response.text)
+    
+    dados_solucao = {
+        'descricao_solucao': resultado.descricao_solucao,
+        'aspectos_inovativos': resultado.aspectos_inovativos,
+        'tecnologias_previstas': resultado.tecnologias_previstas,
+        'tipo_produto': resultado.tipo_produto,
+        'potencial_mercado': resultado.potencial_mercado
+    }
+    dados_solucao.update(DADOS_PADRAO_SOLUCAO)
+    
+    orcamento = resultado.orcamento
+    proposta_completa = {
+        'titulo': resultado.titulo.strip()[:200],
+        'desafio_info': f"CÓDIGO: {resultado.codigo_desafio}\nNOME: {resultado.nome_desafio}",
+        'duracao_meses': str(resultado.duracao_meses),
+        'orcamento': (
+            f"TOTAL: {orcamento.total}\nRH: {orcamento.rh}\n"
+            f"MATERIAL_PERMANENTE: {orcamento.material_permanente}\n"
+            f"MATERIAL_CONSUMO: {orcamento.material_consumo}\n"
+            f"SERVICOS_TERCEIROS: {orcamento.servicos_terceiros}\n"
+            f"VIAGENS: {orcamento.viagens}\nOUTROS: {orcamento.outros}\n"
+            f"COMUNICACAO: {orcamento.comunicacao}\nSTARTUPS: {orcamento.startups}"
+        ),
+        'tecnologias': resultado.tecnologias_previstas,
+        'tipo_produto': resultado.tipo_produto[:255],
+        'alcance': resultado.alcance,
+        'trl': f"TRL_INICIAL: {dados_solucao['trl_inicial']}\nTRL_FINAL: {dados_solucao['trl_final']}",
+        'propriedade_intelectual': dados_solucao['propriedade_intelectual'][:1000],
+        'aspectos_inovativos': resultado.aspectos_inovativos[:1000],
+        'ambito_aplicacao': resultado.ambito_aplicacao
+    }
+    
+    return proposta_completa, dados_solucao
+
+# Função para gerar proposta manual
+def gerar_proposta_manual(client, desafio_edital, dados_solucao):
+    proposta_completa = {}
+    
+    brief_desafio = condensar_desafio(client, desafio_edital)
+    
+    prompt_titulo = f'''
+    Crie um TÍTULO (máx 200 caracteres):
+    DESAFIO: {ajustar_entrada(brief_desafio, 'titulo_manual')}
+    SOLUÇÃO: {ajustar_entrada(dados_solucao['descricao_solucao'], 'titulo_manual')}
+    Retorne APENAS o título.
+    '''
+    response = gerar_conteudo(
+        client,
+        model=obter_modelo('titulo_manual'),
+        contents=prompt_titulo,
+        tipo_prompt='titulo_manual'
+    )
+    proposta_completa['titulo'] = primeira_linha(response.text)[:200]
+    
+    proposta_completa.update({
+        'desafio_info': f"CÓDIGO: EDITAL-2024-001\nNOME: {desafio_edital[:50]}...",
+        'duracao_meses': "18",
+        'orcamento': "TOTAL: 1200000\nRH: 600000\nMATERIAL_PERMANENTE: 300000\nMATERIAL_CONSUMO: 100000\nSERVICOS_TERCEIROS: 150000\nVIAGENS: 30000\nOUTROS: 15000\nCOMUNICACAO: 20000\nSTARTUPS: 0",
+        'tecnologias': dados_solucao.get('tecnologias_previstas', 'Tecnologias a definir'),
+        'tipo_produto': dados_solucao.get('tipo_produto', 'Sistema integrado')[:255],
+        'alcance': "Nacional - No setor brasileiro",
+        'trl': f"TRL_INICIAL: {dados_solucao.get('trl_inicial', 'TRL4')}\nTRL_FINAL: {dados_solucao.get('trl_final', 'TRL7')}",
+        'propriedade_intelectual': dados_solucao.get('propriedade_intelectual', 'Potencial para registro de patente')[:1000],
+        'aspectos_inovativos': dados_solucao.get('aspectos_inovativos', 'Solução inovadora')[:1000],
+        'ambito_aplicacao': dados_solucao.get('descricao_solucao', 'Aplicação em múltiplos setores')
+    })
+    
+    return proposta_completa
@@ -0,0 +1,129 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# PyPDF2, python-docx e a configuração (que carrega o Streamlit) são importados só quando usados,
+# o que também mantém leves os processos do pool de extração
+
+TIPO_PDF = "application/pdf"
+TIPO_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Limites padrão de leitura dos documentos
+MAX_BYTES = 25 * 1024 * 1024
+MAX_PAGINAS = 300
+MAX_CARACTERES = 400_000
+
+# Abaixo deste número de páginas a extração é feita no próprio processo
+MIN_PAGINAS_PARALELO = 16
+
+_executor = None
+_executor_workers = 1
+_executor_lock = threading.Lock()
+
+
+# Retorna o pool de processos compartilhado para extração de páginas
+def obter_executor(max_workers=None):
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None:
+            _executor_workers = max_workers or min(4, os.cpu_count() or 1)
+            # spawn evita herdar as threads do servidor do Streamlit no fork
+            _executor = ProcessPoolExecutor(
+                max_workers=_executor_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+# Extrai o texto de um intervalo de páginas do PDF (executado nos processos do pool)
+def _extrair_intervalo_pdf(dados, inicio, fim):
+    import PyPDF2
+
+    leitor = PyPDF2.PdfReader(io.BytesIO(dados))
+    return [leitor.pages[i].extract_text() or "" for i in range(inicio, fim)]
+
+
+def _paginas_pdf(dados, max_paginas, max_workers):
+    import PyPDF2
+
+    leitor = PyPDF2.PdfReader(io.BytesIO(dados))
+    total = min(len(leitor.pages), max_paginas)
+
+    if total < MIN_PAGINAS_PARALELO:
+        for i in range(total):
+            yield leitor.pages[i].extract_text() or ""
+        return
+
+    executor = obter_executor(max_workers)
+    tamanho_bloco = max(4, -(-total // (_executor_workers * 2)))
+    futuros = [
+        executor.submit(_extrair_intervalo_pdf, dados, inicio, min(inicio + tamanho_bloco, total))
+        for inicio in range(0, total, tamanho_bloco)
+    ]
+    try:
+        # As páginas saem na ordem do documento, bloco a bloco
+        for futuro in futuros:
+            yield from futuro.result()
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+
+
+def _paragrafos_docx(dados):
+    import docx
+
+    documento = docx.Document(io.BytesIO(dados))
+    for paragrafo in documento.paragraphs:
+        yield paragrafo.text
+
+
+def _texto_simples(dados):
+    yield str(dados, "utf-8", errors="replace")
+
+
+# Gera o texto de cada página (ou parágrafo, no DOCX) de um documento em memória
+def extrair_paginas(dados, tipo_arquivo, max_bytes=MAX_BYTES, max_paginas=MAX_PAGINAS,
+                    max_caracteres=MAX_CARACTERES, max_workers=None):
+    if len(dados) > max_bytes:
+        raise ValueError(
+            f"Arquivo com {len(dados) / (1024 * 1024):.1f} MB excede o limite de {max_bytes / (1024 * 1024):.0f} MB"
+        )
+
+    if tipo_arquivo == TIPO_PDF:
+        paginas = _paginas_pdf(dados, max_paginas, max_workers)
+    elif tipo_arquivo == TIPO_DOCX:
+        paginas = _paragrafos_docx(dados)
+    else:
+        paginas = _texto_simples(dados)
+
+    restante = max_caracteres
+    try:
+        for texto in paginas:
+            if restante <= 0:
+                break
+            texto = texto[:restante]
+            restante -= len(texto)
+            yield texto
+    finally:
+        paginas.close()
+
+
+# Extrai o texto completo de um documento em memória
+def extrair_texto(dados, tipo_arquivo, **limites):
+    return "\n".join(extrair_paginas(dados, tipo_arquivo, **limites))
+
+
+# Extrai o texto de um arquivo enviado pelo app, com os limites da configuração
+def extrair_texto_enviado(arquivo_enviado):
+    from config import obter_config_numero
+
+    return extrair_texto(
+        arquivo_enviado.getvalue(),
+        arquivo_enviado.type,
+        max_bytes=obter_config_numero("INGESTAO_MAX_MB", 25) * 1024 * 1024,
+        max_paginas=obter_config_numero("INGESTAO_MAX_PAGINAS", 300),
+        max_caracteres=obter_config_numero("INGESTAO_MAX_CARACTERES", 400000),
+        max_workers=obter_config_numero("INGESTAO_PROCESSOS", 0) or None
+    )
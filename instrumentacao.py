@@ -0,0 +1,259 @@
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import obter_config, obter_config_numero
+
+# Preço em USD por milhão de tokens (entrada, saída, entrada em cache); ajuste conforme a tabela vigente
+PRECOS_MODELOS = {
+    "gemini-2.5-flash": (0.30, 2.50, 0.075),
+    "gemini-2.5-flash-lite": (0.10, 0.40, 0.025),
+    "gemini-2.5-pro": (1.25, 10.00, 0.31),
+}
+
+_execucao_atual = contextvars.ContextVar("execucao_atual", default=None)
+
+
+# Uma execução (proposta, busca ou item do lote) que agrupa os spans das chamadas feitas nela
+class Execucao:
+    def __init__(self, nome):
+        self.nome = nome
+        self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.inicio = time.time()
+        self.fim = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def adicionar(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def resumo(self):
+        with self._lock:
+            spans = list(self.spans)
+        chamadas = [s for s in spans if s["nome"].startswith("gemini.")]
+        return {
+            "execucao": self.nome,
+            "duracao_ms": round(((self.fim or time.time()) - self.inicio) * 1000, 1),
+            "chamadas_gemini": len(chamadas),
+            "acertos_cache": sum(1 for s in chamadas if s.get("cache") == "acerto"),
+            "agrupadas": sum(1 for s in chamadas if s.get("cache") == "agrupada"),
+            "erros": sum(1 for s in spans if s.get("erro")),
+            "tokens_entrada": sum(s.get("tokens_entrada", 0) for s in chamadas),
+            "tokens_saida": sum(s.get("tokens_saida", 0) for s in chamadas),
+            "custo_usd": round(sum(s.get("custo_usd", 0.0) for s in chamadas), 6),
+        }
+
+
+# Guarda os spans recentes do processo e, se configurado, grava cada um em um arquivo JSONL
+class RegistroSpans:
+    def __init__(self, max_spans=5000, max_execucoes=100, caminho_jsonl=None):
+        self.caminho_jsonl = caminho_jsonl
+        self.spans = deque(maxlen=max_spans)
+        self.execucoes = deque(maxlen=max_execucoes)
+        self._lock = threading.Lock()
+
+    def registrar(self, span):
+        with self._lock:
+            self.spans.append(span)
+            if self.caminho_jsonl:
+                os.makedirs(os.path.dirname(self.caminho_jsonl) or ".", exist_ok=True)
+                with open(self.caminho_jsonl, "a", encoding="utf-8") as arquivo:
+                    arquivo.write(json.dumps(span, ensure_ascii=False) + "\n")
+
+    def registrar_execucao(self, execucao):
+        with self._lock:
+            self.execucoes.append(execucao)
+
+    # Latência p50/p95, tokens, custo e qualidade por rota: tipo de prompt e modelo
+    # (ou operação, para o MongoDB)
+    def percentis(self):
+        import numpy as np
+
+        with self._lock:
+            spans = list(self.spans)
+        grupos = {}
+        for span in spans:
+            grupos.setdefault((span.get("tipo_prompt") or span["nome"], span.get("modelo") or ""), []).append(span)
+
+        linhas = []
+        for (tipo, modelo), itens in sorted(grupos.items()):
+            # Acertos de cache e chamadas agrupadas (que esperaram outra idêntica) não medem o Gemini
+            # e ficam fora dos percentis
+            chamadas = [s for s in itens if s.get("cache") not in ("acerto", "agrupada")]
+            duracoes = [s["duracao_ms"] for s in chamadas]
+            # Fração das respostas com o formato esperado, nos tipos que têm validação
+            avaliadas = [s["resposta_valida"] for s in chamadas if "resposta_valida" in s]
+            linhas.append({
+                "tipo": tipo,
+                "modelo": modelo or None,
+                "chamadas": len(itens),
+                "acertos_cache": sum(1 for s in itens if s.get("cache") == "acerto"),
+                "agrupadas": sum(1 for s in itens if s.get("cache") == "agrupada"),
+                "erros": sum(1 for s in itens if s.get("erro")),
+                "p50_ms": round(float(np.percentile(duracoes, 50)), 1) if duracoes else None,
+                "p95_ms": round(float(np.percentile(duracoes, 95)), 1) if duracoes else None,
+                "tokens_entrada": sum(s.get("tokens_entrada", 0) for s in itens),
+                "tokens_saida": sum(s.get("tokens_saida", 0) for s in itens),
+                # Planejado contra real nas chamadas com plano de tokens (acertos de cache não contam)
+                "tokens_saida_planejados": sum(s.get("tokens_saida_planejados", 0) for s in chamadas),
+                "limite_saida": sum(1 for s in itens if s.get("limite_saida")),
+                "respostas_validas": round(sum(avaliadas) / len(avaliadas), 3) if avaliadas else None,
+                "custo_usd": round(sum(s.get("custo_usd", 0.0) for s in itens), 6),
+            })
+        return linhas
+
+    def exportar_jsonl(self):
+        with self._lock:
+            return "".join(json.dumps(span, ensure_ascii=False) + "\n" for span in self.spans)
+
+    # Exporta os spans no formato OTLP/JSON do OpenTelemetry, com um span raiz por execução
+    def exportar_otlp(self):
+        with self._lock:
+            spans = list(self.spans)
+            execucoes = list(self.execucoes)
+
+        spans_otlp = []
+        for execucao in execucoes:
+            spans_otlp.append(_span_otlp(
+                execucao.trace_id, execucao.span_id, None, execucao.nome,
+                execucao.inicio, execucao.fim or time.time(), {}, None
+            ))
+        for span in spans:
+            atributos = {
+                chave: valor for chave, valor in span.items()
+                if chave not in ("nome", "trace_id", "span_id", "parent_span_id", "inicio", "duracao_ms", "erro")
+                and valor is not None
+            }
+            spans_otlp.append(_span_otlp(
+                span["trace_id"], span["span_id"], span.get("parent_span_id"), span["nome"],
+                span["inicio"], span["inicio"] + span["duracao_ms"] / 1000, atributos, span.get("erro")
+            ))
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_atributo_otlp("service.name", "solution-generator")]},
+            "scopeSpans": [{"scope": {"name": "instrumentacao"}, "spans": spans_otlp}],
+        }]}
+
+
+def _atributo_otlp(chave, valor):
+    if isinstance(valor, bool):
+        return {"key": chave, "value": {"boolValue": valor}}
+    if isinstance(valor, int):
+        return {"key": chave, "value": {"intValue": str(valor)}}
+    if isinstance(valor, float):
+        return {"key": chave, "value": {"doubleValue": valor}}
+    return {"key": chave, "value": {"stringValue": str(valor)}}
+
+
+def _span_otlp(trace_id, span_id, parent_span_id, nome, inicio, fim, atributos, erro):
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": nome,
+        "kind": 3 if nome.startswith(("gemini.", "mongo.")) else 1,
+        "startTimeUnixNano": str(int(inicio * 1e9)),
+        "endTimeUnixNano": str(int(fim * 1e9)),
+        "attributes": [_atributo_otlp(chave, valor) for chave, valor in atributos.items()],
+        "status": {"code": 2, "message": erro} if erro else {"code": 1},
+    }
+    if parent_span_id:
+        span["parentSpanId"] = parent_span_id
+    return span
+
+
+_registro = None
+_registro_lock = threading.Lock()
+
+
+# Retorna o registro de spans compartilhado pelo processo
+def obter_registro():
+    global _registro
+    with _registro_lock:
+        if _registro is None:
+            _registro = RegistroSpans(
+                max_spans=obter_config_numero("INSTRUMENTACAO_MAX_SPANS", 5000),
+                caminho_jsonl=obter_config("INSTRUMENTACAO_PATH"),
+            )
+        return _registro
+
+
+# Inicia uma execução; os spans medidos a partir daqui (inclusive nas threads criadas com propagar) ficam nela
+def iniciar_execucao(nome):
+    execucao = Execucao(nome)
+    obter_registro().registrar_execucao(execucao)
+    _execucao_atual.set(execucao)
+    return execucao
+
+
+def encerrar_execucao(execucao):
+    execucao.fim = time.time()
+    if _execucao_atual.get() is execucao:
+        _execucao_atual.set(None)
+
+
+# Faz a função rodar em outras threads dentro da execução atual
+def propagar(funcao):
+    contexto = contextvars.copy_context()
+
+    # Cada chamada usa sua própria cópia, já que um contexto não pode estar ativo em duas threads
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        return contexto.copy().run(funcao, *args, **kwargs)
+    return executar
+
+
+# Mede uma operação: tempo de parede, erro e os atributos preenchidos no span durante a medição
+@contextmanager
+def medir(nome, **atributos):
+    execucao = _execucao_atual.get()
+    span = {
+        "nome": nome,
+        "trace_id": execucao.trace_id if execucao else secrets.token_hex(16),
+        "span_id": secrets.token_hex(8),
+        "parent_span_id": execucao.span_id if execucao else None,
+        "execucao": execucao.nome if execucao else None,
+        "inicio": time.time(),
+        "erro": None,
+        **atributos,
+    }
+    inicio = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span["erro"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span["duracao_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        obter_registro().registrar(span)
+        if execucao is not None:
+            execucao.adicionar(span)
+
+
+# Preenche no span os tokens e o custo de uma resposta do Gemini, e se ela parou no limite de saída
+def registrar_resposta(span, response):
+    texto = response.text or ""
+    span["tamanho_resposta"] = len(texto)
+    if response.candidates and response.candidates[0].finish_reason == "MAX_TOKENS":
+        span["limite_saida"] = True
+    uso = response.usage_metadata
+    # Tokens e custo ficam só no span da chamada que foi de fato ao Gemini
+    if uso is None or span.get("cache") in ("acerto", "agrupada"):
+        return
+    entrada = uso.prompt_token_count or 0
+    em_cache = uso.cached_content_token_count or 0
+    saida = (uso.candidates_token_count or 0) + (uso.thoughts_token_count or 0)
+    span["tokens_entrada"] = entrada
+    span["tokens_em_cache"] = em_cache
+    span["tokens_saida"] = saida
+    preco_entrada, preco_saida, preco_cache = PRECOS_MODELOS.get(span.get("modelo"), (0.0, 0.0, 0.0))
+    span["custo_usd"] = round(
+        ((entrada - em_cache) * preco_entrada + em_cache * preco_cache + saida * preco_saida) / 1e6, 8
+    )
@@ -0,0 +1,164 @@
+import threading
+import time
+
+import httpx
+from google.genai import errors
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from config import obter_config_numero
+
+# Códigos HTTP que valem uma nova tentativa
+CODIGOS_TRANSITORIOS = {408, 429, 500, 502, 503, 504}
+
+# Códigos que indicam que o Gemini está limitando as chamadas
+CODIGOS_LIMITE = {429, 503}
+
+
+# Indica se o erro é temporário e a chamada pode ser repetida
+def erro_transitorio(erro):
+    if isinstance(erro, errors.APIError):
+        return erro.code in CODIGOS_TRANSITORIOS
+    return isinstance(erro, (httpx.TimeoutException, httpx.TransportError))
+
+
+# Indica se o erro é um sinal de limitação (cota ou sobrecarga)
+def erro_de_limite(erro):
+    return isinstance(erro, errors.APIError) and erro.code in CODIGOS_LIMITE
+
+
+# Balde de tokens reposto continuamente a uma taxa por minuto
+class BaldeTokens:
+    def __init__(self, capacidade_por_minuto):
+        self.capacidade = float(capacidade_por_minuto)
+        self.taxa_por_segundo = self.capacidade / 60.0
+        self.disponivel = self.capacidade
+        self.atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Reserva a quantidade e retorna quantos segundos esperar até ela estar disponível
+    def reservar(self, quantidade):
+        quantidade = min(float(quantidade), self.capacidade)
+        with self._lock:
+            agora = time.monotonic()
+            self.disponivel = min(
+                self.capacidade, self.disponivel + (agora - self.atualizado_em) * self.taxa_por_segundo
+            )
+            self.atualizado_em = agora
+            self.disponivel -= quantidade
+            if self.disponivel >= 0:
+                return 0.0
+            return -self.disponivel / self.taxa_por_segundo
+
+    # Devolve ao balde uma quantidade reservada e não usada, sem passar da capacidade
+    def devolver(self, quantidade):
+        with self._lock:
+            self.disponivel = min(self.capacidade, self.disponivel + float(quantidade))
+
+
+# Limite de chamadas simultâneas ajustado por AIMD: cai pela metade quando o Gemini
+# limita as chamadas e volta a crescer aos poucos a cada sucesso
+class ConcorrenciaAdaptativa:
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self.limite = float(maximo)
+        self.em_uso = 0
+        self._condicao = threading.Condition()
+
+    def entrar(self):
+        with self._condicao:
+            while self.em_uso >= int(self.limite):
+                self._condicao.wait()
+            self.em_uso += 1
+
+    def sair(self, limitado=False):
+        with self._condicao:
+            self.em_uso -= 1
+            if limitado:
+                self.limite = max(1.0, self.limite / 2)
+            else:
+                self.limite = min(float(self.maximo), self.limite + 1.0 / self.limite)
+            self._condicao.notify_all()
+
+
+# Camada compartilhada de limites para as chamadas ao Gemini
+class LimitadorGemini:
+    def __init__(self, requisicoes_por_minuto, tokens_por_minuto, max_concorrencia, max_tentativas):
+        self.requisicoes = BaldeTokens(requisicoes_por_minuto)
+        self.tokens = BaldeTokens(tokens_por_minuto)
+        self.concorrencia = ConcorrenciaAdaptativa(max_concorrencia)
+        self.max_tentativas = max_tentativas
+        self.tentativas_repetidas = 0
+        self.limitacoes = 0
+
+    # Executa a função respeitando cota, concorrência e novas tentativas com backoff
+    def executar(self, funcao, tokens_estimados=0):
+        for tentativa in Retrying(
+            stop=stop_after_attempt(self.max_tentativas),
+            wait=wait_random_exponential(multiplier=1, max=30),
+            retry=retry_if_exception(erro_transitorio),
+            before_sleep=self._registrar_nova_tentativa,
+            reraise=True,
+        ):
+            with tentativa:
+                return self._executar_uma_vez(funcao, tokens_estimados)
+
+    # Acerta o balde com o uso real: desconta os tokens usados além da estimativa ou devolve
+    # os reservados e não usados
+    def registrar_tokens(self, tokens_usados, tokens_estimados):
+        if not tokens_usados:
+            return
+        if tokens_usados > tokens_estimados:
+            self.tokens.reservar(tokens_usados - tokens_estimados)
+        elif tokens_usados < tokens_estimados:
+            self.tokens.devolver(tokens_estimados - tokens_usados)
+
+    def _executar_uma_vez(self, funcao, tokens_estimados):
+        espera = max(self.requisicoes.reservar(1), self.tokens.reservar(tokens_estimados))
+        if espera:
+            time.sleep(espera)
+
+        self.concorrencia.entrar()
+        limitado = False
+        try:
+            return funcao()
+        except Exception as e:
+            limitado = erro_de_limite(e)
+            if limitado:
+                self.limitacoes += 1
+            raise
+        finally:
+            self.concorrencia.sair(limitado)
+
+    def _registrar_nova_tentativa(self, estado):
+        self.tentativas_repetidas += 1
+
+    def estatisticas(self):
+        return {
+            "limite_concorrencia": int(self.concorrencia.limite),
+            "em_uso": self.concorrencia.em_uso,
+            "limitacoes": self.limitacoes,
+            "tentativas_repetidas": self.tentativas_repetidas,
+        }
+
+
+_limitador = None
+_limitador_lock = threading.Lock()
+
+
+# Retorna o limitador compartilhado pelo processo, dimensionado pela cota configurada
+def obter_limitador():
+    global _limitador
+    with _limitador_lock:
+        if _limitador is None:
+            _limitador = LimitadorGemini(
+                requisicoes_por_minuto=obter_config_numero("GEMINI_RPM", 1000),
+                tokens_por_minuto=obter_config_numero("GEMINI_TPM", 1000000),
+                max_concorrencia=obter_config_numero("GEMINI_MAX_CONCORRENCIA", 16),
+                max_tentativas=obter_config_numero("GEMINI_MAX_TENTATIVAS", 5),
+            )
+        return _limitador
+
+
+# Timeout por chamada, em milissegundos, no formato do HttpOptions
+def timeout_chamada_ms():
+    return int(obter_config_numero("GEMINI_TIMEOUT_S", 120.0) * 1000)
@@ -0,0 +1,168 @@
+import argparse
+import json
+import mimetypes
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime
+
+from clientes import obter_cliente_gemini
+from config import obter_config
+from geracao import gerar_proposta_automatica, gerar_proposta_estruturada, gerar_proposta_manual
+from ingestao import extrair_texto
+from instrumentacao import encerrar_execucao, iniciar_execucao, obter_registro
+from persistencia import salvar_no_mongo
+
+EXTENSOES_SUPORTADAS = {".txt", ".md", ".pdf", ".docx"}
+
+
+# Lê os desafios de um diretório (um arquivo por desafio) ou de um arquivo JSONL; os IDs em ignorar
+# (já concluídos) são pulados antes da extração do texto. Uma linha inválida do JSONL vira um item com erro
+def ler_entradas(caminho, ignorar=()):
+    if os.path.isdir(caminho):
+        for nome in sorted(os.listdir(caminho)):
+            extensao = os.path.splitext(nome)[1].lower()
+            if extensao not in EXTENSOES_SUPORTADAS or nome in ignorar:
+                continue
+            caminho_arquivo = os.path.join(caminho, nome)
+            with open(caminho_arquivo, "rb") as arquivo:
+                dados = arquivo.read()
+            tipo = mimetypes.guess_type(caminho_arquivo)[0] or "text/plain"
+            yield {"id": nome, "desafio": extrair_texto(dados, tipo)}
+    else:
+        with open(caminho, encoding="utf-8") as arquivo:
+            for numero, linha in enumerate(arquivo, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    item = json.loads(linha)
+                except json.JSONDecodeError as e:
+                    print(f"{caminho}, linha {numero}: JSON inválido ({e})", file=sys.stderr)
+                    yield {"id": f"linha-{numero}", "erro": f"JSON inválido: {e}"}
+                    continue
+                item.setdefault("id", f"linha-{numero}")
+                if item["id"] not in ignorar:
+                    yield item
+
+
+# Lê os IDs já concluídos do arquivo de saída, que também funciona como checkpoint
+def ler_concluidos(caminho_saida):
+    concluidos = set()
+    if not os.path.exists(caminho_saida):
+        return concluidos
+    with open(caminho_saida, encoding="utf-8") as arquivo:
+        for numero, linha in enumerate(arquivo, start=1):
+            try:
+                resultado = json.loads(linha)
+            except json.JSONDecodeError:
+                # Linha incompleta de uma execução interrompida; o item dela é processado de novo
+                print(f"{caminho_saida}, linha {numero}: resultado incompleto ignorado", file=sys.stderr)
+                continue
+            if not resultado.get("erro"):
+                concluidos.add(resultado["id"])
+    return concluidos
+
+
+# Gera a proposta de um item no modo escolhido; retorna a proposta, os dados da solução
+# e as seções estimadas localmente
+def processar_item(client, item, modo):
+    desafio_edital = item["desafio"]
+    execucao = iniciar_execucao(f"lote {item['id']}")
+    try:
+        if modo == "manual":
+            dados_solucao = item.get("dados_solucao") or {}
+            if not dados_solucao.get("descricao_solucao"):
+                raise ValueError("o modo manual exige dados_solucao com descricao_solucao no item do JSONL")
+            proposta_completa = gerar_proposta_manual(client, desafio_edital, dados_solucao)
+            return proposta_completa, dados_solucao, []
+        if modo == "estruturada":
+            return (*gerar_proposta_estruturada(client, desafio_edital), [])
+        return gerar_proposta_automatica(client, desafio_edital)
+    finally:
+        encerrar_execucao(execucao)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera propostas para vários editais em lote")
+    parser.add_argument("entrada", help="Diretório com um arquivo por desafio ou arquivo JSONL com {id, desafio}")
+    parser.add_argument("--saida", default="propostas_lote.jsonl", help="Arquivo JSONL de resultados (checkpoint)")
+    parser.add_argument("--modo", choices=["automatica", "estruturada", "manual"], default="automatica")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Número de propostas geradas ao mesmo tempo")
+    parser.add_argument("--sem-mongo", action="store_true", help="Não salvar as propostas no MongoDB")
+    args = parser.parse_args(argv)
+
+    # Um diretório só traz o texto do desafio, sem os dados da solução que o modo manual precisa
+    if args.modo == "manual" and os.path.isdir(args.entrada):
+        print("O modo manual exige um arquivo JSONL com {id, desafio, dados_solucao}", file=sys.stderr)
+        return 1
+
+    gemini_api_key = obter_config("GEMINI_API_KEY")
+    if not gemini_api_key:
+        print("Defina GEMINI_API_KEY no ambiente ou em .streamlit/secrets.toml", file=sys.stderr)
+        return 1
+    client = obter_cliente_gemini(gemini_api_key)
+
+    concluidos = ler_concluidos(args.saida)
+    print(f"{len(concluidos)} já concluídos")
+
+    tipo_geracao = {"automatica": "automática", "estruturada": "automática (estruturada)", "manual": "manual"}[args.modo]
+    falhas = 0
+    numero = 0
+
+    with open(args.saida, "a", encoding="utf-8") as saida, \
+            ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+
+        def gravar(item, resultado):
+            nonlocal falhas, numero
+            numero += 1
+            if "erro" in resultado:
+                falhas += 1
+            # Cada item concluído é gravado e sincronizado antes de seguir, para permitir retomar
+            saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            saida.flush()
+            os.fsync(saida.fileno())
+            print(f"[{numero}] {item['id']}: {'erro - ' + resultado['erro'] if 'erro' in resultado else 'ok'}")
+
+        def concluir(futuro, item):
+            resultado = {"id": item["id"], "data_criacao": datetime.now().isoformat()}
+            try:
+                proposta_completa, dados_solucao, secoes_estimadas = futuro.result()
+                resultado.update({"proposta_completa": proposta_completa, "dados_solucao": dados_solucao})
+                if not args.sem_mongo:
+                    resultado["salvo_mongo"] = salvar_no_mongo(
+                        proposta_completa, item["desafio"], tipo_geracao, dados_solucao, secoes_estimadas
+                    ) is not None
+            except Exception as e:
+                resultado["erro"] = str(e)
+            gravar(item, resultado)
+
+        # As entradas são lidas (e os arquivos extraídos) à medida que há vaga na janela de envio,
+        # para não carregar o lote inteiro na memória antes de começar
+        janela = max(1, args.concorrencia) * 2
+        futuros = {}
+        for item in ler_entradas(args.entrada, ignorar=concluidos):
+            if "erro" in item:
+                gravar(item, {"id": item["id"], "data_criacao": datetime.now().isoformat(), "erro": item["erro"]})
+                continue
+            if len(futuros) >= janela:
+                prontos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    concluir(futuro, futuros.pop(futuro))
+            futuros[executor.submit(processar_item, client, item, args.modo)] = item
+        for futuro in as_completed(futuros):
+            concluir(futuro, futuros[futuro])
+
+    # Resumo de latência e custo por rota (os spans completos vão para INSTRUMENTACAO_PATH)
+    for linha in obter_registro().percentis():
+        validas = f", {linha['respostas_validas']:.0%} válidas" if linha['respostas_validas'] is not None else ""
+        print(
+            f"{linha['tipo']} [{linha['modelo'] or '-'}]: {linha['chamadas']} chamadas, p50 {linha['p50_ms']} ms, "
+            f"p95 {linha['p95_ms']} ms, {linha['tokens_entrada']}+{linha['tokens_saida']} tokens, "
+            f"US$ {linha['custo_usd']:.4f}{validas}"
+        )
+
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,24 @@
 import streamlit as st
-from google import genai
-from google.genai import types
 import os
-import uuid
 from datetime import datetime
-from pymongo import MongoClient
-import tempfile
-import PyPDF2
-import docx
 import re
+import json
+from cache_gemini import obter_cache
+from gemini import obter_chamadas_em_andamento
+from limites import obter_limitador
+from config import obter_config, obter_config_numero
+from ingestao import extrair_texto_enviado
+from clientes import obter_cliente_gemini, obter_colecao_propostas
+from catalogo import obter_colecoes_catalogo, buscar_editais_catalogados, buscar_combinacoes, mesclar_editais
+from duplicatas import buscar_desafio_semelhante
+from persistencia import obter_escritor, listar_propostas, obter_proposta
+from instrumentacao import iniciar_execucao, encerrar_execucao, obter_registro
+from geracao import SECOES_REGENERAVEIS, secoes_afetadas
+from tarefas import (
+    NA_FILA, EXECUTANDO, CONCLUIDA, CANCELADA, ERRO, obter_gerenciador_tarefas, tarefa_proposta_automatica,
+    tarefa_proposta_manual, tarefa_regenerar_secao
+)
+from busca_editais import buscar_editais_especificos, obter_cache_buscas
 
 # Configuração da página
 st.set_page_config(page_title="Gerador de Propostas para Editais", page_icon="🚀", layout="wide")
@@ -23,373 +33,93 @@ if not gemini_api_key:
     gemini_api_key = st.text_input("Digite sua API Key do Gemini:", type="password")
 
 if gemini_api_key:
-    client = genai.Client(api_key=gemini_api_key)
+    client = obter_cliente_gemini(gemini_api_key)
     
-    # Conexão com MongoDB (opcional)
-    try:
-        mongodb_uri = st.secrets.get("MONGODB_URI", os.getenv("MONGODB_URI"))
-        if mongodb_uri:
-            client_mongo = MongoClient(mongodb_uri)
-            db = client_mongo['propostas_editais']
-            collection = db['propostas_geradas']
-            mongo_connected = True
-        else:
-            mongo_connected = False
-    except:
-        mongo_connected = False
+    # Inicia o escritor do MongoDB (índices e reenvio do journal local)
+    if obter_config("MONGODB_URI"):
+        obter_escritor()
 
-    # Função para buscar editais abertos com Web Search
-    def buscar_editais_abertos_web(palavras_chave, area_interesse, tipo_edital):
-        grounding_tool = types.Tool(
-            google_search=types.GoogleSearch()
-        )
-        
-        config = types.GenerateContentConfig(
-            tools=[grounding_tool],
-            temperature=0.3
-        )
-        
-        prompt = f'''
-        Busque por EDITAIS ABERTOS E ATIVOS em todo o mundo para projetos de inovação, tecnologia e P&D.
-        
-        PALAVRAS-CHAVE: {palavras_chave}
-        ÁREA DE INTERESSE: {area_interesse}
-        TIPO DE EDITAL: {tipo_edital}
-        
-        Foque em encontrar editais ativos de:
-        - Empresas de energia e utilities
-        - Órgãos governamentais
-        - Fundações de pesquisa
-        - Programas de inovação
-        - Agências de fomento
-        - Empresas de tecnologia
-        - Startups e venture capital
-        
-        Forneça informações detalhadas sobre:
-        - Nome completo do edital
-        - Organização responsável
-        - Prazo de submissão (especificar se está aberto)
-        - Valor disponível ou faixa de financiamento
-        - Link oficial para mais informações
-        - Áreas temáticas cobertas
-        - Requisitos de elegibilidade
-        - Contatos importantes
-        
-        Priorize editais com prazos em aberto e forneça informações atualizadas.
-        '''
-        
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-                config=config
-            )
-            
-            resultado = response.text
-            
-            # Adicionar informações das fontes se disponíveis
-            if hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'grounding_metadata'):
-                    resultado += "\n\n---\n**FONTES E REFERÊNCIAS:**\n"
-                    if hasattr(candidate.grounding_metadata, 'grounding_chunks'):
-                        for i, chunk in enumerate(candidate.grounding_metadata.grounding_chunks[:5]):
-                            if hasattr(chunk, 'web') and hasattr(chunk.web, 'uri'):
-                                resultado += f"\n{i+1}. {chunk.web.uri}"
-            
-            return resultado
-            
-        except Exception as e:
-            return f"Erro na busca: {str(e)}"
-
-    # Função para extrair texto de arquivos
-    def extract_text_from_file(uploaded_file):
-        text = ""
-        file_type = uploaded_file.type
-        
-        if file_type == "application/pdf":
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_file_path = tmp_file.name
-            
-            try:
-                with open(tmp_file_path, "rb") as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-            except Exception as e:
-                st.error(f"Erro ao ler PDF: {e}")
-            finally:
-                os.unlink(tmp_file_path)
-                
-        elif file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_file_path = tmp_file.name
-            
-            try:
-                doc = docx.Document(tmp_file_path)
-                for paragraph in doc.paragraphs:
-                    text += paragraph.text + "\n"
-            except Exception as e:
-                st.error(f"Erro ao ler DOCX: {e}")
-            finally:
-                os.unlink(tmp_file_path)
-                
-        else:
-            text = str(uploaded_file.getvalue(), "utf-8")
-        
-        return text
-
-    # Função para buscar editais específicos
-    def buscar_editais_especificos(descricao_solucao, palavras_chave, area_atuacao, inovacao):
-        grounding_tool = types.Tool(
-            google_search=types.GoogleSearch()
-        )
-        
-        config = types.GenerateContentConfig(
-            tools=[grounding_tool],
-            temperature=0.3
-        )
-        
-        prompt = f'''
-        Busque por EDITAIS ABERTOS adequados para esta solução específica:
-
-        DESCRIÇÃO DA SOLUÇÃO: {descricao_solucao}
-        ÁREA DE ATUAÇÃO: {area_atuacao}
-        ELEMENTOS INOVADORES: {inovacao}
-        PALAVRAS-CHAVE: {palavras_chave}
-
-        Encontre editais ativos que se alinhem com esta solução.
-        '''
-        
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-                config=config
-            )
-            return response.text
-        except Exception as e:
-            return f"Erro na busca: {str(e)}"
-
-    # Função para gerar proposta automática
-    def gerar_proposta_automatica(desafio_edital):
-        proposta_completa = {}
-        
-        # Analisar desafio e gerar solução
-        prompt_analise = f'''
-        ANALISE este desafio de edital e gere uma SOLUÇÃO INOVADORA completa:
-
-        DESAFIO DO EDITAL:
-        {desafio_edital}
-
-        Gere uma solução tecnológica inovadora que inclua:
-        1. Descrição técnica detalhada
-        2. Elementos inovadores e diferenciais competitivos
-        3. Tecnologias envolvidas (focar em IA, IoT, dados)
-        4. Tipo de produto resultante
-        5. Potencial de mercado e aplicação
-
-        Retorne no formato:
-        DESCRICAO_SOLUCAO: [descrição completa]
-        INOVACAO: [aspectos inovadores]
-        TECNOLOGIAS: [tecnologias utilizadas]
-        TIPO_PRODUTO: [tipo de produto]
-        POTENCIAL_MERCADO: [potencial de aplicação]
-
-        Seja preciso, técnico e decidido no que será desenvolvido.
-        Foque em implementações práticas que envolvam tecnologias avançadas.
-        '''
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt_analise
-        )
-        
-        resposta_analise = response.text
-        linhas = resposta_analise.split('\n')
-        
-        dados_solucao = {}
-        for linha in linhas:
-            if 'DESCRICAO_SOLUCAO:' in linha:
-                dados_solucao['descricao_solucao'] = linha.split('DESCRICAO_SOLUCAO:')[1].strip()
-            elif 'INOVACAO:' in linha:
-                dados_solucao['aspectos_inovativos'] = linha.split('INOVACAO:')[1].strip()
-            elif 'TECNOLOGIAS:' in linha:
-                dados_solucao['tecnologias_previstas'] = linha.split('TECNOLOGIAS:')[1].strip()
-            elif 'TIPO_PRODUTO:' in linha:
-                dados_solucao['tipo_produto'] = linha.split('TIPO_PRODUTO:')[1].strip()
-            elif 'POTENCIAL_MERCADO:' in linha:
-                dados_solucao['potencial_mercado'] = linha.split('POTENCIAL_MERCADO:')[1].strip()
-        
-        if not dados_solucao.get('descricao_solucao'):
-            dados_solucao['descricao_solucao'] = resposta_analise
-        
-        # Preencher dados padrão
-        dados_solucao.update({
-            'area_atuacao': "Tecnologia e Inovação",
-            'complexidade': "Alta",
-            'tamanho_equipe': "8",
-            'maturidade_tecnologica': "Protótipo Avançado",
-            'trl_inicial': "TRL4",
-            'trl_final': "TRL7",
-            'propriedade_intelectual': "Potencial para patente devido aos aspectos inovadores",
-            'estado_desenvolvimento': "Conceito validado"
-        })
-        
-        # Gerar cada item do formulário
-        prompt_titulo = f'''
-        Crie um TÍTULO criativo e impactante (máx 200 caracteres):
-
-        DESAFIO: {desafio_edital}
-        SOLUÇÃO: {dados_solucao['descricao_solucao'][:500]}
-        Retorne APENAS o título.
-        '''
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt_titulo
-        )
-        proposta_completa['titulo'] = response.text.strip()[:200]
-        
-        prompt_desafio = f'''
-        Extraia informações do desafio:
-        {desafio_edital}
-        Retorne:
-        CÓDIGO: [código ou EDITAL-2024-XXX]
-        NOME: [nome resumido do desafio]
-        '''
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt_desafio
-        )
-        proposta_completa['desafio_info'] = response.text
-        
-        prompt_duracao = f'''
-        Estime duração realista em MESES:
-        DESAFIO: {desafio_edital[:300]}
-        SOLUÇÃO: {dados_solucao['descricao_solucao'][:300]}
-        Retorne APENAS o número.
-        '''
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt_duracao
-        )
-        proposta_completa['duracao_meses'] = response.text.strip()
-        
-        prompt_orcamento = f'''
-        Calcule orçamento REALISTA para projeto de inovação:
-        SOLUÇÃO: {dados_solucao['descricao_solucao'][:400]}
-        DURAÇÃO: {proposta_completa['duracao_meses']} meses
-        COMPLEXIDADE: Alta
-        Retorne valores realistas no formato:
-        TOTAL: [valor total]
-        RH: [recursos humanos]
-        MATERIAL_PERMANENTE: [equipamentos]
-        MATERIAL_CONSUMO: [materiais]
-        SERVICOS_TERCEIROS: [serviços]
-        VIAGENS: [viagens]
-        OUTROS: [outros custos]
-        COMUNICACAO: [comunicação]
-        STARTUPS: [parcerias]
-        '''
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt_orcamento
-        )
-        proposta_completa['orcamento'] = response.text
-        
-        proposta_completa['tecnologias'] = dados_solucao['tecnologias_previstas']
-        proposta_completa['tipo_produto'] = dados_solucao['tipo_produto'][:255]
-        
-        prompt_alcance = f'''
-        Determine alcance realista:
-        SOLUÇÃO: {dados_solucao['descricao_solucao'][:400]}
-        POTENCIAL: {dados_solucao.get('potencial_mercado', '')}
-        Retorne uma das opções:
-        - Local - Na empresa/organização
-        - Nacional - No setor brasileiro
-        - Internacional - No setor mundial
-        - Diversificado - Abrangência em mais de um setor
-        '''
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt_alcance
-        )
-        proposta_completa['alcance'] = response.text.strip()
-        
-        proposta_completa['trl'] = f"TRL_INICIAL: {dados_solucao['trl_inicial']}\nTRL_FINAL: {dados_solucao['trl_final']}"
-        proposta_completa['propriedade_intelectual'] = dados_solucao['propriedade_intelectual'][:1000]
-        proposta_completa['aspectos_inovativos'] = dados_solucao['aspectos_inovativos'][:1000]
-        
-        prompt_ambito = f'''
-        Descreva o âmbito de aplicação detalhado:
-        SOLUÇÃO: {dados_solucao['descricao_solucao'][:500]}
-        TECNOLOGIAS: {dados_solucao['tecnologias_previstas']}
-        POTENCIAL: {dados_solucao.get('potencial_mercado', '')}
-        Inclua setores beneficiados, usuários potenciais e impactos esperados.
-        '''
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt_ambito
-        )
-        proposta_completa['ambito_aplicacao'] = response.text
-        
-        return proposta_completa, dados_solucao
-
-    # Função para gerar proposta manual
-    def gerar_proposta_manual(desafio_edital, dados_solucao):
-        proposta_completa = {}
-        
-        prompt_titulo = f'''
-        Crie um TÍTULO (máx 200 caracteres):
-        DESAFIO: {desafio_edital}
-        SOLUÇÃO: {dados_solucao['descricao_solucao']}
-        Retorne APENAS o título.
-        '''
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt_titulo
+    # Gerações de propostas rodam como tarefas no pool do processo, fora da execução do script
+    gerenciador_tarefas = obter_gerenciador_tarefas()
+    
+    # Função para guardar na sessão (e no link da página) uma tarefa recém-criada e abri-la; a seleção
+    # é aplicada na próxima vez que a lista de tarefas for desenhada
+    def abrir_tarefa(tipo, tarefa):
+        st.session_state.setdefault(f"tarefas_{tipo}", []).append(tarefa.id)
+        st.session_state[f"tarefa_a_abrir_{tipo}"] = tarefa.id
+        st.query_params["tarefa"] = tarefa.id
+    
+    # Função para acompanhar as propostas da sessão; a aberta é atualizada a cada segundo por um
+    # fragmento, sem reexecutar o restante da página, até a tarefa terminar
+    def acompanhar_tarefas(tipo, exibir_tarefa):
+        ids = st.session_state.setdefault(f"tarefas_{tipo}", [])
+        # O link com ?tarefa= traz de volta uma tarefa iniciada em uma aba que foi fechada
+        tarefa_link = gerenciador_tarefas.obter(st.query_params.get("tarefa", ""))
+        if tarefa_link is not None and tarefa_link.tipo == tipo and tarefa_link.id not in ids:
+            ids.append(tarefa_link.id)
+            st.session_state[f"tarefa_aberta_{tipo}"] = tarefa_link.id
+        tarefas = gerenciador_tarefas.listar(ids)
+        if not tarefas:
+            return
+        
+        st.divider()
+        rotulos = {tarefa.id: f"{tarefa.nome} (ID {tarefa.id})" for tarefa in tarefas}
+        if f"tarefa_a_abrir_{tipo}" in st.session_state:
+            st.session_state[f"tarefa_aberta_{tipo}"] = st.session_state.pop(f"tarefa_a_abrir_{tipo}")
+        if st.session_state.get(f"tarefa_aberta_{tipo}") not in rotulos:
+            st.session_state[f"tarefa_aberta_{tipo}"] = tarefas[0].id
+        id_aberta = st.selectbox(
+            "Propostas desta sessão:",
+            list(rotulos),
+            format_func=rotulos.get,
+            key=f"tarefa_aberta_{tipo}"
         )
-        proposta_completa['titulo'] = response.text.strip()[:200]
-        
-        proposta_completa.update({
-            'desafio_info': f"CÓDIGO: EDITAL-2024-001\nNOME: {desafio_edital[:50]}...",
-            'duracao_meses': "18",
-            'orcamento': "TOTAL: 1200000\nRH: 600000\nMATERIAL_PERMANENTE: 300000\nMATERIAL_CONSUMO: 100000\nSERVICOS_TERCEIROS: 150000\nVIAGENS: 30000\nOUTROS: 15000\nCOMUNICACAO: 20000\nSTARTUPS: 0",
-            'tecnologias': dados_solucao.get('tecnologias_previstas', 'Tecnologias a definir'),
-            'tipo_produto': dados_solucao.get('tipo_produto', 'Sistema integrado')[:255],
-            'alcance': "Nacional - No setor brasileiro",
-            'trl': f"TRL_INICIAL: {dados_solucao.get('trl_inicial', 'TRL4')}\nTRL_FINAL: {dados_solucao.get('trl_final', 'TRL7')}",
-            'propriedade_intelectual': dados_solucao.get('propriedade_intelectual', 'Potencial para registro de patente')[:1000],
-            'aspectos_inovativos': dados_solucao.get('aspectos_inovativos', 'Solução inovadora')[:1000],
-            'ambito_aplicacao': dados_solucao.get('descricao_solucao', 'Aplicação em múltiplos setores')
-        })
-        
-        return proposta_completa
-
-    # Função para salvar no MongoDB
-    def salvar_no_mongo(proposta_completa, desafio_edital, tipo="automática"):
-        if mongo_connected:
-            documento = {
-                "id": str(uuid.uuid4()),
-                "titulo": proposta_completa.get('titulo', ''),
-                "desafio": desafio_edital[:500],
-                "proposta_completa": proposta_completa,
-                "tipo_geracao": tipo,
-                "data_criacao": datetime.now()
-            }
-            collection.insert_one(documento)
-            return True
-        return False
-
+        tarefa = gerenciador_tarefas.obter(id_aberta)
+        acompanhando = not tarefa.finalizada
+        
+        @st.fragment(run_every=1.0 if acompanhando else None)
+        def painel_tarefa():
+            # A instrumentação da barra lateral passa a mostrar a tarefa na primeira vez que ela aparece finalizada
+            exibidas = st.session_state.setdefault("tarefas_exibidas", set())
+            if tarefa.finalizada and tarefa.id not in exibidas:
+                exibidas.add(tarefa.id)
+                st.session_state["ultima_execucao"] = tarefa.execucao
+            # Ao terminar, a página inteira é reexecutada para encerrar a atualização periódica
+            if acompanhando and tarefa.finalizada:
+                st.rerun()
+            if tarefa.status == NA_FILA:
+                st.info(f"⏳ Proposta na fila, aguardando uma vaga para gerar... (ID {tarefa.id})")
+            elif tarefa.status == EXECUTANDO:
+                col_status, col_cancelar = st.columns([4, 1])
+                col_status.info(f"🤖 Gerando proposta há {tarefa.duracao_s:.0f} s... (ID {tarefa.id})")
+                if col_cancelar.button("⏹️ Cancelar", key=f"cancelar_{tarefa.id}"):
+                    tarefa.cancelar()
+            elif tarefa.status == ERRO:
+                st.error(f"Erro ao gerar a proposta: {tarefa.erro}")
+            elif tarefa.status == CANCELADA:
+                st.warning("Geração cancelada.")
+            exibir_tarefa(tarefa)
+        
+        painel_tarefa()
+    
     # Abas principais
-    tab1, tab2, tab3, tab4 = st.tabs(["🔍 Busca Web Editais", "🎯 Editais por Solução", "🤖 Gerar Automaticamente", "📝 Formulário Manual"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["🔍 Busca Web Editais", "🎯 Editais por Solução", "🤖 Gerar Automaticamente", "📝 Formulário Manual", "📚 Histórico"])
 
     with tab1:
         st.header("🔍 Busca por Editais Abertos")
         st.markdown("Busque editais ativos em todo o mundo usando Web Search")
         
+        areas_interesse = [
+            "Energia e Utilities", "Tecnologia da Informação", "Saúde", 
+            "Agricultura", "Mobilidade", "Meio Ambiente", "Indústria 4.0",
+            "Cidades Inteligentes", "Educação", "Finanças", "Outra"
+        ]
+        tipos_edital = [
+            "P&D e Inovação", "Startups e Scale-ups", "Projetos Tecnológicos",
+            "Pesquisa Científica", "Desenvolvimento Sustentável", 
+            "Digital Transformation", "Todos os tipos"
+        ]
+        
         with st.form("form_busca_web"):
             col1, col2 = st.columns(2)
             
@@ -400,55 +130,156 @@ if gemini_api_key:
                     value="editais abertos inovação tecnologia P&D"
                 )
                 
-                area_interesse = st.selectbox(
-                    "Área de Interesse:",
-                    [
-                        "Energia e Utilities", "Tecnologia da Informação", "Saúde", 
-                        "Agricultura", "Mobilidade", "Meio Ambiente", "Indústria 4.0",
-                        "Cidades Inteligentes", "Educação", "Finanças", "Outra"
-                    ]
-                )
+                area_interesse = st.selectbox("Área de Interesse:", areas_interesse)
             
             with col2:
-                tipo_edital = st.selectbox(
-                    "Tipo de Edital:",
-                    [
-                        "P&D e Inovação", "Startups e Scale-ups", "Projetos Tecnológicos",
-                        "Pesquisa Científica", "Desenvolvimento Sustentável", 
-                        "Digital Transformation", "Todos os tipos"
-                    ]
-                )
+                tipo_edital = st.selectbox("Tipo de Edital:", tipos_edital)
                 
                 st.markdown("**Configurações de Busca:**")
                 buscar_internacional = st.checkbox("Incluir editais internacionais", value=True)
                 apenas_abertos = st.checkbox("Apenas editais com prazos abertos", value=True)
+                forcar_atualizacao = st.checkbox("Forçar atualização pela web (ignorar catálogo)", value=False)
+            
+            with st.expander("🔀 Buscar várias áreas e tipos de uma vez"):
+                areas_multiplas = st.multiselect("Áreas de interesse:", areas_interesse)
+                tipos_multiplos = st.multiselect("Tipos de edital:", tipos_edital)
+                st.caption(
+                    "Quando preenchidas, substituem a área e o tipo acima: todas as combinações são "
+                    "buscadas ao mesmo tempo e os editais aparecem em uma única tabela, sem repetições."
+                )
             
             submitted_web = st.form_submit_button("🌐 Buscar Editais na Web", type="primary")
         
+        # Função para exibir os editais em tabela, com as buscas que encontraram cada um na busca combinada
+        def exibir_tabela_editais(editais):
+            st.dataframe(
+                [
+                    {
+                        "Edital": edital['nome'],
+                        "Organização": edital['organizacao'],
+                        "Prazo": edital['prazo'].strftime('%d/%m/%Y') if edital.get('prazo') else (edital.get('prazo_texto') or "-"),
+                        "Valor": edital.get('valor') or "-",
+                        "Link": edital.get('link') or "",
+                        "Temas": ", ".join(edital.get('temas', [])),
+                        **({"Buscas": "; ".join(edital['buscas'])} if 'buscas' in edital else {}),
+                    }
+                    for edital in editais
+                ],
+                column_config={"Link": st.column_config.LinkColumn("Link")},
+                use_container_width=True,
+                hide_index=True
+            )
+        
         if submitted_web and gemini_api_key:
-            with st.spinner("🔍 Buscando editais abertos na web..."):
-                # Adicionar filtros à busca
-                filtros = ""
-                if apenas_abertos:
-                    filtros += " com prazos em aberto"
-                if buscar_internacional:
-                    filtros += " incluindo oportunidades internacionais"
-                
-                resultado_busca = buscar_editais_abertos_web(
-                    palavras_chave_web, 
-                    area_interesse, 
-                    tipo_edital + filtros
-                )
+            execucao = iniciar_execucao("busca web")
+            st.session_state["ultima_execucao"] = execucao
+            # Adicionar filtros à busca
+            filtros = ""
+            if apenas_abertos:
+                filtros += " com prazos em aberto"
+            if buscar_internacional:
+                filtros += " incluindo oportunidades internacionais"
+            
+            # O catálogo local é consultado antes da busca na web
+            colecoes_catalogo = None
+            try:
+                colecoes_catalogo = obter_colecoes_catalogo()
+            except Exception:
+                colecoes_catalogo = None
+            
+            combinacoes = [
+                (area, tipo)
+                for area in (areas_multiplas or [area_interesse])
+                for tipo in (tipos_multiplos or [tipo_edital])
+            ]
+            max_combinacoes = int(obter_config_numero("BUSCA_MAX_COMBINACOES", 24))
+            if len(combinacoes) > max_combinacoes:
+                st.warning(f"⚠️ {len(combinacoes)} combinações selecionadas; apenas as {max_combinacoes} primeiras serão buscadas.")
+                combinacoes = combinacoes[:max_combinacoes]
+            
+            resultado_busca = None
+            if len(combinacoes) == 1:
+                # Uma única área ou tipo escolhido nas seleções múltiplas também substitui os campos acima
+                area_busca, tipo_busca = combinacoes[0]
+                with st.spinner("🔍 Buscando editais abertos..."):
+                    resultado = buscar_editais_catalogados(
+                        client, colecoes_catalogo, palavras_chave_web, area_busca, tipo_busca + filtros,
+                        forcar_atualizacao
+                    )
+                editais_catalogo = resultado['editais']
+                resultado_busca = resultado['resultado_busca']
+                if resultado['do_catalogo']:
+                    st.success(f"✅ {len(editais_catalogo)} editais do catálogo (atualizado em {resultado['atualizado_em'].strftime('%d/%m/%Y %H:%M')})")
+                else:
+                    if resultado['erro_catalogo']:
+                        st.warning(f"Não foi possível atualizar o catálogo: {resultado['erro_catalogo']}")
+                    st.success("✅ Busca web concluída!")
                 
-                st.success("✅ Busca web concluída!")
                 st.subheader("📋 Editais Abertos Encontrados")
-                st.markdown(resultado_busca)
-                
-                # Estatísticas rápidas
-                if "edital" in resultado_busca.lower():
-                    st.sidebar.success("🎯 Editais encontrados com sucesso!")
+                if editais_catalogo:
+                    exibir_tabela_editais(editais_catalogo)
+                fontes_catalogo = sorted({fonte for edital in editais_catalogo for fonte in edital.get('fontes', [])})
+            else:
+                # As buscas rodam em paralelo e a tabela é atualizada a cada uma que termina
+                st.subheader("📋 Editais Abertos Encontrados")
+                progresso = st.progress(0.0, text=f"🔍 Buscando {len(combinacoes)} combinações de área e tipo...")
+                espaco_tabela = st.empty()
+                resultados = []
+                for resultado in buscar_combinacoes(
+                    client, colecoes_catalogo, palavras_chave_web, combinacoes, filtros, forcar_atualizacao,
+                    max_paralelo=int(obter_config_numero("BUSCA_MAX_PARALELO", 4))
+                ):
+                    resultados.append(resultado)
+                    progresso.progress(
+                        len(resultados) / len(combinacoes),
+                        text=f"🔍 {len(resultados)} de {len(combinacoes)} buscas concluídas..."
+                    )
+                    editais_catalogo = mesclar_editais(resultados)
+                    if editais_catalogo:
+                        with espaco_tabela.container():
+                            exibir_tabela_editais(editais_catalogo)
+                
+                do_catalogo = sum(1 for resultado in resultados if resultado['do_catalogo'])
+                progresso.empty()
+                st.success(
+                    f"✅ {len(editais_catalogo)} editais em {len(combinacoes)} buscas "
+                    f"({do_catalogo} do catálogo, {len(combinacoes) - do_catalogo} pela web)"
+                )
+                with st.expander("🔀 Resultado por busca"):
+                    st.dataframe(
+                        [
+                            {
+                                "Área": resultado['area_interesse'],
+                                "Tipo": resultado['tipo_edital'],
+                                "Origem": "Catálogo" if resultado['do_catalogo'] else "Web",
+                                "Editais": len(resultado['editais']),
+                                "Erro": resultado.get('erro') or resultado.get('erro_catalogo') or "",
+                            }
+                            for resultado in resultados
+                        ],
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                fontes_catalogo = sorted({fonte for resultado in resultados for fonte in resultado['fontes']})
+            
+            if fontes_catalogo:
+                with st.expander("🔗 Fontes e referências"):
+                    for i, uri in enumerate(fontes_catalogo):
+                        st.markdown(f"{i+1}. {uri}")
+            
+            if resultado_busca is not None:
+                if editais_catalogo:
+                    with st.expander("📄 Resultado completo da busca"):
+                        st.markdown(resultado_busca)
                 else:
-                    st.sidebar.warning("⚠️ Tente ajustar os termos de busca")
+                    st.markdown(resultado_busca)
+            
+            # Estatísticas rápidas
+            if editais_catalogo or (resultado_busca and "edital" in resultado_busca.lower()):
+                st.sidebar.success("🎯 Editais encontrados com sucesso!")
+            else:
+                st.sidebar.warning("⚠️ Tente ajustar os termos de busca")
+            encerrar_execucao(execucao)
 
     with tab2:
         st.header("🎯 Buscar Editais por Solução")
@@ -475,6 +306,8 @@ if gemini_api_key:
             submitted_busca = st.form_submit_button("🎯 Buscar Editais Específicos", type="primary")
         
         if submitted_busca and gemini_api_key:
+            execucao = iniciar_execucao("busca por solução")
+            st.session_state["ultima_execucao"] = execucao
             with st.spinner("Buscando editais para sua solução..."):
                 descricao_completa = f"""
                 NOME: {nome_solucao}
@@ -486,6 +319,7 @@ if gemini_api_key:
                 """
                 
                 resultado_busca = buscar_editais_especificos(
+                    client,
                     descricao_completa, 
                     palavras_chave_busca, 
                     area_solucao, 
@@ -495,6 +329,7 @@ if gemini_api_key:
                 st.success("✅ Busca concluída!")
                 st.subheader("📋 Editais Recomendados")
                 st.markdown(resultado_busca)
+            encerrar_execucao(execucao)
 
     with tab3:
         st.header("🤖 Gerar Proposta Automaticamente")
@@ -507,94 +342,222 @@ if gemini_api_key:
                 placeholder="Cole aqui o texto completo do desafio do edital...\n\nExemplo: Desenvolvimento de sistema de monitoramento preditivo para infraestrutura crítica utilizando inteligência artificial e IoT..."
             )
             
+            arquivo_edital = st.file_uploader(
+                "Ou envie o documento do edital:",
+                type=["pdf", "docx", "txt"],
+                key="arquivo_edital_auto"
+            )
+            
+            modo_geracao = st.radio(
+                "Modo de geração:",
+                ["Multi-prompt (7 chamadas)", "Chamada única (JSON estruturado)"],
+                horizontal=True
+            )
+            
+            acao_semelhante = st.selectbox(
+                "Se já houver proposta para um desafio semelhante:",
+                ["Reusar a análise e gerar o restante", "Mostrar a proposta salva", "Gerar do zero"]
+            )
+            
             submitted_auto = st.form_submit_button("🚀 Gerar Proposta Automática", type="primary")
         
         if submitted_auto and gemini_api_key:
+            if arquivo_edital is not None:
+                with st.spinner(f"📄 Lendo {arquivo_edital.name}..."):
+                    try:
+                        desafio_edital = f"{desafio_edital}\n\n{extrair_texto_enviado(arquivo_edital)}".strip()
+                    except Exception as e:
+                        st.error(f"Erro ao ler {arquivo_edital.name}: {e}")
+            
             if not desafio_edital.strip():
                 st.error("Por favor, cole o desafio do edital.")
                 st.stop()
             
-            with st.spinner("🤖 Analisando desafio e gerando solução inovadora..."):
-                proposta_completa, dados_solucao = gerar_proposta_automatica(desafio_edital)
-                
-                st.success("✅ Proposta gerada automaticamente!")
-                
-                # Exibir resumo
-                st.subheader("💡 Solução Proposta")
-                st.info(f"**Título:** {proposta_completa.get('titulo', '')}")
-                st.write(f"**Descrição:** {dados_solucao.get('descricao_solucao', '')}")
-                
-                # Exibir proposta completa
-                st.subheader("📋 Proposta Completa")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.metric("Título", proposta_completa.get('titulo', ''))
-                    st.metric("Duração", f"{proposta_completa.get('duracao_meses', '')} meses")
-                    st.metric("Alcance", proposta_completa.get('alcance', ''))
-                
-                with col2:
-                    st.metric("TRL Inicial", proposta_completa.get('trl', '').split('\n')[0].replace('TRL_INICIAL: ', ''))
-                    st.metric("TRL Final", proposta_completa.get('trl', '').split('\n')[1].replace('TRL_FINAL: ', ''))
-                    st.metric("Tipo de Produto", proposta_completa.get('tipo_produto', ''))
-                
-                # Tecnologias e Inovação
-                st.subheader("🔧 Tecnologias e Inovação")
-                col3, col4 = st.columns(2)
-                
-                with col3:
-                    st.write("**Tecnologias Utilizadas:**")
-                    st.write(proposta_completa.get('tecnologias', ''))
-                
-                with col4:
-                    st.write("**Aspectos Inovativos:**")
-                    st.write(proposta_completa.get('aspectos_inovativos', ''))
-                
-                # Orçamento
-                st.subheader("💰 Orçamento Detalhado")
-                orcamento_texto = proposta_completa.get('orcamento', '')
-                linhas_orcamento = orcamento_texto.split('\n')
-                for linha in linhas_orcamento:
+            # Procura um desafio quase idêntico já processado antes de chamar o Gemini
+            documento_semelhante = None
+            if acao_semelhante != "Gerar do zero":
+                semelhante = buscar_desafio_semelhante(desafio_edital)
+                collection_semelhante = obter_colecao_propostas() if semelhante else None
+                if collection_semelhante is not None:
+                    try:
+                        documento_semelhante = obter_proposta(collection_semelhante, semelhante[0])
+                    except Exception:
+                        documento_semelhante = None
+                if documento_semelhante is not None:
+                    st.info(
+                        f"🔁 Desafio semelhante já processado ({semelhante[1]:.0%} de similaridade): "
+                        f"**{documento_semelhante.get('titulo', '')}**"
+                    )
+            
+            proposta_salva = None
+            dados_reusados = None
+            if documento_semelhante is not None and acao_semelhante == "Mostrar a proposta salva":
+                proposta_salva = documento_semelhante
+            elif documento_semelhante is not None and acao_semelhante == "Reusar a análise e gerar o restante":
+                dados_reusados = documento_semelhante.get('dados_solucao')
+            
+            # A geração roda em segundo plano e continua mesmo que a página seja reexecutada ou fechada
+            tarefa = gerenciador_tarefas.submeter(
+                f"Proposta automática das {datetime.now().strftime('%H:%M:%S')}",
+                "automatica",
+                tarefa_proposta_automatica(
+                    client, desafio_edital, modo_geracao == "Chamada única (JSON estruturado)",
+                    dados_reusados, proposta_salva
+                ),
+                dados={"desafio_edital": desafio_edital, "modo_geracao": modo_geracao},
+            )
+            abrir_tarefa("automatica", tarefa)
+        
+        # Função para exibir uma proposta automática com as seções que já ficaram prontas
+        def exibir_proposta_automatica(tarefa):
+            secoes = tarefa.obter_secoes()
+            resultado = tarefa.resultado if tarefa.status == CONCLUIDA else None
+            
+            if resultado:
+                if resultado.get('secao_regenerada'):
+                    st.success(
+                        f"♻️ {SECOES_REGENERAVEIS[resultado['secao_regenerada']]} regenerado em "
+                        f"{tarefa.duracao_s:.1f} s! ({len(resultado['secoes_alteradas'])} seções recalculadas)"
+                    )
+                elif resultado['tipo_geracao']:
+                    st.success(
+                        f"✅ Proposta gerada automaticamente em {tarefa.duracao_s:.1f} s! ({tarefa.dados['modo_geracao']})"
+                    )
+                else:
+                    st.success("✅ Proposta salva reaberta, sem novas chamadas ao Gemini!")
+                if resultado['salva']:
+                    st.caption(f"✅ Proposta salva no histórico! (versão {resultado['versao']})")
+            
+            if 'uso_contexto' in secoes:
+                uso = secoes['uso_contexto']
+                st.caption(
+                    f"🧠 Contexto compartilhado ({uso['modo']}): {uso['tokens_entrada']} tokens de entrada, "
+                    f"{uso['tokens_em_cache']} reaproveitados do cache, {uso['tokens_processados']} processados"
+                )
+            if secoes.get('estimativas'):
+                st.caption("⚡ Estimado localmente, sem chamada ao Gemini: " + ", ".join(
+                    f"{SECOES_REGENERAVEIS[secao]} (confiança {confianca:.0%})"
+                    for secao, confianca in secoes['estimativas'].items()
+                ))
+            if 'brief_desafio' in secoes:
+                with st.expander("📑 Brief do desafio (edital condensado)"):
+                    st.write(secoes['brief_desafio'])
+            
+            st.subheader("💡 Solução Proposta")
+            if 'titulo' in secoes:
+                st.info(f"**Título:** {secoes['titulo']}")
+            if 'dados_solucao' in secoes:
+                st.write(f"**Descrição:** {secoes['dados_solucao'].get('descricao_solucao', '')}")
+            elif 'analise_parcial' in secoes:
+                st.markdown(f"**Descrição (gerando...):** {secoes['analise_parcial']}")
+            
+            st.subheader("📋 Proposta Completa")
+            col1, col2 = st.columns(2)
+            with col1:
+                if 'titulo' in secoes:
+                    st.metric("Título", secoes['titulo'])
+                if 'duracao_meses' in secoes:
+                    st.metric("Duração", f"{secoes['duracao_meses']} meses")
+                if 'alcance' in secoes:
+                    st.metric("Alcance", secoes['alcance'])
+            with col2:
+                if 'trl' in secoes:
+                    linhas_trl = secoes['trl'].split('\n')
+                    st.metric("TRL Inicial", linhas_trl[0].replace('TRL_INICIAL: ', ''))
+                    st.metric("TRL Final", linhas_trl[1].replace('TRL_FINAL: ', ''))
+                if 'tipo_produto' in secoes:
+                    st.metric("Tipo de Produto", secoes['tipo_produto'])
+            
+            # Tecnologias e Inovação
+            st.subheader("🔧 Tecnologias e Inovação")
+            col3, col4 = st.columns(2)
+            with col3:
+                st.write("**Tecnologias Utilizadas:**")
+                if 'tecnologias' in secoes:
+                    st.write(secoes['tecnologias'])
+            with col4:
+                st.write("**Aspectos Inovativos:**")
+                if 'aspectos_inovativos' in secoes:
+                    st.write(secoes['aspectos_inovativos'])
+            
+            # Orçamento
+            st.subheader("💰 Orçamento Detalhado")
+            if 'orcamento' in secoes:
+                for linha in secoes['orcamento'].split('\n'):
                     if ':' in linha:
-                        chave, valor = linha.split(':', 1)
-                        st.metric(label=chave.strip(), value=f"R$ {valor.strip()}")
-                
-                # Download
-                proposta_completa_texto = f"""
-                PROPOSTA PARA EDITAL - GERADA AUTOMATICAMENTE
-                ============================================
-                
-                TÍTULO: {proposta_completa.get('titulo', '')}
-                
-                DESAFIO: {desafio_edital[:1000]}
-                
-                SOLUÇÃO: {dados_solucao.get('descricao_solucao', '')}
-                
-                INFORMAÇÕES:
-                - Duração: {proposta_completa.get('duracao_meses', '')} meses
-                - Alcance: {proposta_completa.get('alcance', '')}
-                - TRL: {proposta_completa.get('trl', '')}
-                
-                ORÇAMENTO:
-                {proposta_completa.get('orcamento', '')}
-                
-                TECNOLOGIAS: {proposta_completa.get('tecnologias', '')}
-                INOVAÇÃO: {proposta_completa.get('aspectos_inovativos', '')}
-                
-                ÂMBITO DE APLICAÇÃO:
-                {proposta_completa.get('ambito_aplicacao', '')}
-                """
-                
-                st.download_button(
-                    label="📥 Download da Proposta",
-                    data=proposta_completa_texto,
-                    file_name=f"proposta_edital_auto_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
-                    mime="text/plain"
+                        chave, valor_linha = linha.split(':', 1)
+                        st.metric(label=chave.strip(), value=f"R$ {valor_linha.strip()}")
+            elif not tarefa.finalizada:
+                st.caption("⏳ Calculando orçamento...")
+            
+            if not resultado:
+                return
+            proposta_completa = resultado['proposta_completa']
+            dados_solucao = resultado['dados_solucao']
+            
+            # Download
+            proposta_completa_texto = f"""
+            PROPOSTA PARA EDITAL - GERADA AUTOMATICAMENTE
+            ============================================
+            
+            TÍTULO: {proposta_completa.get('titulo', '')}
+            
+            DESAFIO: {tarefa.dados['desafio_edital'][:1000]}
+            
+            SOLUÇÃO: {dados_solucao.get('descricao_solucao', '')}
+            
+            INFORMAÇÕES:
+            - Duração: {proposta_completa.get('duracao_meses', '')} meses
+            - Alcance: {proposta_completa.get('alcance', '')}
+            - TRL: {proposta_completa.get('trl', '')}
+            
+            ORÇAMENTO:
+            {proposta_completa.get('orcamento', '')}
+            
+            TECNOLOGIAS: {proposta_completa.get('tecnologias', '')}
+            INOVAÇÃO: {proposta_completa.get('aspectos_inovativos', '')}
+            
+            ÂMBITO DE APLICAÇÃO:
+            {proposta_completa.get('ambito_aplicacao', '')}
+            """
+            
+            # Regenerar uma seção recalcula só ela e as que dependem dela, em uma nova tarefa
+            with st.expander("♻️ Regenerar uma seção"):
+                secao_regenerar = st.selectbox(
+                    "Seção:",
+                    list(SECOES_REGENERAVEIS),
+                    format_func=SECOES_REGENERAVEIS.get,
+                    key=f"secao_regenerar_{tarefa.id}"
                 )
-                
-                if salvar_no_mongo(proposta_completa, desafio_edital, "automática"):
-                    st.sidebar.success("✅ Proposta salva!")
+                dependentes = [
+                    SECOES_REGENERAVEIS[secao] for secao in secoes_afetadas(secao_regenerar)[1:]
+                    if secao in SECOES_REGENERAVEIS
+                ]
+                st.caption(
+                    f"Também serão recalculadas: {', '.join(dependentes)}" if dependentes
+                    else "Nenhuma outra seção depende desta."
+                )
+                if st.button("♻️ Regenerar", key=f"regenerar_{tarefa.id}"):
+                    nova_tarefa = gerenciador_tarefas.submeter(
+                        f"{SECOES_REGENERAVEIS[secao_regenerar]} regenerado às {datetime.now().strftime('%H:%M:%S')}",
+                        "automatica",
+                        tarefa_regenerar_secao(client, tarefa.dados['desafio_edital'], resultado, secao_regenerar),
+                        dados=tarefa.dados,
+                    )
+                    abrir_tarefa("automatica", nova_tarefa)
+                    st.rerun()
+            
+            # O download não reexecuta a página
+            st.download_button(
+                label="📥 Download da Proposta",
+                data=proposta_completa_texto,
+                file_name=f"proposta_edital_auto_{datetime.fromtimestamp(tarefa.fim).strftime('%Y%m%d_%H%M')}.txt",
+                mime="text/plain",
+                key=f"download_{tarefa.id}",
+                on_click="ignore"
+            )
+        
+        acompanhar_tarefas("automatica", exibir_proposta_automatica)
 
     with tab4:
         st.header("📝 Formulário Manual")
@@ -607,6 +570,11 @@ if gemini_api_key:
                 height=150,
                 placeholder="Cole o desafio do edital..."
             )
+            arquivo_edital_manual = st.file_uploader(
+                "Ou envie o documento do edital:",
+                type=["pdf", "docx", "txt"],
+                key="arquivo_edital_manual"
+            )
             
             st.subheader("Solução Proposta")
             col1, col2 = st.columns(2)
@@ -651,6 +619,13 @@ if gemini_api_key:
             submitted_manual = st.form_submit_button("📝 Gerar Proposta Manual", type="primary")
         
         if submitted_manual and gemini_api_key:
+            if arquivo_edital_manual is not None:
+                with st.spinner(f"📄 Lendo {arquivo_edital_manual.name}..."):
+                    try:
+                        desafio_edital = f"{desafio_edital}\n\n{extrair_texto_enviado(arquivo_edital_manual)}".strip()
+                    except Exception as e:
+                        st.error(f"Erro ao ler {arquivo_edital_manual.name}: {e}")
+            
             if not desafio_edital.strip():
                 st.error("Por favor, insira o desafio do edital.")
                 st.stop()
@@ -665,55 +640,272 @@ if gemini_api_key:
                 'propriedade_intelectual': "A ser definido conforme desenvolvimento"
             }
             
-            with st.spinner("Gerando proposta manual..."):
-                proposta_completa = gerar_proposta_manual(desafio_edital, dados_solucao)
-                
-                st.success("✅ Proposta manual gerada!")
-                
-                # Exibir resultados
-                st.subheader("📋 Proposta Gerada")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.info(f"**Título:** {proposta_completa.get('titulo', '')}")
-                    st.info(f"**Duração:** {proposta_completa.get('duracao_meses', '')} meses")
-                    st.info(f"**Alcance:** {proposta_completa.get('alcance', '')}")
-                
-                with col2:
-                    st.info(f"**TRL:** {proposta_completa.get('trl', '')}")
-                    st.info(f"**Produto:** {proposta_completa.get('tipo_produto', '')}")
-                
-                # Download
-                proposta_texto = f"""
-                PROPOSTA PARA EDITAL - FORMULÁRIO MANUAL
-                =======================================
-                
-                TÍTULO: {proposta_completa.get('titulo', '')}
-                
-                DESAFIO: {desafio_edital}
-                
-                SOLUÇÃO: {descricao_solucao}
-                
-                INFORMAÇÕES:
-                - Duração: {proposta_completa.get('duracao_meses', '')} meses
-                - Alcance: {proposta_completa.get('alcance', '')}
-                - TRL: {proposta_completa.get('trl', '')}
-                - Produto: {proposta_completa.get('tipo_produto', '')}
-                
-                TECNOLOGIAS: {tecnologias_previstas}
-                INOVAÇÃO: {aspectos_inovativos}
-                """
-                
-                st.download_button(
-                    label="📥 Download Proposta Manual",
-                    data=proposta_texto,
-                    file_name=f"proposta_edital_manual_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
-                    mime="text/plain"
+            tarefa = gerenciador_tarefas.submeter(
+                f"Proposta manual das {datetime.now().strftime('%H:%M:%S')}",
+                "manual",
+                tarefa_proposta_manual(client, desafio_edital, dados_solucao),
+                dados={"desafio_edital": desafio_edital},
+            )
+            abrir_tarefa("manual", tarefa)
+        
+        # Função para exibir uma proposta manual concluída
+        def exibir_proposta_manual(tarefa):
+            if tarefa.status != CONCLUIDA:
+                return
+            proposta_completa = tarefa.resultado['proposta_completa']
+            dados_solucao = tarefa.resultado['dados_solucao']
+            
+            st.success("✅ Proposta manual gerada!")
+            if tarefa.resultado['salva']:
+                st.caption("✅ Proposta salva no histórico!")
+            
+            # Exibir resultados
+            st.subheader("📋 Proposta Gerada")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.info(f"**Título:** {proposta_completa.get('titulo', '')}")
+                st.info(f"**Duração:** {proposta_completa.get('duracao_meses', '')} meses")
+                st.info(f"**Alcance:** {proposta_completa.get('alcance', '')}")
+            
+            with col2:
+                st.info(f"**TRL:** {proposta_completa.get('trl', '')}")
+                st.info(f"**Produto:** {proposta_completa.get('tipo_produto', '')}")
+            
+            # Download
+            proposta_texto = f"""
+            PROPOSTA PARA EDITAL - FORMULÁRIO MANUAL
+            =======================================
+            
+            TÍTULO: {proposta_completa.get('titulo', '')}
+            
+            DESAFIO: {tarefa.dados['desafio_edital']}
+            
+            SOLUÇÃO: {dados_solucao['descricao_solucao']}
+            
+            INFORMAÇÕES:
+            - Duração: {proposta_completa.get('duracao_meses', '')} meses
+            - Alcance: {proposta_completa.get('alcance', '')}
+            - TRL: {proposta_completa.get('trl', '')}
+            - Produto: {proposta_completa.get('tipo_produto', '')}
+            
+            TECNOLOGIAS: {dados_solucao['tecnologias_previstas']}
+            INOVAÇÃO: {dados_solucao['aspectos_inovativos']}
+            """
+            
+            st.download_button(
+                label="📥 Download Proposta Manual",
+                data=proposta_texto,
+                file_name=f"proposta_edital_manual_{datetime.fromtimestamp(tarefa.fim).strftime('%Y%m%d_%H%M')}.txt",
+                mime="text/plain",
+                key=f"download_{tarefa.id}",
+                on_click="ignore"
+            )
+        
+        acompanhar_tarefas("manual", exibir_proposta_manual)
+
+    with tab5:
+        st.header("📚 Histórico de Propostas")
+        st.markdown("Consulte e reabra propostas já geradas, sem novas chamadas ao Gemini")
+        
+        # A conexão com o MongoDB só é aberta quando o histórico é pedido, não a cada interação com a página
+        collection_historico = None
+        if not obter_config("MONGODB_URI"):
+            st.info("Configure o MONGODB_URI para consultar o histórico de propostas.")
+        elif not st.session_state.get('historico_carregado'):
+            if st.button("📂 Carregar histórico", key="carregar_historico"):
+                st.session_state['historico_carregado'] = True
+                st.rerun()
+        else:
+            collection_historico = obter_colecao_propostas()
+            if collection_historico is None:
+                st.warning("MongoDB indisponível no momento. Tente novamente em instantes.")
+        
+        if collection_historico is not None:
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                busca_historico = st.text_input("Buscar no título e no desafio:", key="busca_historico")
+            with col2:
+                tipo_historico = st.selectbox(
+                    "Tipo de geração:",
+                    ["Todos", "automática", "automática (estruturada)", "manual"],
+                    key="tipo_historico"
                 )
-                
-                if salvar_no_mongo(proposta_completa, desafio_edital, "manual"):
-                    st.sidebar.success("✅ Proposta salva!")
+            with col3:
+                tamanho_pagina = st.selectbox("Por página:", [10, 20, 50], index=1, key="tamanho_pagina_historico")
+            
+            # Os cursores das páginas visitadas permitem voltar; mudar os filtros recomeça da primeira página
+            filtros_historico = (busca_historico, tipo_historico, tamanho_pagina)
+            if st.session_state.get('filtros_historico') != filtros_historico:
+                st.session_state['filtros_historico'] = filtros_historico
+                st.session_state['cursores_historico'] = [None]
+            cursores = st.session_state['cursores_historico']
+            
+            try:
+                documentos, proximo_cursor = listar_propostas(
+                    collection_historico,
+                    tipo_geracao=None if tipo_historico == "Todos" else tipo_historico,
+                    busca=busca_historico.strip() or None,
+                    cursor=cursores[-1],
+                    limite=tamanho_pagina
+                )
+            except Exception as e:
+                st.error(f"Erro ao consultar o histórico: {e}")
+                documentos, proximo_cursor = [], None
+            
+            if not documentos:
+                st.info("Nenhuma proposta encontrada.")
+            
+            for documento in documentos:
+                col_item, col_botao = st.columns([5, 1])
+                with col_item:
+                    st.markdown(f"**{documento.get('titulo') or '(sem título)'}**")
+                    st.caption(
+                        f"{documento['data_criacao'].strftime('%d/%m/%Y %H:%M')} · {documento.get('tipo_geracao', '')} · "
+                        f"{documento.get('desafio', '')[:150]}"
+                    )
+                with col_botao:
+                    if st.button("Abrir", key=f"abrir_{documento['id']}"):
+                        st.session_state['proposta_aberta'] = documento['id']
+            
+            col_anterior, col_pagina, col_proxima = st.columns([1, 2, 1])
+            with col_anterior:
+                if len(cursores) > 1 and st.button("⬅️ Anterior", key="historico_anterior"):
+                    cursores.pop()
+                    st.rerun()
+            with col_pagina:
+                st.caption(f"Página {len(cursores)}")
+            with col_proxima:
+                if proximo_cursor is not None and st.button("Próxima ➡️", key="historico_proxima"):
+                    cursores.append(proximo_cursor)
+                    st.rerun()
+            
+            id_aberta = st.session_state.get('proposta_aberta')
+            if id_aberta:
+                documento = obter_proposta(collection_historico, id_aberta)
+                if documento is None:
+                    st.warning("Proposta não encontrada.")
+                else:
+                    proposta_salva = documento.get('proposta_completa', {})
+                    st.divider()
+                    st.subheader(f"📋 {proposta_salva.get('titulo', '')}")
+                    if documento.get('versao', 1) > 1:
+                        st.caption(
+                            f"Versão {documento['versao']}, atualizada em "
+                            f"{documento['data_atualizacao'].strftime('%d/%m/%Y %H:%M')}"
+                        )
+                    
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.info(f"**Duração:** {proposta_salva.get('duracao_meses', '')} meses")
+                        st.info(f"**Alcance:** {proposta_salva.get('alcance', '')}")
+                    with col2:
+                        st.info(f"**TRL:** {proposta_salva.get('trl', '')}")
+                        st.info(f"**Produto:** {proposta_salva.get('tipo_produto', '')}")
+                    
+                    st.write(f"**Desafio:** {documento.get('desafio', '')}")
+                    st.write(f"**Tecnologias:** {proposta_salva.get('tecnologias', '')}")
+                    st.write(f"**Aspectos Inovativos:** {proposta_salva.get('aspectos_inovativos', '')}")
+                    st.write("**Orçamento:**")
+                    st.text(proposta_salva.get('orcamento', ''))
+                    st.write(f"**Âmbito de Aplicação:** {proposta_salva.get('ambito_aplicacao', '')}")
+                    
+                    proposta_salva_texto = f"""
+                    PROPOSTA PARA EDITAL - HISTÓRICO ({documento.get('tipo_geracao', '')})
+                    ============================================
+                    
+                    TÍTULO: {proposta_salva.get('titulo', '')}
+                    
+                    DESAFIO: {documento.get('desafio', '')}
+                    
+                    INFORMAÇÕES:
+                    - Duração: {proposta_salva.get('duracao_meses', '')} meses
+                    - Alcance: {proposta_salva.get('alcance', '')}
+                    - TRL: {proposta_salva.get('trl', '')}
+                    
+                    ORÇAMENTO:
+                    {proposta_salva.get('orcamento', '')}
+                    
+                    TECNOLOGIAS: {proposta_salva.get('tecnologias', '')}
+                    INOVAÇÃO: {proposta_salva.get('aspectos_inovativos', '')}
+                    
+                    ÂMBITO DE APLICAÇÃO:
+                    {proposta_salva.get('ambito_aplicacao', '')}
+                    """
+                    
+                    st.download_button(
+                        label="📥 Download da Proposta",
+                        data=proposta_salva_texto,
+                        file_name=f"proposta_edital_{id_aberta[:8]}.txt",
+                        mime="text/plain",
+                        key="download_historico"
+                    )
+
+    # Estatísticas do cache de respostas do Gemini
+    estatisticas_cache = obter_cache().estatisticas()
+    st.sidebar.caption(
+        f"🗄️ Cache Gemini: {estatisticas_cache['acertos_memoria'] + estatisticas_cache['acertos_disco']} acertos "
+        f"({estatisticas_cache['acertos_disco']} do disco) | {estatisticas_cache['falhas']} falhas"
+    )
+    estatisticas_limites = obter_limitador().estatisticas()
+    st.sidebar.caption(
+        f"⏱️ Gemini: concorrência {estatisticas_limites['limite_concorrencia']} | "
+        f"{estatisticas_limites['limitacoes']} limitações | {estatisticas_limites['tentativas_repetidas']} novas tentativas"
+    )
+    estatisticas_chamadas = obter_chamadas_em_andamento().estatisticas()
+    st.sidebar.caption(
+        f"🔗 Chamadas idênticas agrupadas: {estatisticas_chamadas['agrupadas']} "
+        f"(de {estatisticas_chamadas['executadas'] + estatisticas_chamadas['agrupadas']}) | "
+        f"{estatisticas_chamadas['em_andamento']} em andamento"
+    )
+    if obter_config("MONGODB_URI"):
+        estatisticas_escritor = obter_escritor().estatisticas()
+        st.sidebar.caption(
+            f"💾 MongoDB: {estatisticas_escritor['gravados']} gravadas | {estatisticas_escritor['pendentes']} na fila "
+            f"| {estatisticas_escritor['no_journal']} no journal local"
+        )
+        if estatisticas_escritor['ultimo_erro']:
+            st.sidebar.caption(f"⚠️ Último erro do escritor: {estatisticas_escritor['ultimo_erro']}")
+    estatisticas_buscas = obter_cache_buscas().estatisticas()
+    st.sidebar.caption(
+        f"🔎 Cache de buscas: {estatisticas_buscas['acertos_memoria'] + estatisticas_buscas['acertos_disco']} acertos "
+        f"| {estatisticas_buscas['falhas']} falhas"
+    )
+    
+    # Painel de instrumentação: spans da última execução, percentis por prompt e exportação
+    if st.sidebar.checkbox("📈 Mostrar instrumentação", value=False):
+        registro = obter_registro()
+        ultima_execucao = st.session_state.get("ultima_execucao")
+        if ultima_execucao is not None:
+            st.sidebar.json(ultima_execucao.resumo())
+            st.sidebar.dataframe(
+                [
+                    {
+                        "span": span.get("tipo_prompt") or span["nome"],
+                        "ms": span["duracao_ms"],
+                        "cache": span.get("cache") or "-",
+                        "tokens": span.get("tokens_entrada", 0) + span.get("tokens_saida", 0),
+                        "erro": span.get("erro") or "",
+                    }
+                    for span in ultima_execucao.spans
+                ],
+                hide_index=True
+            )
+        st.sidebar.markdown("**Latência, custo e qualidade por rota (tipo de prompt e modelo)**")
+        st.sidebar.dataframe(registro.percentis(), hide_index=True)
+        st.sidebar.download_button(
+            "📥 Spans (JSONL)",
+            data=registro.exportar_jsonl(),
+            file_name=f"spans_{datetime.now().strftime('%Y%m%d_%H%M')}.jsonl",
+            mime="application/jsonl"
+        )
+        st.sidebar.download_button(
+            "📥 Traces (OTLP/JSON)",
+            data=json.dumps(registro.exportar_otlp()),
+            file_name=f"traces_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+            mime="application/json"
+        )
 
 elif not gemini_api_key:
     st.warning("⚠️ Por favor, insira uma API Key válida do Gemini.")
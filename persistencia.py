@@ -0,0 +1,381 @@
+import atexit
+import glob
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from cache_gemini import DIRETORIO_PADRAO
+from clientes import invalidar_cliente_mongo, obter_colecao_propostas
+from config import obter_config, obter_config_numero
+from duplicatas import assinatura_em_bytes, gerar_assinatura, obter_indice
+from instrumentacao import medir
+
+# Código de erro do MongoDB para chave duplicada
+ERRO_CHAVE_DUPLICADA = 11000
+
+# O pymongo e o bson são importados dentro das funções para que o app só os carregue com MongoDB configurado
+
+
+# Cria os índices usados pelas consultas de propostas
+def garantir_indices(collection):
+    from pymongo import ASCENDING, DESCENDING, TEXT
+
+    collection.create_index([("id", ASCENDING)], unique=True)
+    collection.create_index([("data_criacao", DESCENDING), ("id", DESCENDING)])
+    collection.create_index([("tipo_geracao", ASCENDING), ("data_criacao", DESCENDING), ("id", DESCENDING)])
+    collection.create_index(
+        [("titulo", TEXT), ("desafio", TEXT)], default_language="portuguese", name="busca_texto"
+    )
+
+
+# Insere um lote ignorando documentos que já existem (reenvios do journal)
+def _inserir_lote(collection, documentos):
+    from pymongo.errors import BulkWriteError
+
+    try:
+        collection.insert_many(documentos, ordered=False)
+    except BulkWriteError as e:
+        erros = [erro for erro in e.details.get("writeErrors", []) if erro.get("code") != ERRO_CHAVE_DUPLICADA]
+        if erros or e.details.get("writeConcernErrors"):
+            raise
+
+
+# Campos gravados só na criação da proposta, que as versões não alteram
+CAMPOS_BASE = ("desafio", "assinatura_desafio", "tipo_geracao", "data_criacao")
+
+
+# Grava novas versões de propostas já salvas. A versão só substitui uma anterior, então versões
+# reenviadas fora de ordem não sobrescrevem uma mais nova; se a inserção original ainda não chegou,
+# a versão cria o documento com os campos base e a inserção é ignorada como chave duplicada
+def _gravar_versoes(collection, documentos):
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+
+    operacoes = [
+        UpdateOne(
+            {"id": documento["id"], "versao": {"$lt": documento["versao"]}},
+            {
+                "$set": {chave: valor for chave, valor in documento.items() if chave != "id" and chave not in CAMPOS_BASE},
+                "$setOnInsert": {
+                    chave: documento[chave] for chave in CAMPOS_BASE if documento.get(chave) is not None
+                },
+            },
+            upsert=True,
+        )
+        for documento in documentos
+    ]
+    try:
+        collection.bulk_write(operacoes, ordered=False)
+    except BulkWriteError as e:
+        erros = [erro for erro in e.details.get("writeErrors", []) if erro.get("code") != ERRO_CHAVE_DUPLICADA]
+        if erros or e.details.get("writeConcernErrors"):
+            raise
+
+
+# Escritor em segundo plano: agrupa os documentos em insert_many (e as novas versões em bulk_write) e,
+# se o MongoDB estiver fora do ar, guarda os pendentes em um journal local para reenviar depois
+class EscritorMongo:
+    def __init__(self, caminho_journal, tamanho_lote=100, espera_lote_s=0.5, intervalo_reenvio_s=30.0):
+        self.caminho_journal = caminho_journal
+        self.tamanho_lote = tamanho_lote
+        self.espera_lote_s = espera_lote_s
+        self.intervalo_reenvio_s = intervalo_reenvio_s
+        self.gravados = 0
+        self.no_journal = 0
+        self.ultimo_erro = None
+        self._fila = queue.Queue()
+        self._lock_journal = threading.Lock()
+        self._indices_criados = False
+        self._ultimo_reenvio = float("-inf")
+        self._thread = threading.Thread(target=self._executar, name="escritor-mongo", daemon=True)
+        self._thread.start()
+
+    def enfileirar(self, documento):
+        self._fila.put(documento)
+
+    # Aguarda a gravação dos documentos já enfileirados
+    def encerrar(self, timeout=30.0):
+        self._fila.put(None)
+        self._thread.join(timeout)
+
+    def pendentes(self):
+        return self._fila.qsize()
+
+    def _executar(self):
+        from pymongo.errors import PyMongoError
+
+        # Cria os índices e reenvia o journal de execuções anteriores logo ao iniciar
+        try:
+            self._colecao()
+        except PyMongoError:
+            invalidar_cliente_mongo()
+        self._protegido(self._recuperar_reenvios)
+        self._protegido(self._reenviar_journal)
+
+        ativo = True
+        while ativo:
+            try:
+                documento = self._fila.get(timeout=self.intervalo_reenvio_s)
+            except queue.Empty:
+                self._protegido(self._reenviar_journal)
+                continue
+
+            lote = []
+            if documento is None:
+                ativo = False
+            else:
+                lote.append(documento)
+
+            # Junta o que chegar em seguida no mesmo lote
+            limite = time.monotonic() + self.espera_lote_s
+            while ativo and len(lote) < self.tamanho_lote:
+                try:
+                    documento = self._fila.get(timeout=max(0.0, limite - time.monotonic()))
+                except queue.Empty:
+                    break
+                if documento is None:
+                    ativo = False
+                else:
+                    lote.append(documento)
+
+            if lote:
+                self._protegido(self._gravar, lote)
+            self._protegido(self._reenviar_journal)
+
+    # Executa uma etapa do escritor sem deixar que um erro inesperado (ex.: falha ao escrever o journal)
+    # encerre a thread; o erro fica nas estatísticas
+    def _protegido(self, funcao, *args):
+        try:
+            funcao(*args)
+        except Exception as e:
+            self.ultimo_erro = repr(e)
+
+    def _colecao(self):
+        collection = obter_colecao_propostas()
+        if collection is not None and not self._indices_criados:
+            garantir_indices(collection)
+            self._indices_criados = True
+        return collection
+
+    def _gravar(self, lote):
+        from pymongo.errors import PyMongoError
+
+        try:
+            collection = self._colecao()
+            if collection is None:
+                raise PyMongoError("MongoDB indisponível")
+            novos = [documento for documento in lote if documento.get("versao", 1) == 1]
+            versoes = [documento for documento in lote if documento.get("versao", 1) > 1]
+            if novos:
+                with medir("mongo.insert_many", colecao="propostas_geradas", documentos=len(novos)):
+                    _inserir_lote(collection, novos)
+            if versoes:
+                with medir("mongo.bulk_write", colecao="propostas_geradas", documentos=len(versoes)):
+                    _gravar_versoes(collection, versoes)
+            self.gravados += len(lote)
+        except PyMongoError:
+            invalidar_cliente_mongo()
+            self._escrever_journal(lote)
+        except Exception as e:
+            # Erros fora do MongoDB (ex.: documento que o bson não consegue codificar) afetam só parte do lote:
+            # os documentos são gravados um a um e os que falharem vão para o journal
+            self.ultimo_erro = repr(e)
+            if len(lote) > 1:
+                for documento in lote:
+                    self._gravar([documento])
+            else:
+                self._escrever_journal(lote)
+
+    def _escrever_journal(self, documentos):
+        from bson import json_util
+
+        with self._lock_journal:
+            os.makedirs(os.path.dirname(self.caminho_journal) or ".", exist_ok=True)
+            with open(self.caminho_journal, "a", encoding="utf-8") as journal:
+                for documento in documentos:
+                    journal.write(json_util.dumps(documento) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            self.no_journal += len(documentos)
+
+    def _reenviar_journal(self):
+        agora = time.monotonic()
+        caminho_reenvio = self._caminho_reenvio(os.getpid())
+        if agora - self._ultimo_reenvio < self.intervalo_reenvio_s:
+            return
+        if not os.path.exists(self.caminho_journal) and not os.path.exists(caminho_reenvio):
+            return
+        self._ultimo_reenvio = agora
+
+        # O journal é movido antes do reenvio para não perder o que for escrito enquanto isso; um reenvio
+        # interrompido por erro é retomado antes, para o arquivo dele não ser sobrescrito
+        with self._lock_journal:
+            if not os.path.exists(caminho_reenvio):
+                try:
+                    os.replace(self.caminho_journal, caminho_reenvio)
+                except FileNotFoundError:
+                    # Outro processo moveu o journal primeiro e vai reenviá-lo
+                    return
+        self._reenviar_arquivo(caminho_reenvio)
+
+    def _caminho_reenvio(self, pid):
+        return f"{self.caminho_journal}.{pid}.reenvio"
+
+    # Reenvia um arquivo já movido para fora do journal. Ele só é apagado depois que todos os documentos
+    # foram gravados ou devolvidos ao journal; se o processo parar antes, o arquivo continua no disco
+    def _reenviar_arquivo(self, caminho_reenvio):
+        from bson import json_util
+
+        with open(caminho_reenvio, encoding="utf-8") as journal:
+            documentos = [json_util.loads(linha) for linha in journal if linha.strip()]
+        with self._lock_journal:
+            self.no_journal = 0
+        for inicio in range(0, len(documentos), self.tamanho_lote):
+            self._gravar(documentos[inicio:inicio + self.tamanho_lote])
+        os.remove(caminho_reenvio)
+
+    # Retoma os reenvios interrompidos de processos que já terminaram, juntando os arquivos deles ao journal
+    def _recuperar_reenvios(self):
+        with self._lock_journal:
+            for caminho in glob.glob(glob.escape(self.caminho_journal) + ".*.reenvio"):
+                pid = caminho[len(self.caminho_journal) + 1:-len(".reenvio")]
+                if not pid.isdigit() or int(pid) == os.getpid() or _processo_ativo(int(pid)):
+                    continue
+                with open(caminho, encoding="utf-8") as origem, \
+                        open(self.caminho_journal, "a", encoding="utf-8") as journal:
+                    for linha in origem:
+                        if linha.strip():
+                            journal.write(linha.rstrip("\n") + "\n")
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                os.remove(caminho)
+
+    def estatisticas(self):
+        return {"pendentes": self.pendentes(), "gravados": self.gravados, "no_journal": self.no_journal,
+                "ultimo_erro": self.ultimo_erro}
+
+
+# Indica se ainda existe um processo com o pid informado
+def _processo_ativo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+# Retorna o escritor compartilhado pelo processo
+def obter_escritor():
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None:
+            _escritor = EscritorMongo(
+                caminho_journal=obter_config(
+                    "MONGODB_OUTBOX_PATH", os.path.join(DIRETORIO_PADRAO, "outbox_propostas.jsonl")
+                ),
+                tamanho_lote=obter_config_numero("MONGODB_TAMANHO_LOTE", 100),
+                intervalo_reenvio_s=obter_config_numero("MONGODB_INTERVALO_REENVIO_S", 30.0),
+            )
+            atexit.register(_escritor.encerrar)
+        return _escritor
+
+
+# Função para salvar no MongoDB (a gravação acontece em segundo plano); retorna o id da proposta, ou None
+# As seções estimadas localmente ficam registradas para não servirem de exemplo ao estimador
+def salvar_no_mongo(proposta_completa, desafio_edital, tipo="automática", dados_solucao=None, secoes_estimadas=None):
+    if not obter_config("MONGODB_URI"):
+        return None
+    # O índice de duplicatas usa o texto completo do desafio; a assinatura fica também na proposta,
+    # que guarda só o começo do texto, para o índice poder ser reconstruído a partir do MongoDB
+    assinatura = gerar_assinatura(desafio_edital)
+    documento = {
+        "id": str(uuid.uuid4()),
+        "titulo": proposta_completa.get('titulo', ''),
+        "desafio": desafio_edital[:500],
+        "assinatura_desafio": assinatura_em_bytes(assinatura),
+        "proposta_completa": proposta_completa,
+        "dados_solucao": dados_solucao,
+        "tipo_geracao": tipo,
+        "data_criacao": datetime.now(),
+        "versao": 1,
+        "versoes_secoes": {secao: 1 for secao in proposta_completa},
+        "secoes_estimadas": secoes_estimadas or [],
+    }
+    with medir("mongo.enfileirar", colecao="propostas_geradas", documentos=1):
+        obter_escritor().enfileirar(documento)
+    obter_indice().adicionar_assinatura(documento["id"], assinatura)
+    return documento["id"]
+
+
+# Salva uma nova versão de uma proposta, depois de regenerar seções; o histórico guarda
+# os valores anteriores das seções alteradas. O desafio e o tipo de geração só são usados se a
+# versão chegar ao MongoDB antes da proposta original (que ficou no journal)
+def salvar_versao_no_mongo(id_proposta, versao, proposta_completa, dados_solucao, versoes_secoes, historico_secoes,
+                           secoes_estimadas=None, desafio_edital=None, tipo=None):
+    if not obter_config("MONGODB_URI"):
+        return None
+    documento = {
+        "id": id_proposta,
+        "titulo": proposta_completa.get('titulo', ''),
+        "desafio": desafio_edital[:500] if desafio_edital else None,
+        "assinatura_desafio": assinatura_em_bytes(gerar_assinatura(desafio_edital)) if desafio_edital else None,
+        "tipo_geracao": tipo,
+        "proposta_completa": proposta_completa,
+        "dados_solucao": dados_solucao,
+        "data_criacao": datetime.now(),
+        "data_atualizacao": datetime.now(),
+        "versao": versao,
+        "versoes_secoes": versoes_secoes,
+        "historico_secoes": historico_secoes,
+        "secoes_estimadas": secoes_estimadas or [],
+    }
+    with medir("mongo.enfileirar", colecao="propostas_geradas", documentos=1):
+        obter_escritor().enfileirar(documento)
+    return id_proposta
+
+
+# Campos retornados na listagem do histórico
+PROJECAO_LISTAGEM = {"_id": 0, "id": 1, "titulo": 1, "desafio": 1, "tipo_geracao": 1, "data_criacao": 1}
+
+
+# Lista propostas salvas da mais recente para a mais antiga com paginação por chave:
+# o cursor é o par (data_criacao, id) do último item da página anterior
+def listar_propostas(collection, tipo_geracao=None, busca=None, cursor=None, limite=20):
+    from pymongo import DESCENDING
+
+    filtro = {}
+    if tipo_geracao:
+        filtro["tipo_geracao"] = tipo_geracao
+    if busca:
+        filtro["$text"] = {"$search": busca}
+    if cursor is not None:
+        data_criacao, id_proposta = cursor
+        filtro["$or"] = [
+            {"data_criacao": {"$lt": data_criacao}},
+            {"data_criacao": data_criacao, "id": {"$lt": id_proposta}},
+        ]
+
+    documentos = list(
+        collection.find(filtro, PROJECAO_LISTAGEM)
+        .sort([("data_criacao", DESCENDING), ("id", DESCENDING)])
+        .limit(limite + 1)
+    )
+    proximo_cursor = None
+    if len(documentos) > limite:
+        documentos = documentos[:limite]
+        proximo_cursor = (documentos[-1]["data_criacao"], documentos[-1]["id"])
+    return documentos, proximo_cursor
+
+
+# Carrega uma proposta salva completa
+def obter_proposta(collection, id_proposta):
+    return collection.find_one({"id": id_proposta}, {"_id": 0})
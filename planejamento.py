@@ -0,0 +1,104 @@
+from google.genai import types
+
+from config import obter_config, obter_config_numero
+
+# Caracteres por token assumidos no planejamento (a mesma conta de estimar_tokens)
+CARACTERES_POR_TOKEN = 4
+
+# Orçamento de cada tipo de prompt, em tokens: entrada é o máximo do brief (ou texto variável) incluído
+# no prompt; saida é o limite da resposta, com folga sobre o tamanho final do campo para o modelo
+# terminar a frase; pensamento é o limite de raciocínio (0 desliga), que no Gemini 2.5 conta dentro de
+# max_output_tokens. Prompts fora da tabela seguem sem limites. Respostas de uma linha não usam "\n" como
+# sequência de parada: se o modelo começar com uma quebra de linha, a resposta voltaria vazia
+PLANOS_PROMPTS = {
+    # Seções da proposta automática
+    'desafio_info': {'entrada': 1000, 'saida': 96, 'pensamento': 0},
+    # Só a entrada: um limite de saída cortaria os últimos campos da análise (POTENCIAL_MERCADO, TECNOLOGIAS)
+    'analise': {'entrada': 2500},
+    'contexto': {'entrada': 2500},
+    'titulo': {'saida': 80, 'pensamento': 0},  # 200 caracteres
+    # Sem medição do tamanho real das respostas, os limites abaixo só evitam respostas descontroladas:
+    # a cota é cobrada pelo uso e a reserva não usada volta ao limitador, então a folga não custa nada,
+    # enquanto um limite justo demais corta a resposta (ex.: "24 meses." ou um orçamento item a item)
+    'duracao_meses': {'saida': 64, 'pensamento': 0},
+    'alcance': {'saida': 64, 'pensamento': 0},
+    'ambito_aplicacao': {'saida': 1024, 'pensamento': 0},
+    'orcamento': {'saida': 1024, 'pensamento': 0},
+    # Só a entrada: o JSON tem campos sem tamanho fixo e cortá-lo invalidaria a resposta
+    'proposta_estruturada': {'entrada': 2500},
+    # Proposta manual
+    'titulo_manual': {'entrada': 1000, 'saida': 80, 'pensamento': 0},
+    # Condensação de editais longos; o brief recebe o limite de saída na própria chamada
+    'resumo_bloco': {'saida': 1024, 'pensamento': 0},
+    'brief': {'pensamento': 0},
+}
+
+# Menor orçamento de raciocínio aceito pelos modelos que não permitem desligá-lo
+PENSAMENTO_MINIMO = {"gemini-2.5-pro": 128}
+
+
+def planejamento_ativo():
+    return str(obter_config("PLANEJAMENTO_TOKENS", "1")).lower() not in ("0", "false", "nao", "não")
+
+
+# Plano do tipo de prompt, com os limites que podem ser trocados por configuração
+# (ex.: TOKENS_SAIDA_AMBITO_APLICACAO=1500), ou None se não houver plano
+def obter_plano(tipo_prompt):
+    if not tipo_prompt or tipo_prompt not in PLANOS_PROMPTS or not planejamento_ativo():
+        return None
+    plano = dict(PLANOS_PROMPTS[tipo_prompt])
+    for campo in ('entrada', 'saida', 'pensamento'):
+        if campo in plano:
+            plano[campo] = int(obter_config_numero(f"TOKENS_{campo.upper()}_{tipo_prompt.upper()}", plano[campo]))
+    return plano
+
+
+# Corta o texto no orçamento de entrada do tipo de prompt, no último parágrafo (ou linha) que couber
+def ajustar_entrada(texto, tipo_prompt):
+    plano = obter_plano(tipo_prompt)
+    if plano is None or 'entrada' not in plano:
+        return texto
+    limite = plano['entrada'] * CARACTERES_POR_TOKEN
+    if len(texto) <= limite:
+        return texto
+    cortado = texto[:limite]
+    for separador in ("\n\n", "\n"):
+        posicao = cortado.rfind(separador)
+        if posicao > limite // 2:
+            return cortado[:posicao]
+    return cortado
+
+
+# Configuração da chamada com os limites de saída do plano. Limites já definidos na configuração
+# recebida têm prioridade; sem plano, a configuração volta sem alterações
+def aplicar_plano(model, config, tipo_prompt):
+    plano = obter_plano(tipo_prompt)
+    if plano is None:
+        return config
+    atualizacao = {}
+    atual = config or types.GenerateContentConfig()
+    pensamento = plano.get('pensamento')
+    if pensamento is not None and atual.thinking_config is None:
+        pensamento = max(pensamento, PENSAMENTO_MINIMO.get(model, 0))
+        atualizacao['thinking_config'] = types.ThinkingConfig(thinking_budget=pensamento)
+    if 'saida' in plano and atual.max_output_tokens is None:
+        atualizacao['max_output_tokens'] = plano['saida'] + (pensamento or 0)
+    if not atualizacao:
+        return config
+    return atual.model_copy(update=atualizacao)
+
+
+# Tamanho em caracteres do texto enviado (prompt simples ou turnos da conversa)
+def tamanho_texto(contents):
+    if isinstance(contents, list):
+        return sum(tamanho_texto(item) for item in contents)
+    if isinstance(contents, types.Content):
+        return sum(len(parte.text or "") for parte in contents.parts or [])
+    return len(str(contents))
+
+
+# Preenche no span os tokens planejados para a chamada, comparados depois com os reais
+def registrar_plano(span, contents, config):
+    span["tokens_entrada_planejados"] = tamanho_texto(contents) // CARACTERES_POR_TOKEN
+    if config is not None and config.max_output_tokens:
+        span["tokens_saida_planejados"] = config.max_output_tokens
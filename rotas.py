@@ -0,0 +1,87 @@
+from config import obter_config
+
+# Modelo de cada nível; MODELO_NIVEL_<NIVEL> troca o modelo de um nível inteiro
+NIVEIS_MODELOS = {
+    "rapido": "gemini-2.5-flash-lite",
+    "padrao": "gemini-2.5-flash",
+    "forte": "gemini-2.5-pro",
+}
+
+# Nível de cada tipo de prompt: campos curtos e de formato fixo vão para o modelo rápido; análise,
+# orçamento, textos longos e buscas ficam no padrão. Com o contexto da proposta em cache explícito,
+# os prompts que o usam vão todos para o modelo do contexto (ver ContextoCompartilhado).
+# MODELO_<TIPO> troca a rota de um tipo, com o nome de um nível ou de um modelo
+# (ex.: MODELO_ANALISE=forte, MODELO_TITULO=gemini-2.5-flash)
+ROTAS_PROMPTS = {
+    'desafio_info': "rapido",
+    'titulo': "rapido",
+    'titulo_manual': "rapido",
+    'duracao_meses': "rapido",
+    'alcance': "rapido",
+    'resumo_bloco': "rapido",
+    'analise': "padrao",
+    'orcamento': "padrao",
+    'ambito_aplicacao': "padrao",
+    'proposta_estruturada': "padrao",
+    'brief': "padrao",
+    'extracao_editais': "padrao",
+    'busca_editais_abertos': "padrao",
+    'busca_editais_especificos': "padrao",
+}
+
+
+def modelo_do_nivel(nivel):
+    return obter_config(f"MODELO_NIVEL_{nivel.upper()}") or NIVEIS_MODELOS[nivel]
+
+
+# Modelo que atende o tipo de prompt; tipos fora da tabela usam o nível padrão
+def obter_modelo(tipo_prompt=None):
+    rota = ROTAS_PROMPTS.get(tipo_prompt, "padrao")
+    if tipo_prompt:
+        rota = obter_config(f"MODELO_{tipo_prompt.upper()}") or rota
+    return modelo_do_nivel(rota) if rota in NIVEIS_MODELOS else rota
+
+
+# Sinal de qualidade das respostas curtas: se o texto pode ser usado como está no campo,
+# sem depender do corte ou da leitura tolerante feitos depois
+def _validar_desafio_info(texto):
+    return "CÓDIGO:" in texto.upper() and "NOME:" in texto.upper()
+
+
+def _validar_titulo(texto):
+    return 0 < len(texto.strip()) <= 200 and "\n" not in texto.strip()
+
+
+def _validar_duracao(texto):
+    from estimadores import converter_duracao
+
+    return texto.strip().isdigit() and converter_duracao(texto) is not None
+
+
+def _validar_alcance(texto):
+    from estimadores import OPCOES_ALCANCE
+
+    return texto.strip().lstrip("-* ") in OPCOES_ALCANCE
+
+
+def _validar_orcamento(texto):
+    from estimadores import converter_orcamento
+
+    return converter_orcamento(texto) is not None and texto.upper().count(":") >= 9
+
+
+VALIDADORES_RESPOSTAS = {
+    'desafio_info': _validar_desafio_info,
+    'titulo': _validar_titulo,
+    'titulo_manual': _validar_titulo,
+    'duracao_meses': _validar_duracao,
+    'alcance': _validar_alcance,
+    'orcamento': _validar_orcamento,
+}
+
+
+# Preenche no span se a resposta tem o formato esperado para o tipo de prompt
+def avaliar_resposta(span, tipo_prompt, texto):
+    validador = VALIDADORES_RESPOSTAS.get(tipo_prompt)
+    if validador is not None:
+        span["resposta_valida"] = bool(texto) and validador(texto)
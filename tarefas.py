@@ -0,0 +1,275 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from config import obter_config_numero
+from geracao import (
+    gerar_proposta_automatica_stream, gerar_proposta_estruturada, gerar_proposta_manual, regenerar_secao_stream,
+    secoes_afetadas
+)
+from instrumentacao import encerrar_execucao, iniciar_execucao
+from persistencia import salvar_no_mongo, salvar_versao_no_mongo
+
+# Situações de uma tarefa
+NA_FILA = "na fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluída"
+CANCELADA = "cancelada"
+ERRO = "erro"
+
+# Regenerações guardadas no histórico de seções de cada proposta
+MAX_HISTORICO_SECOES = 20
+
+
+# Uma geração em segundo plano: guarda as seções já produzidas e o resultado fora da execução do script,
+# para que reexecuções do Streamlit (ou o fechamento da aba) não percam o trabalho
+class Tarefa:
+    def __init__(self, nome, tipo, dados=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.nome = nome
+        self.tipo = tipo
+        self.dados = dados or {}
+        self.status = NA_FILA
+        self.criada_em = time.time()
+        self.inicio = None
+        self.fim = None
+        self.secoes = {}
+        self.resultado = None
+        self.erro = None
+        self.execucao = None
+        self.cancelamento = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finalizada(self):
+        return self.status in (CONCLUIDA, CANCELADA, ERRO)
+
+    # Tempo desde o início (ou até o fim), em segundos
+    @property
+    def duracao_s(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fim or time.time()) - self.inicio
+
+    def registrar_secao(self, secao, valor):
+        with self._lock:
+            self.secoes[secao] = valor
+
+    # Cópia das seções para exibição sem disputar com a thread da tarefa
+    def obter_secoes(self):
+        with self._lock:
+            return dict(self.secoes)
+
+    def cancelar(self):
+        self.cancelamento.set()
+
+
+# Executa as gerações em um pool do processo, compartilhado por todas as sessões, o que também limita
+# quantas propostas chamam o Gemini ao mesmo tempo nesta réplica
+class GerenciadorTarefas:
+    def __init__(self, max_paralelo=4, retencao_s=3600, max_tarefas=500):
+        self.retencao_s = retencao_s
+        self.max_tarefas = max_tarefas
+        self._executor = ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix="tarefa")
+        self._tarefas = {}
+        self._lock = threading.Lock()
+
+    # Enfileira a geração; funcao(tarefa) pode ser um gerador de pares (secao, valor),
+    # registrados na tarefa assim que chegam, e o valor de 'concluido' vira o resultado
+    def submeter(self, nome, tipo, funcao, dados=None):
+        tarefa = Tarefa(nome, tipo, dados)
+        with self._lock:
+            self._remover_antigas()
+            self._tarefas[tarefa.id] = tarefa
+        self._executor.submit(self._executar, tarefa, funcao)
+        return tarefa
+
+    def _executar(self, tarefa, funcao):
+        if tarefa.cancelamento.is_set():
+            tarefa.status, tarefa.fim = CANCELADA, time.time()
+            return
+        tarefa.status, tarefa.inicio = EXECUTANDO, time.time()
+        tarefa.execucao = iniciar_execucao(tarefa.nome)
+        try:
+            resultado = funcao(tarefa)
+            if hasattr(resultado, "__next__"):
+                try:
+                    for secao, valor in resultado:
+                        if secao == "concluido":
+                            tarefa.resultado = valor
+                        else:
+                            tarefa.registrar_secao(secao, valor)
+                        # Fechar o gerador interrompe a geração e libera os recursos dela
+                        if tarefa.cancelamento.is_set():
+                            break
+                finally:
+                    resultado.close()
+            else:
+                tarefa.resultado = resultado
+            tarefa.status = CANCELADA if tarefa.cancelamento.is_set() and tarefa.resultado is None else CONCLUIDA
+        except Exception as e:
+            tarefa.erro = f"{type(e).__name__}: {e}"
+            tarefa.status = ERRO
+        finally:
+            tarefa.fim = time.time()
+            encerrar_execucao(tarefa.execucao)
+
+    def obter(self, id_tarefa):
+        with self._lock:
+            return self._tarefas.get(id_tarefa)
+
+    # Tarefas pedidas que ainda existem, da mais recente para a mais antiga
+    def listar(self, ids):
+        with self._lock:
+            tarefas = [self._tarefas[i] for i in ids if i in self._tarefas]
+        return sorted(tarefas, key=lambda tarefa: tarefa.criada_em, reverse=True)
+
+    # Descarta tarefas finalizadas há mais tempo que a retenção e, acima do máximo, as mais antigas
+    def _remover_antigas(self):
+        agora = time.time()
+        for id_tarefa, tarefa in list(self._tarefas.items()):
+            if tarefa.finalizada and agora - tarefa.fim > self.retencao_s:
+                del self._tarefas[id_tarefa]
+        finalizadas = sorted((t for t in self._tarefas.values() if t.finalizada), key=lambda t: t.fim)
+        for tarefa in finalizadas[:max(0, len(self._tarefas) - self.max_tarefas)]:
+            del self._tarefas[tarefa.id]
+
+
+_gerenciador = None
+_gerenciador_lock = threading.Lock()
+
+
+# Retorna o gerenciador de tarefas compartilhado pelas sessões do processo
+def obter_gerenciador_tarefas():
+    global _gerenciador
+    with _gerenciador_lock:
+        if _gerenciador is None:
+            _gerenciador = GerenciadorTarefas(
+                max_paralelo=int(obter_config_numero("TAREFAS_MAX_PARALELO", 4)),
+                retencao_s=obter_config_numero("TAREFAS_RETENCAO_S", 3600),
+                max_tarefas=int(obter_config_numero("TAREFAS_MAX", 500)),
+            )
+        return _gerenciador
+
+
+# Proposta automática em segundo plano: repassa as seções à medida que ficam prontas e salva
+# a proposta ao final, mesmo que ninguém esteja acompanhando a tarefa
+def tarefa_proposta_automatica(client, desafio_edital, estruturada=False, dados_reusados=None, proposta_salva=None):
+    def executar(tarefa):
+        if proposta_salva is not None:
+            proposta_completa = proposta_salva.get('proposta_completa', {})
+            dados_solucao = proposta_salva.get('dados_solucao') or {}
+            secoes_estimadas = proposta_salva.get('secoes_estimadas', [])
+            tipo_geracao = None
+            yield 'dados_solucao', dados_solucao
+            yield from proposta_completa.items()
+        elif estruturada:
+            proposta_completa, dados_solucao = gerar_proposta_estruturada(client, desafio_edital)
+            secoes_estimadas = []
+            tipo_geracao = "automática (estruturada)"
+            yield 'dados_solucao', dados_solucao
+            yield from proposta_completa.items()
+        else:
+            secoes_estimadas = []
+            with closing(gerar_proposta_automatica_stream(client, desafio_edital, dados_reusados)) as eventos:
+                for secao, valor in eventos:
+                    if secao == 'concluido':
+                        proposta_completa, dados_solucao = valor
+                    else:
+                        if secao == 'estimativas':
+                            secoes_estimadas = list(valor)
+                        yield secao, valor
+            tipo_geracao = "automática"
+
+        # Propostas reabertas do histórico não são salvas de novo
+        if tipo_geracao:
+            id_proposta = salvar_no_mongo(
+                proposta_completa, desafio_edital, tipo_geracao, dados_solucao, secoes_estimadas
+            )
+        else:
+            id_proposta = proposta_salva.get('id')
+        yield 'concluido', {
+            'proposta_completa': proposta_completa,
+            'dados_solucao': dados_solucao,
+            'tipo_geracao': tipo_geracao,
+            'salva': bool(tipo_geracao) and id_proposta is not None,
+            'id_proposta': id_proposta,
+            'versao': (proposta_salva or {}).get('versao', 1),
+            'versoes_secoes': (proposta_salva or {}).get('versoes_secoes') or {s: 1 for s in proposta_completa},
+            'historico_secoes': (proposta_salva or {}).get('historico_secoes', []),
+            'secoes_estimadas': secoes_estimadas,
+        }
+    return executar
+
+
+# Regenera uma seção de uma proposta automática concluída em uma nova tarefa. As seções que não
+# dependem dela são repassadas como estão; as afetadas chegam à medida que são recalculadas.
+# O resultado é a versão seguinte da proposta, salva no MongoDB sobre a anterior.
+def tarefa_regenerar_secao(client, desafio_edital, estado, secao):
+    def executar(tarefa):
+        afetadas = secoes_afetadas(secao)
+        if 'dados_solucao' not in afetadas:
+            yield 'dados_solucao', estado['dados_solucao']
+        for secao_mantida, valor in estado['proposta_completa'].items():
+            if secao_mantida not in afetadas:
+                yield secao_mantida, valor
+        
+        with closing(regenerar_secao_stream(
+            client, desafio_edital, estado['proposta_completa'], estado['dados_solucao'], secao
+        )) as eventos:
+            for secao_gerada, valor in eventos:
+                if secao_gerada == 'concluido':
+                    proposta_completa, dados_solucao, alteradas = valor
+                else:
+                    yield secao_gerada, valor
+        
+        versao = estado.get('versao', 1) + 1
+        versoes_secoes = dict(estado.get('versoes_secoes', {}))
+        versoes_secoes.update({secao_alterada: versao for secao_alterada in alteradas})
+        anteriores = {
+            secao_alterada: estado['dados_solucao'] if secao_alterada == 'dados_solucao'
+            else estado['proposta_completa'].get(secao_alterada)
+            for secao_alterada in alteradas
+        }
+        historico_secoes = (estado.get('historico_secoes', []) + [
+            {'versao': versao, 'secao': secao, 'anteriores': anteriores}
+        ])[-MAX_HISTORICO_SECOES:]
+        # As seções regeneradas passam a vir do Gemini
+        secoes_estimadas = [s for s in estado.get('secoes_estimadas', []) if s not in alteradas]
+        
+        id_proposta = estado.get('id_proposta')
+        salva = id_proposta is not None and salvar_versao_no_mongo(
+            id_proposta, versao, proposta_completa, dados_solucao, versoes_secoes, historico_secoes,
+            secoes_estimadas, desafio_edital, estado['tipo_geracao']
+        ) is not None
+        yield 'concluido', {
+            'proposta_completa': proposta_completa,
+            'dados_solucao': dados_solucao,
+            'tipo_geracao': estado['tipo_geracao'],
+            'salva': salva,
+            'id_proposta': id_proposta,
+            'versao': versao,
+            'versoes_secoes': versoes_secoes,
+            'historico_secoes': historico_secoes,
+            'secoes_estimadas': secoes_estimadas,
+            'secao_regenerada': secao,
+            'secoes_alteradas': alteradas,
+        }
+    return executar
+
+
+# Proposta do formulário manual em segundo plano
+def tarefa_proposta_manual(client, desafio_edital, dados_solucao):
+    def executar(tarefa):
+        proposta_completa = gerar_proposta_manual(client, desafio_edital, dados_solucao)
+        id_proposta = salvar_no_mongo(proposta_completa, desafio_edital, "manual")
+        return {
+            'proposta_completa': proposta_completa,
+            'dados_solucao': dados_solucao,
+            'tipo_geracao': "manual",
+            'salva': id_proposta is not None,
+            'id_proposta': id_proposta,
+        }
+    return executar